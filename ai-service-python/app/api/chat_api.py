@@ -12,7 +12,7 @@ async def handle_chat_request(request: ChatRequest):
     """
     try:
         # The generate_rag_response function returns an async generator.
-        response_generator = generate_rag_response(request.query, request.pdfIds)
+        response_generator = generate_rag_response(request.query, request.pdfIds, request.bypassCache)
         
         # We wrap this generator in a StreamingResponse.
         # This tells FastAPI to stream the output of the generator as it's produced,
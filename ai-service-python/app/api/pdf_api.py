@@ -1,25 +1,55 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from ..schemas.pdf_schemas import PDFProcessRequest
-from ..services.pdf_processor import process_pdf_and_store
+import asyncio
+from fastapi import APIRouter, HTTPException
+from ..schemas.pdf_schemas import PDFProcessRequest, PDFJobStatus
+from ..core.job_queue import RUNNING, ingestion_queue
+from ..core.vector_backend import delete_pdf
+from ..core.ingest_checkpoints import discard_checkpoint
 
 router = APIRouter()
 
 @router.post("/process-pdf", status_code=202)
-async def handle_pdf_processing(
-    request: PDFProcessRequest,
-    background_tasks: BackgroundTasks # Inject BackgroundTasks
-):
+async def handle_pdf_processing(request: PDFProcessRequest):
     """
-    Accepts a PDF processing request and runs the process in the background.
+    Accepts a PDF processing request and adds it to the persistent ingestion queue.
     Responds immediately with a 202 Accepted status.
     """
     print(f"Received request to process PDF ID: {request.pdfId}")
-    
-    # Add the long-running async task to the background
-    background_tasks.add_task(
-        process_pdf_and_store,
-        pdf_id=request.pdfId,
-        pdf_url=request.pdfUrl
+
+    # Jobs are deduplicated by pdfId and run by a bounded pool of queue workers
+    job = ingestion_queue.submit(request.pdfId, str(request.pdfUrl))
+
+    return {"message": "PDF processing has been accepted and queued.", "state": job["state"]}
+
+@router.get("/process-pdf/{pdfId}", response_model=PDFJobStatus)
+async def get_pdf_processing_status(pdfId: str):
+    """
+    Returns the state, attempt count and stage timings of a PDF ingestion job.
+    """
+    job = ingestion_queue.get(pdfId)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No processing job found for PDF ID: {pdfId}.")
+    return PDFJobStatus(
+        pdfId=job["pdf_id"],
+        state=job["state"],
+        attempts=job["attempts"],
+        error=job["error"],
+        createdAt=job["created_at"],
+        startedAt=job["started_at"],
+        finishedAt=job["finished_at"],
+        timings=job["timings"],
     )
-    
-    return {"message": "PDF processing has been accepted and started in the background."}
\ No newline at end of file
+
+@router.delete("/process-pdf/{pdfId}")
+async def delete_pdf_data(pdfId: str):
+    """
+    Deletes a PDF's vector store, its vectors in the shared index and its job record.
+    """
+    job = ingestion_queue.get(pdfId)
+    if job is not None and job["state"] == RUNNING:
+        raise HTTPException(status_code=409, detail=f"PDF ID {pdfId} is being processed; try again once it finishes.")
+    removed_job = ingestion_queue.remove(pdfId)
+    await asyncio.to_thread(discard_checkpoint, pdfId)
+    removed_store = await asyncio.to_thread(delete_pdf, pdfId)
+    if not (removed_job or removed_store):
+        raise HTTPException(status_code=404, detail=f"Nothing stored for PDF ID: {pdfId}.")
+    return {"message": f"Deleted PDF ID: {pdfId}."}
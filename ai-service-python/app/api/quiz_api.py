@@ -1,7 +1,9 @@
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from ..schemas.quiz_schemas import QuizGenerationRequest, GeneratedQuiz, QuizGradingRequest, QuizGradingResponse
-from ..services.quiz_service import generate_quiz_from_pdfs, grade_quiz_submission
+from ..services.quiz_service import (
+    generate_quiz_from_pdfs, grade_quiz_submission, prepare_quiz_sections, stream_quiz_sections
+)
 
 router = APIRouter()
 
@@ -23,6 +25,25 @@ async def handle_generate_quiz(request: QuizGenerationRequest):
             content={"detail": "An internal error occurred while generating the quiz."}
         )
 
+@router.post("/generate-quiz/stream")
+async def handle_generate_quiz_stream(request: QuizGenerationRequest):
+    """
+    Streams a quiz as NDJSON: one MCQ/SAQ/LAQ object per line as soon as it
+    is validated, in no particular order. A line with an "error" field
+    reports questions of that type that could not be generated.
+    """
+    try:
+        # Context is prepared up front so a missing PDF is still a 404
+        sections = await prepare_quiz_sections(request)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    async def lines():
+        async for item in stream_quiz_sections(sections, len(set(request.pdfIds))):
+            yield item.model_dump_json() + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 @router.post("/grade-quiz", response_model=QuizGradingResponse)
 async def handle_grade_quiz(request: QuizGradingRequest):
     """
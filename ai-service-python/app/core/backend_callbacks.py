@@ -0,0 +1,248 @@
+import os
+import json
+import time
+import random
+import asyncio
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from .metrics import registry
+from .store_cache import VECTOR_STORE_DIR
+
+NODE_BACKEND_URL = os.getenv("NODE_BACKEND_URL", "http://localhost:5000")
+STATUS_PATH = "/api/v1/pdfs/update-status"
+BATCH_STATUS_PATH = "/api/v1/pdfs/update-status/batch"
+
+# Undelivered status updates are kept here, next to the job queue, until the backend accepts them
+BACKEND_CALLBACK_OUTBOX_PATH = os.getenv(
+    "BACKEND_CALLBACK_OUTBOX_PATH", os.path.join(VECTOR_STORE_DIR, "callback_outbox.db")
+)
+BACKEND_CALLBACK_TIMEOUT_SECONDS = float(os.getenv("BACKEND_CALLBACK_TIMEOUT_SECONDS", "10"))
+# Delivery attempts per update before it is dropped; retries back off exponentially with jitter
+BACKEND_CALLBACK_MAX_ATTEMPTS = int(os.getenv("BACKEND_CALLBACK_MAX_ATTEMPTS", "8"))
+BACKEND_CALLBACK_RETRY_BASE_SECONDS = float(os.getenv("BACKEND_CALLBACK_RETRY_BASE_SECONDS", "1"))
+BACKEND_CALLBACK_RETRY_MAX_SECONDS = float(os.getenv("BACKEND_CALLBACK_RETRY_MAX_SECONDS", "300"))
+# Updates sent per request to the batch endpoint; 1 posts each update on its own
+BACKEND_CALLBACK_BATCH_SIZE = int(os.getenv("BACKEND_CALLBACK_BATCH_SIZE", "1"))
+# With batching, how long to wait for more updates before sending a partial batch
+BACKEND_CALLBACK_BATCH_WINDOW_SECONDS = float(os.getenv("BACKEND_CALLBACK_BATCH_WINDOW_SECONDS", "0.5"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id               INTEGER PRIMARY KEY AUTOINCREMENT,
+    pdf_id           TEXT NOT NULL UNIQUE,
+    payload          TEXT NOT NULL,
+    attempts         INTEGER NOT NULL DEFAULT 0,
+    created_at       REAL NOT NULL,
+    next_attempt_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (next_attempt_at);
+"""
+
+# Client errors that may succeed on a later attempt; any other 4xx is final
+_RETRYABLE_STATUS = {408, 425, 429}
+
+
+def _is_permanent(status_code: int) -> bool:
+    return 400 <= status_code < 500 and status_code not in _RETRYABLE_STATUS
+
+
+def _batch_outcomes(response: httpx.Response, count: int) -> List[Optional[int]]:
+    """Status code per update from a batch response; None where the backend didn't say."""
+    try:
+        results = response.json().get("results")
+    except ValueError:
+        results = None
+    if not isinstance(results, list) or len(results) != count:
+        return [None] * count
+    return [result.get("code") if isinstance(result, dict) else None for result in results]
+
+
+class CallbackError(Exception):
+    def __init__(self, message: str, permanent: bool = False):
+        super().__init__(message)
+        # The backend rejected the update itself, so sending it again won't help
+        self.permanent = permanent
+
+
+class CallbackDispatcher:
+    """
+    Delivers PDF status updates to the Node.js backend from a background
+    task, over one keep-alive client. Updates go through a SQLite outbox,
+    so a backend that is down or slow neither blocks ingestion nor loses
+    them: failed deliveries are retried with jittered exponential backoff,
+    also after a restart. Only the latest update per PDF is kept, as it
+    supersedes any older one that was not delivered yet.
+    """
+
+    def __init__(self, path: str, base_url: str, batch_size: int, max_attempts: int):
+        self.path = path
+        self.base_url = base_url.rstrip("/")
+        self.batch_size = max(1, batch_size)
+        self.max_attempts = max_attempts
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._delivered = 0
+        self._retries = 0
+        self._dropped = 0
+        self._requests = 0
+
+    # --- Outbox ---
+
+    def _enqueue(self, pdf_id: str, payload: Dict[str, Any]) -> None:
+        now = time.time()
+        with self._lock:
+            # Replacing the row also resets its attempts and gives it a new id
+            self._conn.execute(
+                "INSERT OR REPLACE INTO outbox (pdf_id, payload, attempts, created_at, next_attempt_at) "
+                "VALUES (?, ?, 0, ?, ?)",
+                (pdf_id, json.dumps(payload), now, now),
+            )
+
+    def _due(self, limit: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, pdf_id, payload, attempts FROM outbox WHERE next_attempt_at <= ? "
+                "ORDER BY next_attempt_at LIMIT ?",
+                (time.time(), limit),
+            ).fetchall()
+        return [
+            {"id": row[0], "pdf_id": row[1], "payload": json.loads(row[2]), "attempts": row[3]}
+            for row in rows
+        ]
+
+    def _next_due_in(self) -> Optional[float]:
+        with self._lock:
+            row = self._conn.execute("SELECT MIN(next_attempt_at) FROM outbox").fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def _delivered_rows(self, rows: List[Dict[str, Any]]) -> None:
+        # By id, so an update queued for the same PDF in the meantime is kept
+        with self._lock:
+            self._conn.executemany("DELETE FROM outbox WHERE id = ?", [(row["id"],) for row in rows])
+            self._delivered += len(rows)
+
+    def _failed_rows(self, rows: List[Dict[str, Any]], error: str, permanent: bool) -> None:
+        now = time.time()
+        with self._lock:
+            for row in rows:
+                attempts = row["attempts"] + 1
+                if permanent or attempts >= self.max_attempts:
+                    self._conn.execute("DELETE FROM outbox WHERE id = ?", (row["id"],))
+                    self._dropped += 1
+                    print(f"[{row['pdf_id']}] ERROR: Giving up on backend status update after {attempts} attempt(s): {error}")
+                    continue
+                delay = min(BACKEND_CALLBACK_RETRY_BASE_SECONDS * 2 ** (attempts - 1), BACKEND_CALLBACK_RETRY_MAX_SECONDS)
+                delay *= random.uniform(0.5, 1.5)
+                self._conn.execute(
+                    "UPDATE outbox SET attempts = ?, next_attempt_at = ? WHERE id = ?",
+                    (attempts, now + delay, row["id"]),
+                )
+                self._retries += 1
+                print(f"[{row['pdf_id']}] Backend status update failed ({error}), retrying in {delay:.1f}s.")
+
+    # --- Delivery ---
+
+    async def notify(self, pdf_id: str, payload: Dict[str, Any]) -> None:
+        """Queues a status update; returns once it is persisted, not when it is delivered."""
+        await asyncio.to_thread(self._enqueue, pdf_id, payload)
+        self._ensure_running()
+        self._wakeup.set()
+
+    def start(self) -> None:
+        """Starts the sender; updates left in the outbox by a previous run are sent again."""
+        self._ensure_running()
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _ensure_running(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._wakeup = asyncio.Event()
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url, timeout=httpx.Timeout(BACKEND_CALLBACK_TIMEOUT_SECONDS),
+                limits=httpx.Limits(max_connections=8, max_keepalive_connections=8),
+            )
+            self._task = loop.create_task(self._run())
+
+    async def _post(self, path: str, body: Any) -> httpx.Response:
+        with self._lock:
+            self._requests += 1
+        try:
+            response = await self._client.post(path, json=body)
+        except httpx.HTTPError as e:
+            raise CallbackError(str(e) or type(e).__name__) from e
+        if response.status_code >= 400:
+            raise CallbackError(f"HTTP {response.status_code}", _is_permanent(response.status_code))
+        return response
+
+    async def _send(self, rows: List[Dict[str, Any]]) -> None:
+        try:
+            if len(rows) == 1:
+                await self._post(STATUS_PATH, rows[0]["payload"])
+                outcomes = [None]
+            else:
+                response = await self._post(BATCH_STATUS_PATH, {"updates": [row["payload"] for row in rows]})
+                outcomes = _batch_outcomes(response, len(rows))
+        except CallbackError as e:
+            await asyncio.to_thread(self._failed_rows, rows, str(e), e.permanent)
+            return
+
+        # The batch endpoint reports a status per update, so only the failed ones are retried
+        delivered = [row for row, code in zip(rows, outcomes) if code is None or code < 400]
+        if delivered:
+            await asyncio.to_thread(self._delivered_rows, delivered)
+            for row in delivered:
+                print(f"[{row['pdf_id']}] Backend notified of status: {row['payload'].get('status')}")
+        for row, code in zip(rows, outcomes):
+            if code is not None and code >= 400:
+                await asyncio.to_thread(self._failed_rows, [row], f"HTTP {code}", _is_permanent(code))
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            if self.batch_size > 1:
+                # Give other PDFs finishing at about the same time a chance to join the batch
+                await asyncio.sleep(BACKEND_CALLBACK_BATCH_WINDOW_SECONDS)
+            rows = await asyncio.to_thread(self._due, self.batch_size * 8)
+            if rows:
+                groups = [rows[i:i + self.batch_size] for i in range(0, len(rows), self.batch_size)]
+                await asyncio.gather(*(self._send(group) for group in groups))
+                continue
+            wait = await asyncio.to_thread(self._next_due_in)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            pending = self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+            return {
+                "pending": pending,
+                "delivered": self._delivered,
+                "retries": self._retries,
+                "dropped": self._dropped,
+                "requests": self._requests,
+            }
+
+
+callback_dispatcher = CallbackDispatcher(
+    BACKEND_CALLBACK_OUTBOX_PATH, NODE_BACKEND_URL, BACKEND_CALLBACK_BATCH_SIZE, BACKEND_CALLBACK_MAX_ATTEMPTS,
+)
+registry.gauge_callback("backend_callbacks", "Backend status update delivery statistics.", callback_dispatcher.stats)
@@ -0,0 +1,112 @@
+import os
+import time
+import threading
+from typing import Dict, Tuple
+
+from .metrics import GaugeCallback, registry
+
+# Model names shared by every service
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "models/gemini-pro-latest")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "nomic-embed-text")
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+
+_lock = threading.Lock()
+_llms: Dict[Tuple[str, float], object] = {}
+_embeddings: Dict[str, object] = {}
+
+# Seconds spent constructing each client, reported in the startup breakdown
+init_timings: Dict[str, float] = {}
+
+
+def get_llm(temperature: float, model: str = GEMINI_MODEL):
+    """
+    Returns the shared chat model for (model, temperature), creating it on first use.
+    The Gemini client library is only imported here, not when the services are imported.
+    """
+    key = (model, temperature)
+    with _lock:
+        if key not in _llms:
+            if not os.getenv("GOOGLE_API_KEY"):
+                raise ValueError("GOOGLE_API_KEY environment variable not set.")
+            started = time.perf_counter()
+            from langchain_google_genai import ChatGoogleGenerativeAI
+            _llms[key] = ChatGoogleGenerativeAI(model=model, temperature=temperature)
+            init_timings[f"llm:{model}@{temperature}"] = time.perf_counter() - started
+        return _llms[key]
+
+
+def get_embeddings(model: str = EMBEDDING_MODEL):
+    """Returns the shared Ollama embedding client for `model`, creating it on first use."""
+    with _lock:
+        if model not in _embeddings:
+            started = time.perf_counter()
+            from .ollama_embeddings import OllamaEmbeddingClient
+            _embeddings[model] = OllamaEmbeddingClient(model, OLLAMA_HOST)
+            init_timings[f"embeddings:{model}"] = time.perf_counter() - started
+        return _embeddings[model]
+
+
+def embedding_space(model: str = EMBEDDING_MODEL) -> str:
+    """
+    Names the vector space `model` produces with the configured Ollama API.
+    Cached vectors are only reused within the same space.
+    """
+    from .ollama_embeddings import OLLAMA_EMBED_API
+    return model if OLLAMA_EMBED_API == "embeddings" else f"{model}@{OLLAMA_EMBED_API}"
+
+
+def embedding_stats() -> Dict[Tuple[Tuple[str, str], ...], float]:
+    """Throughput and batching statistics of the embedding clients, labelled by model."""
+    with _lock:
+        items = list(_embeddings.items())
+    return {
+        (("model", model), ("stat", stat)): value
+        for model, client in items if hasattr(client, "stats")
+        for stat, value in client.stats().items()
+    }
+
+
+registry.register(GaugeCallback("embedding_client", "Embedding client batching and throughput.", embedding_stats))
+
+
+async def aclose() -> None:
+    """Closes the pooled HTTP connections of the embedding clients."""
+    with _lock:
+        clients = list(_embeddings.values())
+    for client in clients:
+        if hasattr(client, "aclose"):
+            await client.aclose()
+
+
+def set_llm(temperature: float, llm, model: str = GEMINI_MODEL) -> None:
+    """Installs a client for (model, temperature), e.g. a local stand-in for benchmarks."""
+    with _lock:
+        _llms[(model, temperature)] = llm
+
+
+def set_embeddings(embeddings, model: str = EMBEDDING_MODEL) -> None:
+    """Installs the embedding client used for `model`."""
+    with _lock:
+        _embeddings[model] = embeddings
+
+
+def warm_up(temperatures=(0.3, 0.5)) -> Dict[str, float]:
+    """
+    Creates the clients the services use ahead of the first request and
+    imports the vector store stack. Returns the seconds spent per step.
+    """
+    timings = {}
+    started = time.perf_counter()
+    import faiss  # noqa: F401
+    from langchain_community.vectorstores import FAISS  # noqa: F401
+    timings["import:faiss"] = time.perf_counter() - started
+    get_embeddings()
+    for temperature in temperatures:
+        try:
+            get_llm(temperature)
+        except ValueError as e:
+            # A missing key should fail the first LLM request, not the whole worker
+            print(f"Skipping LLM warm-up: {e}")
+            break
+    timings.update(init_timings)
+    return timings
@@ -0,0 +1,130 @@
+"""
+Token-budgeted prompt context. Chat and quiz prompts used to take a fixed
+number of chunks however many PDFs or questions were involved; here each
+prompt gets a token budget instead, and chunks are picked round-robin
+across the PDFs until it is spent, skipping near-duplicates by embedding.
+"""
+import os
+import math
+from collections import deque
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .metrics import PROMPT_TOKENS
+
+# Gemini averages about four characters per token on English text; used instead of a tokenizer call
+CONTEXT_CHARS_PER_TOKEN = float(os.getenv("CONTEXT_CHARS_PER_TOKEN", "4"))
+# Chunks at least this cosine-similar to one already chosen are skipped
+CONTEXT_DEDUPE_THRESHOLD = float(os.getenv("CONTEXT_DEDUPE_THRESHOLD", "0.95"))
+
+# --- Chat budget: grows with the number of PDFs so each one gets a share ---
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "1500"))
+CHAT_CONTEXT_TOKENS_PER_EXTRA_PDF = int(os.getenv("CHAT_CONTEXT_TOKENS_PER_EXTRA_PDF", "250"))
+CHAT_CONTEXT_MAX_TOKENS = int(os.getenv("CHAT_CONTEXT_MAX_TOKENS", "6000"))
+
+# --- Quiz budget: a base plus a share per requested question ---
+QUIZ_CONTEXT_BASE_TOKENS = int(os.getenv("QUIZ_CONTEXT_BASE_TOKENS", "1000"))
+QUIZ_CONTEXT_TOKENS_PER_MCQ = int(os.getenv("QUIZ_CONTEXT_TOKENS_PER_MCQ", "200"))
+QUIZ_CONTEXT_TOKENS_PER_SAQ = int(os.getenv("QUIZ_CONTEXT_TOKENS_PER_SAQ", "250"))
+QUIZ_CONTEXT_TOKENS_PER_LAQ = int(os.getenv("QUIZ_CONTEXT_TOKENS_PER_LAQ", "500"))
+QUIZ_CONTEXT_MAX_TOKENS = int(os.getenv("QUIZ_CONTEXT_MAX_TOKENS", "12000"))
+
+# Context for YouTube topics, about the fifteen chunks it used to get
+TOPIC_CONTEXT_TOKENS = int(os.getenv("TOPIC_CONTEXT_TOKENS", "3500"))
+
+# Size of a full chunk (1000 characters), used to turn a budget into a number of candidates
+_CHUNK_TOKENS = 250
+# Candidates fetched beyond what the budget needs, to make up for skipped duplicates
+_CANDIDATE_OVERSAMPLE = 1.5
+_MAX_CANDIDATES_PER_PDF = 32
+
+
+def count_tokens(text: str) -> int:
+    return math.ceil(len(text) / CONTEXT_CHARS_PER_TOKEN)
+
+
+def chat_budget(num_pdfs: int) -> int:
+    extra = CHAT_CONTEXT_TOKENS_PER_EXTRA_PDF * max(0, num_pdfs - 1)
+    return min(CHAT_CONTEXT_MAX_TOKENS, CHAT_CONTEXT_TOKENS + extra)
+
+
+def quiz_budget(num_mcqs: int, num_saqs: int, num_laqs: int) -> int:
+    budget = (
+        QUIZ_CONTEXT_BASE_TOKENS
+        + QUIZ_CONTEXT_TOKENS_PER_MCQ * num_mcqs
+        + QUIZ_CONTEXT_TOKENS_PER_SAQ * num_saqs
+        + QUIZ_CONTEXT_TOKENS_PER_LAQ * num_laqs
+    )
+    return min(QUIZ_CONTEXT_MAX_TOKENS, budget)
+
+
+def candidates_per_pdf(budget_tokens: int, num_pdfs: int) -> int:
+    """How many chunks to retrieve from each PDF so the budget can be filled."""
+    wanted = budget_tokens / _CHUNK_TOKENS * _CANDIDATE_OVERSAMPLE / max(1, num_pdfs)
+    return max(2, min(_MAX_CANDIDATES_PER_PDF, math.ceil(wanted)))
+
+
+class ContextChunk:
+    """A candidate chunk; `vector` is its embedding, or None to skip the duplicate check."""
+
+    def __init__(self, page, text: str, vector: Optional[np.ndarray] = None):
+        self.page = page
+        self.text = text
+        self.vector = vector
+        self.formatted = f"Content from page {page}:\n{text}"
+        # The separator between chunks is counted with the chunk
+        self.tokens = count_tokens(self.formatted) + 1
+
+
+def select_chunks(candidates: Dict[str, List[ContextChunk]], budget_tokens: int,
+                  dedupe_threshold: float = CONTEXT_DEDUPE_THRESHOLD) -> List[ContextChunk]:
+    """
+    Picks chunks until `budget_tokens` is spent, one per PDF per round so
+    every PDF gets a fair share. Each PDF's candidates are taken in the
+    given order (best first); a chunk that doesn't fit the remaining budget
+    or nearly duplicates a chosen one is passed over for the next.
+    """
+    queues = [deque(chunks) for chunks in candidates.values() if chunks]
+    chosen: List[ContextChunk] = []
+    # Unit vectors of the chosen chunks fill the first `num_chosen_vectors` rows, so each
+    # duplicate check is one matrix-vector product instead of re-stacking every chosen vector
+    chosen_vectors: Optional[np.ndarray] = None
+    num_chosen_vectors = 0
+    used = 0
+    while queues:
+        for queue in list(queues):
+            while queue:
+                chunk = queue.popleft()
+                if used + chunk.tokens > budget_tokens:
+                    continue
+                if chunk.vector is not None:
+                    unit = chunk.vector / (np.linalg.norm(chunk.vector) or 1.0)
+                    if num_chosen_vectors and float(np.max(chosen_vectors[:num_chosen_vectors] @ unit)) >= dedupe_threshold:
+                        continue
+                    if chosen_vectors is None:
+                        # No more chunks can be chosen than there are candidates
+                        rows = sum(len(queue) for queue in queues) + 1
+                        chosen_vectors = np.empty((rows, len(unit)), dtype=np.float32)
+                    chosen_vectors[num_chosen_vectors] = unit
+                    num_chosen_vectors += 1
+                chosen.append(chunk)
+                used += chunk.tokens
+                break
+            if not queue:
+                queues.remove(queue)
+    return chosen
+
+
+def format_context(chunks: List[ContextChunk]) -> str:
+    return "\n\n".join(chunk.formatted for chunk in chunks)
+
+
+def log_prompt(operation: str, prompt_text: str, chunks: List[ContextChunk], num_pdfs: int, budget_tokens: int) -> None:
+    """Records the estimated size of a prompt about to be sent to the LLM."""
+    tokens = count_tokens(prompt_text)
+    PROMPT_TOKENS.observe(tokens, operation=operation)
+    print(
+        f"[context] {operation} prompt: ~{tokens} tokens, {len(chunks)} chunks from {num_pdfs} PDF(s), "
+        f"context {sum(chunk.tokens for chunk in chunks)}/{budget_tokens} tokens"
+    )
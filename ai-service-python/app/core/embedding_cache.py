@@ -0,0 +1,256 @@
+import os
+import re
+import time
+import zlib
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .metrics import GaugeCallback, registry
+from .store_cache import VECTOR_STORE_DIR
+
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", os.path.join(VECTOR_STORE_DIR, "embedding_cache"))
+# Maximum number of cached vectors per model (768-dim float32 is ~3 KiB each)
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "500000"))
+# Share of entries dropped at once when the cache is full, so eviction is not run on every insert
+EMBED_CACHE_EVICT_FRACTION = 0.05
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key        TEXT PRIMARY KEY,
+    slot       INTEGER NOT NULL UNIQUE,
+    last_used  REAL NOT NULL,
+    checksum   INTEGER
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+CREATE TABLE IF NOT EXISTS free_slots (slot INTEGER PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+def embedding_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    On-disk cache of embedding vectors for one model, keyed by a hash of the
+    model name and chunk text. Vectors are stored as fixed-size float32 rows
+    in a flat `.f32` file; a SQLite index maps each key to its row. When the
+    cache is full the least recently used rows are freed and reused.
+
+    Several processes may share the cache (API workers and the ingestion
+    worker). Inserts run in a `BEGIN IMMEDIATE` transaction, so SQLite's
+    write lock also guards slot allocation and writes to the vector file.
+    Lookups only read: each entry records a CRC32 of its row, and a row a
+    concurrent insert is reusing no longer matches it and counts as a miss.
+    Only the `last_used` update of the hits takes the write lock.
+    """
+
+    def __init__(self, cache_dir: str, model: str, max_entries: int):
+        os.makedirs(cache_dir, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9_.-]", "_", model)
+        self.model = model
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # Autocommit, so the only transactions are the explicit ones below
+        self._conn = sqlite3.connect(
+            os.path.join(cache_dir, f"{slug}.db"), check_same_thread=False, isolation_level=None, timeout=30,
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(entries)")}
+        if "checksum" not in columns:
+            # Caches created before checksums; their rows fail verification once and are re-embedded
+            self._conn.execute("ALTER TABLE entries ADD COLUMN checksum INTEGER")
+        self._fd = os.open(os.path.join(cache_dir, f"{slug}.f32"), os.O_RDWR | os.O_CREAT, 0o644)
+        self._dim: Optional[int] = None
+        self._load_dim()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _load_dim(self) -> None:
+        # Another process may have stored the first vector since this one opened the cache
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+        if row:
+            self._dim = int(row[0])
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Returns the cached vectors for whichever of `keys` are present."""
+        if self._dim is None:
+            with self._lock:
+                self._load_dim()
+        if self._dim is None or not keys:
+            self.misses += len(keys)
+            return {}
+        row_bytes = self._dim * 4
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            # A deferred transaction only reads, so lookups never wait for the write lock
+            self._conn.execute("BEGIN")
+            try:
+                # Stay well below SQLite's bound-parameter limit
+                for i in range(0, len(keys), 500):
+                    part = keys[i:i + 500]
+                    placeholders = ",".join("?" * len(part))
+                    for key, slot, checksum in self._conn.execute(
+                        f"SELECT key, slot, checksum FROM entries WHERE key IN ({placeholders})", part
+                    ).fetchall():
+                        data = os.pread(self._fd, row_bytes, slot * row_bytes)
+                        if checksum is not None and zlib.crc32(data) == checksum:
+                            found[key] = np.frombuffer(data, dtype=np.float32).tolist()
+            finally:
+                self._conn.execute("COMMIT")
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        if found:
+            now = time.time()
+            with self._transaction():
+                self._conn.executemany(
+                    "UPDATE entries SET last_used = ? WHERE key = ?", [(now, key) for key in found]
+                )
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        if not items:
+            return
+        with self._transaction():
+            if self._dim is None:
+                self._load_dim()
+            if self._dim is None:
+                self._dim = len(next(iter(items.values())))
+                self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('dim', ?)", (str(self._dim),))
+            row_bytes = self._dim * 4
+            now = time.time()
+            for key, vector in items.items():
+                if len(vector) != self._dim:
+                    continue
+                existing = self._conn.execute("SELECT slot FROM entries WHERE key = ?", (key,)).fetchone()
+                slot = existing[0] if existing else self._allocate_slot()
+                data = np.asarray(vector, dtype=np.float32).tobytes()
+                os.pwrite(self._fd, data, slot * row_bytes)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", (key, slot, now, zlib.crc32(data))
+                )
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+    # --- Helpers below must be called inside self._transaction() ---
+
+    def _allocate_slot(self) -> int:
+        row = self._conn.execute("SELECT slot FROM free_slots LIMIT 1").fetchone()
+        if row is None:
+            count, max_slot = self._conn.execute("SELECT COUNT(*), MAX(slot) FROM entries").fetchone()
+            if count < self.max_entries:
+                return 0 if max_slot is None else max_slot + 1
+            self._evict_oldest(max(1, int(self.max_entries * EMBED_CACHE_EVICT_FRACTION)))
+            row = self._conn.execute("SELECT slot FROM free_slots LIMIT 1").fetchone()
+        self._conn.execute("DELETE FROM free_slots WHERE slot = ?", (row[0],))
+        return row[0]
+
+    def _evict_oldest(self, count: int) -> None:
+        rows = self._conn.execute(
+            "SELECT key, slot FROM entries ORDER BY last_used LIMIT ?", (count,)
+        ).fetchall()
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in rows])
+        self._conn.executemany("INSERT OR IGNORE INTO free_slots VALUES (?)", [(slot,) for _, slot in rows])
+        self.evictions += len(rows)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model so document chunks that were embedded before
+    are served from the on-disk cache and only new chunks reach the model.
+    Query embeddings are passed straight through.
+    """
+
+    def __init__(self, underlying: Embeddings, model: str, cache: EmbeddingCache):
+        self.underlying = underlying
+        self.model = model
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+
+    def _split(self, texts: List[str]):
+        keys = [embedding_key(self.model, text) for text in texts]
+        cached = self.cache.get_many(keys)
+        missing = [i for i, key in enumerate(keys) if key not in cached]
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        return keys, cached, missing
+
+    def _merge(self, keys, cached, missing, new_vectors) -> List[List[float]]:
+        self.cache.put_many({keys[i]: vector for i, vector in zip(missing, new_vectors)})
+        for i, vector in zip(missing, new_vectors):
+            cached[keys[i]] = vector
+        return [cached[key] for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, cached, missing = self._split(texts)
+        new_vectors = self.underlying.embed_documents([texts[i] for i in missing]) if missing else []
+        return self._merge(keys, cached, missing, new_vectors)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Cache lookups touch SQLite and the vector file, so keep them off the event loop
+        keys, cached, missing = await asyncio.to_thread(self._split, texts)
+        new_vectors = await self.underlying.aembed_documents([texts[i] for i in missing]) if missing else []
+        return await asyncio.to_thread(self._merge, keys, cached, missing, new_vectors)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.underlying.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.underlying.aembed_query(text)
+
+
+_caches: Dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model: str) -> EmbeddingCache:
+    """Returns the process-wide cache for `model`, opening it on first use."""
+    with _caches_lock:
+        if model not in _caches:
+            _caches[model] = EmbeddingCache(EMBED_CACHE_DIR, model, EMBED_CACHE_MAX_ENTRIES)
+        return _caches[model]
+
+
+def _collect_cache_stats():
+    with _caches_lock:
+        caches = list(_caches.values())
+    return {
+        (("model", cache.model), ("stat", stat)): value
+        for cache in caches for stat, value in cache.stats().items()
+    }
+
+
+registry.register(GaugeCallback("embedding_cache", "On-disk embedding cache statistics.", _collect_cache_stats))
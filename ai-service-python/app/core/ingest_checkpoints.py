@@ -0,0 +1,138 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .store_cache import VECTOR_STORE_DIR
+
+INGEST_CHECKPOINT_DIR = os.getenv("INGEST_CHECKPOINT_DIR", os.path.join(VECTOR_STORE_DIR, "checkpoints"))
+# Checkpoints older than this are discarded instead of resumed, e.g. after a job was given up on
+INGEST_CHECKPOINT_MAX_AGE_SECONDS = float(os.getenv("INGEST_CHECKPOINT_MAX_AGE_SECONDS", "86400"))
+
+MANIFEST_FILE = "manifest.json"
+SOURCE_FILE = "source.pdf"
+# Per-page text hashes and chunk rows of a finished store, used to reuse unchanged pages
+PAGES_FILE = "pages.json"
+
+
+def page_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class PageBatch:
+    """Chunks and embeddings of one batch of pages, in page order."""
+
+    def __init__(self, pages: List[Tuple[int, str]], texts: List[str], metadatas: List[Dict[str, Any]],
+                 vectors: np.ndarray):
+        # (page number, text hash) for every page in the batch, including empty ones
+        self.pages = pages
+        self.texts = texts
+        self.metadatas = metadatas
+        self.vectors = vectors
+
+
+class IngestCheckpoint:
+    """
+    Progress of one PDF's ingestion, kept on disk until its store is saved:
+    the downloaded PDF and, per finished batch of pages, the page hashes,
+    chunks and embeddings. A retry resumes from here and only redoes the
+    batches that are missing.
+    """
+
+    def __init__(self, pdf_id: str, pdf_url: str):
+        self.pdf_id = pdf_id
+        self.pdf_url = pdf_url
+        self.dir = os.path.join(INGEST_CHECKPOINT_DIR, pdf_id)
+        self.manifest = self._load_manifest()
+
+    @property
+    def source_path(self) -> str:
+        return os.path.join(self.dir, SOURCE_FILE)
+
+    def _load_manifest(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(self.dir, MANIFEST_FILE)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = None
+        stale = (
+            manifest is None
+            or manifest.get("pdf_url") != self.pdf_url
+            or time.time() - manifest.get("created_at", 0) > INGEST_CHECKPOINT_MAX_AGE_SECONDS
+            or not os.path.exists(self.source_path)
+        )
+        if stale:
+            # Nothing usable; start from an empty directory
+            self.clear()
+            os.makedirs(self.dir, exist_ok=True)
+            return None
+        return manifest
+
+    def download(self) -> Optional[Tuple[int, str]]:
+        """Returns (size, content hash) of an already downloaded PDF, or None."""
+        if self.manifest is None:
+            return None
+        return self.manifest["size"], self.manifest["content_hash"]
+
+    def save_download(self, size: int, content_hash: str) -> None:
+        self.manifest = {
+            "pdf_url": self.pdf_url, "size": size, "content_hash": content_hash, "created_at": time.time(),
+        }
+        path = os.path.join(self.dir, MANIFEST_FILE)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(self.manifest, f)
+        os.replace(f"{path}.tmp", path)
+
+    def _batch_path(self, start: int, end: int, ext: str) -> str:
+        return os.path.join(self.dir, f"pages-{start:06d}-{end:06d}.{ext}")
+
+    def completed(self, ranges: List[Tuple[int, int]]) -> Set[Tuple[int, int]]:
+        # The JSON file is written last, so its presence marks a complete batch
+        return {r for r in ranges if os.path.exists(self._batch_path(*r, "json"))}
+
+    def save_batch(self, start: int, end: int, batch: PageBatch) -> None:
+        vectors_path = self._batch_path(start, end, "npy")
+        with open(f"{vectors_path}.tmp", "wb") as f:
+            np.save(f, batch.vectors)
+        os.replace(f"{vectors_path}.tmp", vectors_path)
+        chunks_path = self._batch_path(start, end, "json")
+        with open(f"{chunks_path}.tmp", "w") as f:
+            json.dump({"pages": batch.pages, "texts": batch.texts, "metadatas": batch.metadatas}, f)
+        os.replace(f"{chunks_path}.tmp", chunks_path)
+
+    def load_batch(self, start: int, end: int) -> PageBatch:
+        with open(self._batch_path(start, end, "json")) as f:
+            data = json.load(f)
+        vectors = np.load(self._batch_path(start, end, "npy"))
+        return PageBatch([tuple(p) for p in data["pages"]], data["texts"], data["metadatas"], vectors)
+
+    def clear(self) -> None:
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+def discard_checkpoint(pdf_id: str) -> None:
+    shutil.rmtree(os.path.join(INGEST_CHECKPOINT_DIR, pdf_id), ignore_errors=True)
+
+
+def save_page_manifest(store_path: str, pages: List[Tuple[int, str, int, int]]) -> None:
+    """Records (page, text hash, first chunk row, chunk count) for every page of a store."""
+    path = os.path.join(store_path, PAGES_FILE)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump({"pages": pages}, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def load_page_manifest(store_path: str) -> Dict[int, Tuple[str, int, int]]:
+    """Returns {page: (text hash, first row, count)}, or {} if missing or older than the store."""
+    path = os.path.join(store_path, PAGES_FILE)
+    try:
+        if os.path.getmtime(path) < os.path.getmtime(os.path.join(store_path, "index.faiss")):
+            return {}
+        with open(path) as f:
+            return {page: (digest, first, count) for page, digest, first, count in json.load(f)["pages"]}
+    except (OSError, ValueError, KeyError):
+        return {}
@@ -0,0 +1,287 @@
+import os
+import json
+import time
+import fcntl
+import random
+import asyncio
+import sqlite3
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from .metrics import INGEST_JOBS
+from .store_cache import VECTOR_STORE_DIR
+
+# The queue database lives next to the stores so it shares their persistent volume
+INGEST_QUEUE_PATH = os.getenv("INGEST_QUEUE_PATH", os.path.join(VECTOR_STORE_DIR, "ingest_jobs.db"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))
+INGEST_RETRY_BASE_SECONDS = float(os.getenv("INGEST_RETRY_BASE_SECONDS", "10"))
+INGEST_RETRY_MAX_SECONDS = float(os.getenv("INGEST_RETRY_MAX_SECONDS", "300"))
+# Workers also poll on this interval so delayed retries are picked up without a new submit
+INGEST_POLL_SECONDS = float(os.getenv("INGEST_POLL_SECONDS", "2"))
+# How long a queue write waits for another process holding the database lock before failing
+INGEST_DB_TIMEOUT_SECONDS = float(os.getenv("INGEST_DB_TIMEOUT_SECONDS", "30"))
+# Held by the one process running the workers, so several uvicorn workers never share the queue
+INGEST_OWNER_LOCK_PATH = INGEST_QUEUE_PATH + ".owner.lock"
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# A handler processes one job and returns extra fields to record, e.g. the content hash
+JobHandler = Callable[[str, str], Awaitable[Dict[str, Any]]]
+GiveUpHandler = Callable[[str], Awaitable[None]]
+
+T = TypeVar("T")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    pdf_id        TEXT PRIMARY KEY,
+    pdf_url       TEXT NOT NULL,
+    state         TEXT NOT NULL,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    content_hash  TEXT,
+    error         TEXT,
+    timings       TEXT,
+    created_at    REAL NOT NULL,
+    next_run_at   REAL NOT NULL,
+    started_at    REAL,
+    finished_at   REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (state, next_run_at);
+CREATE INDEX IF NOT EXISTS jobs_hash ON jobs (content_hash);
+"""
+
+
+class IngestionQueue:
+    """
+    Persistent PDF ingestion queue backed by SQLite.
+    One row per pdf_id, so a resubmitted PDF that is still queued or running
+    is deduplicated. A fixed pool of workers bounds how many PDFs are
+    processed (and how hard Ollama is hit) at once; failures are retried
+    with exponential backoff and jobs survive a restart.
+    """
+
+    def __init__(self, path: str, num_workers: int, max_attempts: int):
+        self.path = path
+        self.num_workers = num_workers
+        self.max_attempts = max_attempts
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None, timeout=INGEST_DB_TIMEOUT_SECONDS,
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._workers: List[asyncio.Task] = []
+        self._owner_lock = None
+
+    # --- Job bookkeeping ---
+
+    def submit(self, pdf_id: str, pdf_url: str) -> Dict[str, Any]:
+        """Queues a PDF. Returns the existing job if it is already queued or running."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE pdf_id = ?", (pdf_id,)).fetchone()
+            if row is not None and row["state"] in (QUEUED, RUNNING):
+                print(f"[{pdf_id}] Already {row['state']}, not queueing again.")
+                return _row_to_job(row)
+            self._conn.execute(
+                """INSERT OR REPLACE INTO jobs (pdf_id, pdf_url, state, attempts, content_hash,
+                       error, timings, created_at, next_run_at, started_at, finished_at)
+                   VALUES (?, ?, ?, 0, NULL, NULL, NULL, ?, ?, NULL, NULL)""",
+                (pdf_id, pdf_url, QUEUED, now, now),
+            )
+            row = self._conn.execute("SELECT * FROM jobs WHERE pdf_id = ?", (pdf_id,)).fetchone()
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return _row_to_job(row)
+
+    def get(self, pdf_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE pdf_id = ?", (pdf_id,)).fetchone()
+        return _row_to_job(row) if row is not None else None
+
+    def remove(self, pdf_id: str) -> bool:
+        """Forgets a job that is not running, e.g. because its PDF was deleted."""
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM jobs WHERE pdf_id = ? AND state != ?", (pdf_id, RUNNING))
+        return cursor.rowcount > 0
+
+    def find_done_by_hash(self, content_hash: str, exclude_pdf_id: str) -> Optional[str]:
+        """Returns the pdf_id of a finished job with identical PDF content, if any."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT pdf_id FROM jobs WHERE content_hash = ? AND state = ? AND pdf_id != ? "
+                "ORDER BY finished_at DESC LIMIT 1",
+                (content_hash, DONE, exclude_pdf_id),
+            ).fetchone()
+        return row["pdf_id"] if row is not None else None
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            # BEGIN IMMEDIATE makes the claim atomic across processes sharing the database
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE state = ? AND next_run_at <= ? ORDER BY next_run_at LIMIT 1",
+                    (QUEUED, now),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET state = ?, attempts = attempts + 1, started_at = ? WHERE pdf_id = ?",
+                        (RUNNING, now, row["pdf_id"]),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job = _row_to_job(row)
+        job["attempts"] += 1
+        return job
+
+    def _finish(self, pdf_id: str, result: Dict[str, Any]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, error = NULL, content_hash = ?, timings = ?, finished_at = ? "
+                "WHERE pdf_id = ?",
+                (DONE, result.get("content_hash"), json.dumps(result.get("timings") or {}), time.time(), pdf_id),
+            )
+
+    def _fail(self, job: Dict[str, Any], error: str) -> bool:
+        """Records a failed attempt. Returns True if the job will be retried."""
+        retry = job["attempts"] < self.max_attempts
+        now = time.time()
+        with self._lock:
+            if retry:
+                delay = min(INGEST_RETRY_BASE_SECONDS * 2 ** (job["attempts"] - 1), INGEST_RETRY_MAX_SECONDS)
+                delay *= random.uniform(0.8, 1.2)
+                self._conn.execute(
+                    "UPDATE jobs SET state = ?, error = ?, next_run_at = ? WHERE pdf_id = ?",
+                    (QUEUED, error, now + delay, job["pdf_id"]),
+                )
+                print(f"[{job['pdf_id']}] Attempt {job['attempts']} failed, retrying in {delay:.0f}s.")
+            else:
+                self._conn.execute(
+                    "UPDATE jobs SET state = ?, error = ?, finished_at = ? WHERE pdf_id = ?",
+                    (FAILED, error, now, job["pdf_id"]),
+                )
+        return retry
+
+    def _requeue_interrupted(self) -> None:
+        # Jobs left running by a crashed or restarted process are picked up again
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, next_run_at = ? WHERE state = ?",
+                (QUEUED, time.time(), RUNNING),
+            )
+
+    # --- Worker pool ---
+
+    def acquire_ownership(self) -> bool:
+        """
+        Takes the owner lock without waiting. Returns False if another
+        process holds it; that process runs the workers and the requeue of
+        interrupted jobs, so this one must only submit. The lock is released
+        when the process exits, however it exits.
+        """
+        if self._owner_lock is not None:
+            return True
+        lock = open(INGEST_OWNER_LOCK_PATH, "w")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            return False
+        self._owner_lock = lock
+        return True
+
+    def start(self, handler: JobHandler, on_give_up: GiveUpHandler) -> None:
+        # Running jobs are only requeued by the owner, since no other process can still be running them
+        if not self.acquire_ownership():
+            raise RuntimeError("Another process is already running the ingestion queue.")
+        self._requeue_interrupted()
+        self._wakeup = asyncio.Event()
+        self._workers = [
+            asyncio.create_task(self._worker(handler, on_give_up)) for _ in range(self.num_workers)
+        ]
+        print(f"Ingestion queue started with {self.num_workers} workers.")
+
+    async def stop(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._owner_lock is not None:
+            self._owner_lock.close()
+            self._owner_lock = None
+
+    async def _bookkeeping(self, fn: Callable[..., T], *args: Any) -> T:
+        """
+        Runs a queue database call in a thread, retrying with backoff while the
+        database is locked or otherwise unavailable. Giving up would leave a
+        finished job marked running, so this retries until it succeeds.
+        """
+        failures = 0
+        while True:
+            try:
+                return await asyncio.to_thread(fn, *args)
+            except sqlite3.Error as e:
+                failures += 1
+                delay = min(INGEST_POLL_SECONDS * 2 ** (failures - 1), INGEST_RETRY_MAX_SECONDS)
+                print(f"[ingest] Queue database error in {fn.__name__} ({e}), retrying in {delay:.0f}s.")
+                await asyncio.sleep(delay)
+
+    async def _worker(self, handler: JobHandler, on_give_up: GiveUpHandler) -> None:
+        while True:
+            try:
+                await self._process_next(handler, on_give_up)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # A worker that dies here would stop ingestion without a trace
+                print(f"[ingest] Worker error: {e!r}, continuing in {INGEST_POLL_SECONDS:.0f}s.")
+                await asyncio.sleep(INGEST_POLL_SECONDS)
+
+    async def _process_next(self, handler: JobHandler, on_give_up: GiveUpHandler) -> None:
+        """Claims and processes one job, or waits for one to become ready."""
+        job = await self._bookkeeping(self._claim)
+        if job is None:
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=INGEST_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            return
+
+        pdf_id = job["pdf_id"]
+        print(f"[{pdf_id}] Starting ingestion (attempt {job['attempts']}/{self.max_attempts}).")
+        try:
+            result = await handler(pdf_id, job["pdf_url"])
+        except asyncio.CancelledError:
+            # Left as running; it is requeued on the next start
+            raise
+        except Exception as e:
+            print(f"[{pdf_id}] ERROR during processing: {e}")
+            retrying = await self._bookkeeping(self._fail, job, str(e))
+            INGEST_JOBS.inc(outcome="retry" if retrying else "failed")
+            if not retrying:
+                await on_give_up(pdf_id)
+        else:
+            await self._bookkeeping(self._finish, pdf_id, result or {})
+            INGEST_JOBS.inc(outcome="done")
+
+
+def _row_to_job(row: sqlite3.Row) -> Dict[str, Any]:
+    job = dict(row)
+    job["timings"] = json.loads(job["timings"]) if job["timings"] else None
+    return job
+
+
+ingestion_queue = IngestionQueue(INGEST_QUEUE_PATH, INGEST_WORKERS, INGEST_MAX_ATTEMPTS)
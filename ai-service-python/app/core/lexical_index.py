@@ -0,0 +1,186 @@
+"""
+BM25 inverted index stored next to a native store. Vector search misses
+exact terms (names, identifiers, formula symbols) that a keyword match
+finds, so retrieval fuses both. The index is a handful of .npy arrays,
+memory-mapped on open like the chunk columns:
+
+- bm25.vocab.npy: sorted terms as fixed-width bytes, looked up with searchsorted
+- bm25.idf.npy: inverse document frequency per term
+- bm25.offsets.npy: where each term's postings start in the two arrays below
+- bm25.rows.npy / bm25.weights.npy: chunk rows containing the term, and the
+  term's BM25 weight in that chunk with length normalization already applied
+
+so scoring a query is one slice-and-add per query term.
+"""
+import os
+import re
+import json
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Fuse BM25 hits with vector hits at query time; when off, retrieval is vector-only
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+# Reciprocal rank fusion constant; larger values flatten the gap between top and lower ranks
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+VOCAB_FILE = "bm25.vocab.npy"
+IDF_FILE = "bm25.idf.npy"
+OFFSETS_FILE = "bm25.offsets.npy"
+ROWS_FILE = "bm25.rows.npy"
+WEIGHTS_FILE = "bm25.weights.npy"
+# Written last, so a store whose arrays are all in place has this file
+LEXICAL_INFO_FILE = "bm25.json"
+LEXICAL_FILES = (VOCAB_FILE, IDF_FILE, OFFSETS_FILE, ROWS_FILE, WEIGHTS_FILE, LEXICAL_INFO_FILE)
+
+LEXICAL_FORMAT_VERSION = 1
+
+# Longer tokens are mostly hashes, URLs or extraction noise, and would widen every vocabulary entry
+_MAX_TERM_BYTES = 32
+_TOKEN_RE = re.compile(r"\w+")
+_STOPWORDS = frozenset("""
+a an and are as at be been but by can do does for from had has have how if in into is it its
+may more most no not of on or so such than that the their them then there these they this
+to was we were what when where which while who why will with would you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens without stopwords; single characters are kept only if they are digits."""
+    return [
+        token for token in _TOKEN_RE.findall(text.lower())
+        if (len(token) > 1 or token.isdigit()) and token not in _STOPWORDS
+    ]
+
+
+class LexicalIndexBuilder:
+    """Collects postings one chunk at a time, so a store's texts never have to be in memory together."""
+
+    def __init__(self):
+        self._postings: Dict[bytes, Tuple[List[int], List[int]]] = {}
+        self._doc_lengths: List[int] = []
+
+    def add(self, text: str) -> None:
+        row = len(self._doc_lengths)
+        counts = Counter(tokenize(text))
+        self._doc_lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            key = term.encode("utf-8")
+            if len(key) > _MAX_TERM_BYTES:
+                continue
+            rows, tfs = self._postings.setdefault(key, ([], []))
+            rows.append(row)
+            tfs.append(tf)
+
+    def arrays(self, k1: float = BM25_K1, b: float = BM25_B) -> Dict[str, np.ndarray]:
+        postings = self._postings
+        count = len(self._doc_lengths)
+        doc_lengths = np.asarray(self._doc_lengths, dtype=np.float32)
+        vocab = sorted(postings)
+        dfs = np.fromiter((len(postings[term][0]) for term in vocab), dtype=np.int64, count=len(vocab))
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(dfs)
+        rows = np.fromiter((row for term in vocab for row in postings[term][0]), dtype=np.int32, count=int(offsets[-1]))
+        tfs = np.fromiter((tf for term in vocab for tf in postings[term][1]), dtype=np.float32, count=int(offsets[-1]))
+
+        avgdl = float(doc_lengths.mean()) if count and doc_lengths.any() else 1.0
+        norms = k1 * (1 - b + b * doc_lengths[rows] / avgdl)
+        weights = tfs * (k1 + 1) / (tfs + norms)
+        idf = np.log1p((count - dfs + 0.5) / (dfs + 0.5)).astype(np.float32)
+        return {
+            VOCAB_FILE: np.array(vocab, dtype=f"S{max((len(term) for term in vocab), default=1)}"),
+            IDF_FILE: idf,
+            OFFSETS_FILE: offsets,
+            ROWS_FILE: rows,
+            WEIGHTS_FILE: weights.astype(np.float32),
+        }
+
+    def write(self, store_path: str) -> None:
+        """
+        Writes the BM25 arrays next to the store. Files are renamed into
+        place with the info file last; temporary names include the pid,
+        since several processes may backfill the same older store at once.
+        """
+        arrays = self.arrays()
+        tmp = lambda name: os.path.join(store_path, f".{name}.{os.getpid()}.tmp")
+        for name, array in arrays.items():
+            with open(tmp(name), "wb") as f:
+                np.save(f, array)
+        with open(tmp(LEXICAL_INFO_FILE), "w") as f:
+            json.dump({
+                "version": LEXICAL_FORMAT_VERSION, "count": len(self._doc_lengths), "terms": len(arrays[VOCAB_FILE]),
+                "k1": BM25_K1, "b": BM25_B,
+            }, f)
+        for name in LEXICAL_FILES:
+            os.replace(tmp(name), os.path.join(store_path, name))
+
+
+def write_lexical_index(store_path: str, texts: Iterable[str]) -> None:
+    """Builds and writes the BM25 index for a store's chunk texts, in row order."""
+    builder = LexicalIndexBuilder()
+    for text in texts:
+        builder.add(text)
+    builder.write(store_path)
+
+
+def _read_current_info(store_path: str, count: int) -> Optional[Dict]:
+    try:
+        with open(os.path.join(store_path, LEXICAL_INFO_FILE)) as f:
+            info = json.load(f)
+    except FileNotFoundError:
+        return None
+    # An index built for a different version of the chunks is as good as none
+    if info.get("version") != LEXICAL_FORMAT_VERSION or info.get("count") != count:
+        return None
+    return info
+
+
+def has_lexical_index(store_path: str, count: int) -> bool:
+    return _read_current_info(store_path, count) is not None
+
+
+class LexicalIndex:
+    """Read-only, memory-mapped BM25 index of one store."""
+
+    def __init__(self, store_path: str, info: Dict):
+        self.info = info
+        load = lambda name: np.load(os.path.join(store_path, name), mmap_mode="r")
+        self.vocab = load(VOCAB_FILE)
+        self.idf = load(IDF_FILE)
+        self.offsets = load(OFFSETS_FILE)
+        self.rows = load(ROWS_FILE)
+        self.weights = load(WEIGHTS_FILE)
+        self.count = info["count"]
+
+    @classmethod
+    def open(cls, store_path: str, count: int) -> Optional["LexicalIndex"]:
+        """Returns the store's index, or None if it has no current one or there is nothing to search."""
+        info = _read_current_info(store_path, count)
+        if info is None or not info.get("terms"):
+            return None
+        return cls(store_path, info)
+
+    def search(self, terms: List[str], k: int) -> List[Tuple[float, int]]:
+        """Returns up to k (BM25 score, row) pairs for tokenized query terms, best first."""
+        keys = [key for key in {term.encode("utf-8") for term in terms} if len(key) <= self.vocab.itemsize]
+        if not keys or k <= 0:
+            return []
+        keys = np.array(keys, dtype=self.vocab.dtype)
+        positions = np.minimum(np.searchsorted(self.vocab, keys), len(self.vocab) - 1)
+        term_ids = positions[self.vocab[positions] == keys]
+        if not len(term_ids):
+            return []
+
+        scores = np.zeros(self.count, dtype=np.float32)
+        for term_id in term_ids:
+            start, end = int(self.offsets[term_id]), int(self.offsets[term_id + 1])
+            # A term occurs at most once per row, so the fancy-indexed add is safe
+            scores[self.rows[start:end]] += self.idf[term_id] * self.weights[start:end]
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(float(scores[row]), int(row)) for row in candidates]
@@ -0,0 +1,167 @@
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from .metrics import LLM_CALLS_SAVED, registry
+from .store_cache import get_store_path
+
+LLM_RESULT_CACHE_ENABLED = os.getenv("LLM_RESULT_CACHE_ENABLED", "true").lower() == "true"
+LLM_RESULT_CACHE_MAX_ENTRIES = int(os.getenv("LLM_RESULT_CACHE_MAX_ENTRIES", "10000"))
+# Grades and topics are deterministic enough to reuse for a while
+LLM_RESULT_CACHE_TTL_SECONDS = float(os.getenv("LLM_RESULT_CACHE_TTL_SECONDS", "3600"))
+# A quiz is only reused for retries of the same request; asking again later should give a new quiz
+QUIZ_RESULT_CACHE_TTL_SECONDS = float(os.getenv("QUIZ_RESULT_CACHE_TTL_SECONDS", "60"))
+
+T = TypeVar("T")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Case and whitespace differences don't change what the model is asked."""
+    return _WHITESPACE_RE.sub(" ", text).strip().casefold()
+
+
+def store_versions(pdf_ids: List[str]) -> List[Tuple[str, float]]:
+    """
+    (pdf_id, index mtime) for the sorted, unique `pdf_ids`, so results keyed
+    with them go stale when a PDF is re-ingested. Raises FileNotFoundError
+    for a PDF that has no store.
+    """
+    versions = []
+    for pdf_id in sorted(set(pdf_ids)):
+        try:
+            versions.append((pdf_id, os.path.getmtime(os.path.join(get_store_path(pdf_id), "index.faiss"))))
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Vector store not found for PDF ID: {pdf_id}.") from None
+    return versions
+
+
+def cache_key(operation: str, model: Dict[str, Any], inputs: Any) -> str:
+    """Hashes an operation, the model configuration and already normalized, JSON-serializable inputs."""
+    payload = json.dumps([operation, model, inputs], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResultCache:
+    """
+    Shares LLM results between identical calls. A call whose key is cached
+    and younger than its TTL is answered from memory; a call whose key is
+    already being computed waits for that computation instead of starting
+    its own (singleflight). Bounded to `max_entries`, evicting least
+    recently used entries first. Failures are shared with the waiters that
+    were coalesced onto them but never cached.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        # Results computed, from the model or anything else `compute` does
+        self.computed = 0
+        self.hits = 0
+        self.coalesced = 0
+        self.failures = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Returns the cached result for `key`, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() >= entry[1]:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.time() + (self.ttl if ttl is None else ttl))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def record_hit(self, operation: str, coalesced: bool = False) -> None:
+        """Counts an LLM call avoided; for callers that look results up with `get` themselves."""
+        with self._lock:
+            if coalesced:
+                self.coalesced += 1
+            else:
+                self.hits += 1
+        LLM_CALLS_SAVED.inc(operation=operation, reason="coalesced" if coalesced else "cached")
+
+    def record_computed(self) -> None:
+        with self._lock:
+            self.computed += 1
+
+    async def get_or_compute(self, operation: str, key: str, compute: Callable[[], Awaitable[T]],
+                             cacheable: Callable[[T], bool] = lambda result: True,
+                             ttl: Optional[float] = None) -> T:
+        """
+        Returns the cached result for `key`, joins an identical call in
+        flight, or runs `compute` and caches its result if `cacheable` accepts it.
+        """
+        if not self.enabled:
+            return await compute()
+        cached = self.get(key)
+        if cached is not None:
+            self.record_hit(operation)
+            return cached
+
+        future = self._in_flight.get(key)
+        if future is not None and not future.done() and future.get_loop() is asyncio.get_running_loop():
+            self.record_hit(operation, coalesced=True)
+            # Shielded, so one waiter giving up doesn't cancel the call for the others
+            return await asyncio.shield(future)
+
+        self.record_computed()
+        future = asyncio.ensure_future(self._compute(key, compute, cacheable, ttl))
+        # Retrieve the outcome even if every waiter was cancelled, so a failure isn't reported as unhandled
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._in_flight[key] = future
+        return await asyncio.shield(future)
+
+    async def _compute(self, key: str, compute: Callable[[], Awaitable[T]],
+                       cacheable: Callable[[T], bool], ttl: Optional[float]) -> T:
+        try:
+            result = await compute()
+        except BaseException:
+            with self._lock:
+                self.failures += 1
+            raise
+        finally:
+            # Only if it is still ours; a call left over from another event loop may have been replaced
+            if self._in_flight.get(key) is asyncio.current_task():
+                del self._in_flight[key]
+        if result is not None and cacheable(result):
+            self.put(key, result, ttl)
+        return result
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            saved = self.hits + self.coalesced
+            requests = saved + self.computed
+            return {
+                "entries": len(self._entries),
+                "in_flight": len(self._in_flight),
+                "computed": self.computed,
+                "cache_hits": self.hits,
+                "coalesced": self.coalesced,
+                "llm_calls_saved": saved,
+                "failures": self.failures,
+                "saved_rate": saved / requests if requests else 0.0,
+            }
+
+
+llm_result_cache = LLMResultCache(LLM_RESULT_CACHE_MAX_ENTRIES, LLM_RESULT_CACHE_TTL_SECONDS, LLM_RESULT_CACHE_ENABLED)
+registry.gauge_callback("llm_result_cache", "LLM result cache and request coalescing statistics.", llm_result_cache.stats)
@@ -0,0 +1,228 @@
+import os
+import json
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Log one JSON line with the span timings of every HTTP request
+REQUEST_TIMING_LOGS = os.getenv("REQUEST_TIMING_LOGS", "true").lower() == "true"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# Span durations recorded while handling the current request, keyed by span name
+_request_spans: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "request_spans", default=None
+)
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: (per-bucket counts with a trailing +Inf slot, sum, count)
+        self._series: Dict[LabelKey, Tuple[List[int], float, int]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = _label_key(labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total, count = self._series.get(key) or ([0] * (len(self.buckets) + 1), 0.0, 0)
+            counts[slot] += 1
+            self._series[key] = (counts, total + value, count + 1)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{_format_labels(key, (('le', repr(bound)),))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', '+Inf'),))} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class GaugeCallback:
+    """A gauge whose values are read from `fn` at scrape time, e.g. cache statistics."""
+
+    def __init__(self, name: str, help_text: str, fn: Callable[[], Dict[LabelKey, float]]):
+        self.name = name
+        self.help_text = help_text
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        try:
+            values = self.fn()
+        except Exception as e:
+            print(f"[metrics] Failed to collect {self.name}: {e}")
+            return lines
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self.register(Counter(name, help_text))
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, buckets))
+
+    def gauge_callback(self, name: str, help_text: str, fn: Callable[[], Dict[str, float]], label: str = "stat"):
+        """Registers a gauge reporting each key of the dict returned by `fn` as a label value."""
+        def collect():
+            return {((label, key),): value for key, value in fn().items()}
+        return self.register(GaugeCallback(name, help_text, collect))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# --- Hot-path metrics ---
+STORE_LOAD_SECONDS = registry.histogram("store_load_seconds", "Time to load a FAISS store from disk.")
+EMBEDDING_SECONDS = registry.histogram("embedding_seconds", "Time spent in embedding calls.")
+RETRIEVAL_SECONDS = registry.histogram("retrieval_seconds", "Time to retrieve chunks for a chat query.")
+LLM_SECONDS = registry.histogram("llm_seconds", "Duration of LLM calls by operation.")
+CHAT_TTFT_SECONDS = registry.histogram("chat_time_to_first_token_seconds", "Time from /chat request to the first streamed token.")
+CHAT_STREAM_SECONDS = registry.histogram("chat_stream_seconds", "Time spent streaming a chat answer after the first token.")
+GRADING_SECONDS = registry.histogram("grading_question_seconds", "Time to grade one free-text answer.")
+INGEST_STAGE_SECONDS = registry.histogram(
+    "ingest_stage_seconds", "Time spent in each PDF ingestion stage.",
+    buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0),
+)
+INGEST_JOBS = registry.counter("ingest_jobs_total", "Finished PDF ingestion attempts by outcome.")
+PROMPT_TOKENS = registry.histogram(
+    "llm_prompt_tokens", "Estimated prompt tokens per LLM call by operation.",
+    buckets=(250.0, 500.0, 1000.0, 2000.0, 4000.0, 8000.0, 16000.0, 32000.0),
+)
+LLM_CALLS_SAVED = registry.counter(
+    "llm_calls_saved_total", "LLM calls avoided by reusing a cached or in-flight identical call, by operation and reason.",
+)
+HTTP_REQUEST_SECONDS = registry.histogram("http_request_seconds", "HTTP request duration including streamed bodies.")
+
+
+def record_span(name: str, seconds: float) -> None:
+    """Adds a duration to the current request's timing log, if one is being collected."""
+    spans = _request_spans.get()
+    if spans is not None:
+        spans[name] = spans.get(name, 0.0) + seconds
+
+
+@contextmanager
+def timed(histogram: Histogram, span: Optional[str] = None, **labels) -> Iterator[None]:
+    """Observes the duration of the block in `histogram` and the request timing log."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        histogram.observe(elapsed, **labels)
+        record_span(span or histogram.name, elapsed)
+
+
+class RequestTimingMiddleware:
+    """
+    Pure ASGI middleware, so the timing covers streamed response bodies too.
+    Records each request in HTTP_REQUEST_SECONDS and logs its spans as one JSON line.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+        spans: Dict[str, float] = {}
+        token = _request_spans.set(spans)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_spans.reset(token)
+            elapsed = time.perf_counter() - started
+            route = scope.get("route")
+            path = getattr(route, "path", scope["path"])
+            HTTP_REQUEST_SECONDS.observe(elapsed, method=scope["method"], path=path, status=status)
+            if REQUEST_TIMING_LOGS:
+                print(json.dumps({
+                    "event": "request_timing",
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status,
+                    "duration_s": round(elapsed, 4),
+                    "spans_s": {name: round(seconds, 4) for name, seconds in spans.items()},
+                }))
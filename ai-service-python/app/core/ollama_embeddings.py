@@ -0,0 +1,304 @@
+import os
+import time
+import asyncio
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+import httpx
+from langchain_core.embeddings import Embeddings
+
+# "embeddings" is the one-text-per-request API the existing stores were built with;
+# "embed" sends a whole batch per request but returns normalized vectors, so
+# switching to it means re-ingesting (the embedding cache is kept separate per API)
+OLLAMA_EMBED_API = os.getenv("OLLAMA_EMBED_API", "embeddings")
+# Document batches in flight at once, across all ingestions
+OLLAMA_EMBED_CONCURRENCY = int(os.getenv("OLLAMA_EMBED_CONCURRENCY", "2"))
+# Starting, smallest and largest texts per batch, and the batch latency the size is steered towards
+OLLAMA_EMBED_BATCH_SIZE = int(os.getenv("OLLAMA_EMBED_BATCH_SIZE", "32"))
+OLLAMA_EMBED_MIN_BATCH_SIZE = int(os.getenv("OLLAMA_EMBED_MIN_BATCH_SIZE", "4"))
+OLLAMA_EMBED_MAX_BATCH_SIZE = int(os.getenv("OLLAMA_EMBED_MAX_BATCH_SIZE", "256"))
+OLLAMA_EMBED_TARGET_BATCH_SECONDS = float(os.getenv("OLLAMA_EMBED_TARGET_BATCH_SECONDS", "2.0"))
+# Queries from concurrent chats arriving within this window are sent together: as one request
+# with the "embed" API, as concurrent single-text requests with the default "embeddings" API
+OLLAMA_QUERY_BATCH_WINDOW_MS = float(os.getenv("OLLAMA_QUERY_BATCH_WINDOW_MS", "5"))
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "16"))
+OLLAMA_TIMEOUT_SECONDS = float(os.getenv("OLLAMA_TIMEOUT_SECONDS", "120"))
+
+# Instructions LangChain's OllamaEmbeddings prepended; kept so vectors stay comparable with existing stores
+DOCUMENT_PREFIX = "passage: "
+QUERY_PREFIX = "query: "
+
+
+class AdaptiveBatchSize:
+    """
+    Steers the batch size towards `target_seconds` per batch using the
+    per-text latency of recent batches, and halves it after a failure.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, target_seconds: float):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_seconds = target_seconds
+        self.size = max(minimum, min(maximum, initial))
+        self._lock = threading.Lock()
+
+    def record(self, size: int, seconds: float) -> None:
+        with self._lock:
+            # A short tail batch says little about what a full one would cost
+            if seconds <= 0 or size < self.size // 2:
+                return
+            ideal = self.target_seconds * size / seconds
+            # Move halfway each time so one slow batch doesn't swing the size
+            self.size = max(self.minimum, min(self.maximum, round((self.size + ideal) / 2)))
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.size = max(self.minimum, self.size // 2)
+
+
+class OllamaEmbeddingClient(Embeddings):
+    """
+    Embeds text with Ollama over pooled keep-alive connections.
+
+    Documents are split into batches whose size adapts to the observed
+    latency, with up to `concurrency` batches in flight across all callers.
+    Queries that arrive within `query_window` seconds of each other are sent
+    together and skip the document queue, so chats don't wait behind ingestion.
+    Only the "embed" API turns a batch into a single request; "embeddings"
+    takes one text per request, so a batch becomes concurrent requests.
+    """
+
+    def __init__(self, model: str, base_url: str, api: str = OLLAMA_EMBED_API,
+                 concurrency: int = OLLAMA_EMBED_CONCURRENCY,
+                 query_window: float = OLLAMA_QUERY_BATCH_WINDOW_MS / 1000):
+        if api not in ("embeddings", "embed"):
+            raise ValueError(f"Unknown OLLAMA_EMBED_API: {api}. Use 'embeddings' or 'embed'.")
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.api = api
+        self.concurrency = concurrency
+        self.query_window = query_window
+        self.batch_size = AdaptiveBatchSize(
+            OLLAMA_EMBED_BATCH_SIZE, OLLAMA_EMBED_MIN_BATCH_SIZE, OLLAMA_EMBED_MAX_BATCH_SIZE,
+            OLLAMA_EMBED_TARGET_BATCH_SECONDS,
+        )
+        self._timeout = httpx.Timeout(OLLAMA_TIMEOUT_SECONDS, pool=None)
+        self._limits = httpx.Limits(max_connections=OLLAMA_MAX_CONNECTIONS, max_keepalive_connections=OLLAMA_MAX_CONNECTIONS)
+        self._client: Optional[httpx.Client] = None
+        # Async state belongs to one event loop and is recreated if the loop changes
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._aclient: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._pending_queries: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._query_tasks: Set[asyncio.Task] = set()
+        # Throughput accounting
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._busy_since = 0.0
+        self._busy_seconds = 0.0
+        self._texts = 0
+        self._requests = 0
+        self._batches = 0
+        self._query_batches = 0
+        self._queries = 0
+        self._failures = 0
+
+    # --- HTTP ---
+
+    def _sync_client(self) -> httpx.Client:
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(base_url=self.base_url, timeout=self._timeout, limits=self._limits)
+            return self._client
+
+    def _async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._aclient is None or self._loop is not loop:
+            self._loop = loop
+            self._aclient = httpx.AsyncClient(base_url=self.base_url, timeout=self._timeout, limits=self._limits)
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._pending_queries = []
+            self._flush_handle = None
+        return self._aclient
+
+    def _payload(self, texts: List[str]) -> List[dict]:
+        if self.api == "embed":
+            return [{"model": self.model, "input": texts}]
+        return [{"model": self.model, "prompt": text} for text in texts]
+
+    def _parse(self, responses: List[httpx.Response]) -> List[List[float]]:
+        vectors = []
+        for response in responses:
+            response.raise_for_status()
+            body = response.json()
+            vectors.extend(body["embeddings"] if self.api == "embed" else [body["embedding"]])
+        return vectors
+
+    def _begin(self) -> None:
+        with self._lock:
+            if self._in_flight == 0:
+                self._busy_since = time.perf_counter()
+            self._in_flight += 1
+
+    def _end(self, texts: int, requests: int, ok: bool) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            if self._in_flight == 0:
+                self._busy_seconds += time.perf_counter() - self._busy_since
+            if ok:
+                self._texts += texts
+                self._requests += requests
+            else:
+                self._failures += 1
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        client = self._sync_client()
+        payloads = self._payload(texts)
+        self._begin()
+        ok = False
+        try:
+            vectors = self._parse([client.post(f"/api/{self.api}", json=payload) for payload in payloads])
+            ok = True
+        finally:
+            self._end(len(texts), len(payloads), ok)
+        return vectors
+
+    async def _aembed_batch(self, texts: List[str], adapt: bool = True) -> List[List[float]]:
+        client = self._async_client()
+        payloads = self._payload(texts)
+        started = time.perf_counter()
+        self._begin()
+        ok = False
+        try:
+            responses = await asyncio.gather(*(client.post(f"/api/{self.api}", json=payload) for payload in payloads))
+            vectors = self._parse(list(responses))
+            ok = True
+        finally:
+            self._end(len(texts), len(payloads), ok)
+            if not ok and adapt:
+                self.batch_size.record_failure()
+        if adapt:
+            self.batch_size.record(len(texts), time.perf_counter() - started)
+        return vectors
+
+    # --- Documents ---
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        prefixed = [DOCUMENT_PREFIX + text for text in texts]
+        vectors: List[List[float]] = []
+        while len(vectors) < len(prefixed):
+            start = len(vectors)
+            started = time.perf_counter()
+            batch = prefixed[start:start + self.batch_size.size]
+            vectors.extend(self._embed_batch(batch))
+            self.batch_size.record(len(batch), time.perf_counter() - started)
+        with self._lock:
+            self._batches += 1
+        return vectors
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embeds `texts` in adaptive batches, several in flight at once."""
+        if not texts:
+            return []
+        self._async_client()
+        prefixed = [DOCUMENT_PREFIX + text for text in texts]
+        results: List[Optional[List[float]]] = [None] * len(prefixed)
+        position = 0
+
+        async def worker():
+            nonlocal position
+            while position < len(prefixed):
+                start = position
+                position += self.batch_size.size
+                batch = prefixed[start:position]
+                async with self._semaphore:
+                    results[start:start + len(batch)] = await self._aembed_batch(batch)
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(self.concurrency)]
+        try:
+            await asyncio.gather(*workers)
+        except BaseException:
+            for task in workers:
+                task.cancel()
+            raise
+        with self._lock:
+            self._batches += 1
+        return results
+
+    # --- Queries ---
+
+    def embed_query(self, text: str) -> List[float]:
+        with self._lock:
+            self._queries += 1
+        return self._embed_batch([QUERY_PREFIX + text])[0]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Embeds a query together with queries that arrive within the batching window."""
+        self._async_client()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending_queries.append((QUERY_PREFIX + text, future))
+        with self._lock:
+            self._queries += 1
+        if len(self._pending_queries) >= self.batch_size.maximum:
+            self._flush_queries()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.query_window, self._flush_queries)
+        return await future
+
+    def _flush_queries(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending_queries = self._pending_queries, []
+        if pending:
+            task = asyncio.ensure_future(self._run_query_batch(pending))
+            # Keep a reference so the task isn't garbage collected mid-flight
+            self._query_tasks.add(task)
+            task.add_done_callback(self._query_tasks.discard)
+
+    async def _run_query_batch(self, pending: List[Tuple[str, asyncio.Future]]) -> None:
+        with self._lock:
+            self._query_batches += 1
+        try:
+            # Query batches are tiny and latency-bound, so they don't steer the document batch size
+            vectors = await self._aembed_batch([text for text, _ in pending], adapt=False)
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), vector in zip(pending, vectors):
+            # A caller that was cancelled no longer wants its result
+            if not future.done():
+                future.set_result(vector)
+
+    # --- Lifecycle and reporting ---
+
+    async def aclose(self) -> None:
+        if self._aclient is not None:
+            await self._aclient.aclose()
+            self._aclient = None
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            busy = self._busy_seconds
+            if self._in_flight:
+                busy += time.perf_counter() - self._busy_since
+            return {
+                "batch_size": self.batch_size.size,
+                "in_flight": self._in_flight,
+                "texts": self._texts,
+                "requests": self._requests,
+                "document_calls": self._batches,
+                "queries": self._queries,
+                "query_batches": self._query_batches,
+                "failures": self._failures,
+                "busy_seconds": busy,
+                # Texts embedded per second while at least one request was in flight
+                "texts_per_second": self._texts / busy if busy > 0 else 0.0,
+            }
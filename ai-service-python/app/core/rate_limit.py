@@ -0,0 +1,51 @@
+import time
+import asyncio
+
+
+class TokenBucket:
+    """
+    Async token-bucket rate limiter. Tokens refill continuously at `rate` per
+    second up to `capacity`; `acquire` waits until a token is available.
+    A rate of 0 or less disables limiting.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                # Holding the lock while sleeping keeps waiters in FIFO order
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class RateLimitedExecutor:
+    """
+    Runs coroutines with at most `concurrency` in flight, each one starting
+    only after it has taken a token from the shared bucket.
+    """
+
+    def __init__(self, concurrency: int, rate: float, burst: float):
+        self.concurrency = max(1, concurrency)
+        self.bucket = TokenBucket(rate, burst)
+        self._semaphore: asyncio.Semaphore | None = None
+
+    async def run(self, coro_fn, *args, **kwargs):
+        # Created lazily so the semaphore binds to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            await self.bucket.acquire()
+            return await coro_fn(*args, **kwargs)
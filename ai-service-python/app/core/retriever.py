@@ -0,0 +1,32 @@
+import heapq
+from typing import Dict, List, NamedTuple
+
+import numpy as np
+
+from langchain_core.documents import Document
+
+
+class ScoredChunk(NamedTuple):
+    """A search hit together with its embedding and row in its PDF's store; smaller scores are better."""
+    score: float
+    pdf_id: str
+    document: Document
+    vector: np.ndarray
+    row: int
+
+
+def reciprocal_rank_fusion(ranked_lists: List[List[ScoredChunk]], k: int, rrf_k: int) -> List[ScoredChunk]:
+    """
+    Merges ranked hit lists of the same PDF: a chunk scores the sum of
+    1 / (rrf_k + rank) over the lists it appears in, so BM25 and vector
+    scores never have to be put on one scale. Returns the top k, best
+    first, with the fused score negated so that smaller is still better.
+    """
+    fused: Dict[int, float] = {}
+    hits: Dict[int, ScoredChunk] = {}
+    for ranked in ranked_lists:
+        for rank, hit in enumerate(ranked, start=1):
+            fused[hit.row] = fused.get(hit.row, 0.0) + 1.0 / (rrf_k + rank)
+            hits.setdefault(hit.row, hit)
+    best = heapq.nsmallest(k, fused, key=lambda row: (-fused[row], row))
+    return [hits[row]._replace(score=-fused[row]) for row in best]
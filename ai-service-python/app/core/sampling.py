@@ -0,0 +1,102 @@
+import os
+import json
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .store_format import NativeStore
+
+# Representative chunks kept per PDF; quiz and topic context is drawn from these
+SUMMARY_SAMPLE_SIZE = int(os.getenv("SUMMARY_SAMPLE_SIZE", "24"))
+KMEANS_ITERATIONS = 10
+
+SAMPLE_FILENAME = "sample.json"
+SAMPLE_VECTORS_FILENAME = "sample.npy"
+
+
+def select_representatives(vectors: np.ndarray, k: int, seed: int = 0) -> List[int]:
+    """
+    Picks up to `k` row indices that cover the embedding space evenly:
+    runs k-means (k-means++ init, a few Lloyd iterations) and returns the
+    row closest to each centroid. Cost is O(n * k * d) per iteration.
+    """
+    n = len(vectors)
+    if n <= k:
+        return list(range(n))
+    rng = np.random.default_rng(seed)
+    x = np.asarray(vectors, dtype=np.float32)
+    sq_norms = np.einsum("ij,ij->i", x, x)
+
+    def sq_distances(centroids: np.ndarray) -> np.ndarray:
+        # ||x - c||^2 for every (row, centroid) pair without materialising x - c
+        c_norms = np.einsum("ij,ij->i", centroids, centroids)
+        return np.maximum(sq_norms[:, None] - 2.0 * x @ centroids.T + c_norms[None, :], 0.0)
+
+    # k-means++ seeding
+    centroids = np.empty((k, x.shape[1]), dtype=np.float32)
+    centroids[0] = x[rng.integers(n)]
+    closest = sq_distances(centroids[:1])[:, 0]
+    for j in range(1, k):
+        weights = closest.astype(np.float64)
+        total = weights.sum()
+        idx = rng.choice(n, p=weights / total) if total > 0 else rng.integers(n)
+        centroids[j] = x[idx]
+        closest = np.minimum(closest, sq_distances(centroids[j:j + 1])[:, 0])
+
+    for _ in range(KMEANS_ITERATIONS):
+        labels = sq_distances(centroids).argmin(axis=1)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, x)
+        nonempty = counts > 0
+        centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+
+    # The actual chunk nearest to each centroid; duplicates collapse for tiny clusters
+    nearest = sq_distances(centroids).argmin(axis=0)
+    return sorted(set(int(i) for i in nearest))
+
+
+def build_summary_sample(store: NativeStore, k: int = SUMMARY_SAMPLE_SIZE) -> List[Dict]:
+    """Selects representative chunks from a store, with their embeddings, ordered by page."""
+    vectors = store.index.reconstruct_n(0, store.ntotal)
+    picked = select_representatives(vectors, k)
+    docs = store.get_documents(picked)
+    sample = [
+        {"page": doc.metadata.get("page", "N/A"), "text": doc.page_content, "vector": vectors[i]}
+        for i, doc in zip(picked, docs)
+    ]
+    return sorted(sample, key=lambda item: item["page"] if isinstance(item["page"], int) else -1)
+
+
+def save_summary_sample(store_path: str, sample: List[Dict]) -> None:
+    # Embeddings go to a .npy beside the JSON, which is written last and so marks the pair complete
+    vectors_path = os.path.join(store_path, SAMPLE_VECTORS_FILENAME)
+    with open(f"{vectors_path}.tmp", "wb") as f:
+        np.save(f, np.asarray([item["vector"] for item in sample], dtype=np.float32))
+    os.replace(f"{vectors_path}.tmp", vectors_path)
+    path = os.path.join(store_path, SAMPLE_FILENAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"chunks": [{"page": item["page"], "text": item["text"]} for item in sample]}, f)
+    os.replace(tmp_path, path)
+
+
+def load_summary_sample(store_path: str) -> Optional[List[Dict]]:
+    """
+    Returns the saved sample, unless the store was rebuilt after it was
+    written or it predates saved embeddings.
+    """
+    path = os.path.join(store_path, SAMPLE_FILENAME)
+    try:
+        if os.path.getmtime(path) < os.path.getmtime(os.path.join(store_path, "index.faiss")):
+            return None
+        with open(path) as f:
+            sample = json.load(f)["chunks"]
+        vectors = np.load(os.path.join(store_path, SAMPLE_VECTORS_FILENAME))
+    except (OSError, ValueError, KeyError):
+        return None
+    if len(vectors) != len(sample):
+        return None
+    for item, vector in zip(sample, vectors):
+        item["vector"] = vector
+    return sample
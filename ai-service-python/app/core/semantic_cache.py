@@ -0,0 +1,127 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .metrics import registry
+from .store_cache import get_store_path
+
+# Off by default: questions that differ in meaning (a negation, another entity in the same
+# phrasing) can still be this similar, and their askers would get a replayed answer
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+# Minimum cosine similarity between query embeddings for a cached answer to be reused
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "86400"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000"))
+
+
+def _store_versions(pdf_key: Tuple[str, ...]) -> Tuple[float, ...]:
+    # A rebuilt store changes its index mtime, which makes older answers stale
+    return tuple(os.path.getmtime(os.path.join(get_store_path(pdf_id), "index.faiss")) for pdf_id in pdf_key)
+
+
+@dataclass
+class CachedAnswer:
+    pdf_key: Tuple[str, ...]
+    vector: np.ndarray
+    answer: str
+    versions: Tuple[float, ...]
+    created_at: float
+
+
+class SemanticResponseCache:
+    """
+    Caches chat answers per set of PDFs. A new question reuses a cached answer
+    when its embedding is within `threshold` cosine similarity of a cached
+    question for the same PDFs and the entry is younger than `ttl` seconds.
+    Bounded to `max_entries`, evicting least recently used entries first.
+    """
+
+    def __init__(self, threshold: float, ttl: float, max_entries: int):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        # pdf_key -> entry ids, so a lookup only compares against questions about the same PDFs
+        self._by_pdfs: Dict[Tuple[str, ...], List[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    @staticmethod
+    def pdf_key(pdf_ids: List[str]) -> Tuple[str, ...]:
+        return tuple(sorted(set(pdf_ids)))
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm > 0 else v
+
+    def lookup(self, pdf_ids: List[str], query_vector: List[float]) -> Optional[str]:
+        key = self.pdf_key(pdf_ids)
+        versions = _store_versions(key)
+        q = self._normalize(query_vector)
+        now = time.time()
+        with self._lock:
+            ids = self._by_pdfs.get(key, [])
+            for entry_id in list(ids):
+                entry = self._entries[entry_id]
+                if now - entry.created_at > self.ttl or entry.versions != versions:
+                    self._remove(entry_id)
+            ids = self._by_pdfs.get(key, [])
+            if ids:
+                matrix = np.stack([self._entries[i].vector for i in ids])
+                similarities = matrix @ q
+                best = int(similarities.argmax())
+                if similarities[best] >= self.threshold:
+                    self._entries.move_to_end(ids[best])
+                    self.hits += 1
+                    return self._entries[ids[best]].answer
+            self.misses += 1
+            return None
+
+    def store(self, pdf_ids: List[str], query_vector: List[float], answer: str) -> None:
+        key = self.pdf_key(pdf_ids)
+        entry = CachedAnswer(key, self._normalize(query_vector), answer, _store_versions(key), time.time())
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            self._by_pdfs.setdefault(key, []).append(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def record_bypass(self) -> None:
+        with self._lock:
+            self.bypassed += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        ids = self._by_pdfs[entry.pdf_key]
+        ids.remove(entry_id)
+        if not ids:
+            del self._by_pdfs[entry.pdf_key]
+
+
+response_cache = SemanticResponseCache(
+    SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_TTL_SECONDS, SEMANTIC_CACHE_MAX_ENTRIES
+)
+registry.gauge_callback("semantic_cache", "Semantic chat answer cache statistics.", response_cache.stats)
@@ -0,0 +1,294 @@
+import os
+import json
+import fcntl
+import heapq
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import islice
+from typing import Any, Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+
+from .retriever import ScoredChunk
+from .store_cache import get_store_path
+from .store_format import INDEX_FILE, ChunkColumns, read_index_mapped
+
+# Vector ids are (pdf number << ROW_BITS) | chunk row, so every PDF owns one contiguous id range
+ROW_BITS = 32
+_ROW_MASK = (1 << ROW_BITS) - 1
+# FAISS wants roughly this many training points per inverted list
+_TRAIN_POINTS_PER_LIST = 39
+
+CATALOG_FILE = "pdfs.json"
+LOCK_FILE = ".lock"
+
+
+def _id_range(number: int) -> Tuple[int, int]:
+    return number << ROW_BITS, (number + 1) << ROW_BITS
+
+
+def _write_atomic(path: str, write) -> None:
+    tmp_path = f"{path}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _write_json(path: str, data: Dict[str, Any]) -> None:
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+def _enable_lookup(index: faiss.Index) -> None:
+    # IVF shards need an id -> list map to reconstruct search hits; flat shards have one already
+    if isinstance(index, faiss.IndexIVF) and index.direct_map.type == faiss.DirectMap.NoMap:
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+
+
+def _remove_pdf_vectors(index: faiss.Index, entry: Dict[str, Any]) -> None:
+    # IVF shards keep a hashtable direct map, and FAISS only removes from those by explicit
+    # ids (IDSelectorArray), not by range; the catalog knows how many rows the PDF has
+    start, _ = _id_range(entry["number"])
+    ids = np.arange(start, start + entry.get("count", 0), dtype=np.int64)
+    if len(ids):
+        index.remove_ids(faiss.IDSelectorArray(len(ids), faiss.swig_ptr(ids)))
+
+
+class SharedIndex:
+    """
+    One vector index for all PDFs, spread over a few shards. A shard starts
+    as an exact flat index and becomes an IVF index once it holds enough
+    vectors to train one. Searches are restricted to the requested PDFs with
+    an ID selector, so a query over many PDFs is a single search per shard.
+
+    Chunk texts stay in the per-PDF store directories, which remain the
+    source of truth; this only replaces their indexes at query time.
+    Writers hold an exclusive file lock and rewrite the affected shard, so
+    several processes can share the directory; readers reload changed files.
+    """
+
+    def __init__(self, root: str, num_shards: int, nlist: int, nprobe: int, max_open_stores: int):
+        self.root = root
+        self.num_shards = num_shards
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.max_open_stores = max_open_stores
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._catalog: Dict[str, Any] = {"next": 0, "pdfs": {}}
+        self._catalog_mtime: Optional[float] = None
+        self._shards: Dict[int, Tuple[faiss.Index, float]] = {}
+        self._columns: "OrderedDict[str, Tuple[ChunkColumns, float]]" = OrderedDict()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def _shard_path(self, shard: int) -> str:
+        return self._path(f"shard-{shard}.faiss")
+
+    @contextmanager
+    def _write_lock(self):
+        with open(self._path(LOCK_FILE), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    # --- Reading; files are reloaded when another process rewrote them ---
+
+    def _read_catalog(self) -> Dict[str, Any]:
+        path = self._path(CATALOG_FILE)
+        try:
+            mtime = os.path.getmtime(path)
+        except FileNotFoundError:
+            return {"next": 0, "pdfs": {}}
+        with self._lock:
+            if mtime == self._catalog_mtime:
+                return self._catalog
+        with open(path) as f:
+            catalog = json.load(f)
+        with self._lock:
+            self._catalog, self._catalog_mtime = catalog, mtime
+        return catalog
+
+    def _read_shard(self, shard: int) -> Optional[faiss.Index]:
+        path = self._shard_path(shard)
+        try:
+            mtime = os.path.getmtime(path)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            cached = self._shards.get(shard)
+            if cached is not None and cached[1] == mtime:
+                return cached[0]
+        index = read_index_mapped(path)
+        _enable_lookup(index)
+        with self._lock:
+            self._shards[shard] = (index, mtime)
+        return index
+
+    def _columns_for(self, pdf_id: str) -> ChunkColumns:
+        store_path = get_store_path(pdf_id)
+        mtime = os.path.getmtime(os.path.join(store_path, INDEX_FILE))
+        with self._lock:
+            cached = self._columns.get(pdf_id)
+            if cached is not None and cached[1] == mtime:
+                self._columns.move_to_end(pdf_id)
+                return cached[0]
+        columns = ChunkColumns(store_path)
+        with self._lock:
+            self._columns[pdf_id] = (columns, mtime)
+            self._columns.move_to_end(pdf_id)
+            # Each open store holds a few file mappings, so only keep the recently used ones
+            while len(self._columns) > self.max_open_stores:
+                self._columns.popitem(last=False)
+        return columns
+
+    # --- Writing; always starts from the files on disk, under the file lock ---
+
+    def _load_for_write(self) -> Dict[str, Any]:
+        path = self._path(CATALOG_FILE)
+        if not os.path.exists(path):
+            return {"next": 0, "pdfs": {}}
+        with open(path) as f:
+            return json.load(f)
+
+    def _save(self, catalog: Dict[str, Any], shard: int, index: faiss.Index) -> None:
+        # Searches keep using the index object they already hold; new ones pick up the file
+        _write_atomic(self._shard_path(shard), lambda p: faiss.write_index(index, p))
+        _write_atomic(self._path(CATALOG_FILE), lambda p: _write_json(p, catalog))
+
+    def _maybe_train(self, index: faiss.Index) -> faiss.Index:
+        if isinstance(index, faiss.IndexIVF) or index.ntotal < self.nlist * _TRAIN_POINTS_PER_LIST:
+            return index
+        ids = faiss.vector_to_array(index.id_map)
+        vectors = index.index.reconstruct_n(0, index.ntotal)
+        ivf = faiss.IndexIVFFlat(faiss.IndexFlatL2(index.d), index.d, self.nlist)
+        ivf.train(vectors)
+        _enable_lookup(ivf)
+        ivf.add_with_ids(vectors, ids)
+        print(f"[shared-index] Converted a shard of {index.ntotal} vectors to IVF with {self.nlist} lists.")
+        return ivf
+
+    def add_pdf(self, pdf_id: str, vectors: np.ndarray) -> None:
+        """Adds or replaces the vectors of a PDF; row i must be chunk i of its store."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._write_lock():
+            catalog = self._load_for_write()
+            entry = catalog["pdfs"].get(pdf_id)
+            if entry is None:
+                # Numbers are never reused, so stale ids can't alias a newer PDF
+                number = catalog["next"]
+                catalog["next"] = number + 1
+                entry = {"number": number, "shard": number % self.num_shards}
+            shard = entry["shard"]
+            if os.path.exists(self._shard_path(shard)):
+                index = faiss.read_index(self._shard_path(shard))
+            else:
+                index = faiss.IndexIDMap2(faiss.IndexFlatL2(vectors.shape[1]))
+            _remove_pdf_vectors(index, entry)
+            start, _ = _id_range(entry["number"])
+            index.add_with_ids(vectors, np.arange(start, start + len(vectors), dtype=np.int64))
+            index = self._maybe_train(index)
+            entry["count"] = len(vectors)
+            catalog["pdfs"][pdf_id] = entry
+            self._save(catalog, shard, index)
+
+    def remove_pdf(self, pdf_id: str) -> bool:
+        """Removes a PDF's vectors. Returns False if it was not in the index."""
+        with self._write_lock():
+            catalog = self._load_for_write()
+            entry = catalog["pdfs"].pop(pdf_id, None)
+            if entry is None:
+                return False
+            index = faiss.read_index(self._shard_path(entry["shard"]))
+            _remove_pdf_vectors(index, entry)
+            self._save(catalog, entry["shard"], index)
+        with self._lock:
+            self._columns.pop(pdf_id, None)
+        return True
+
+    # --- Search ---
+
+    def contains(self, pdf_id: str) -> bool:
+        return pdf_id in self._read_catalog()["pdfs"]
+
+    def _search(self, pdf_ids: List[str], embedding: List[float], k: int):
+        """Yields (distance, pdf_id, row, shard index) for the overall top-k hits, best first."""
+        catalog = self._read_catalog()
+        by_shard: Dict[int, List[int]] = {}
+        pdf_by_number: Dict[int, str] = {}
+        for pdf_id in set(pdf_ids):
+            entry = catalog["pdfs"].get(pdf_id)
+            if entry is None:
+                raise FileNotFoundError(f"Vector store not found for PDF ID: {pdf_id}.")
+            by_shard.setdefault(entry["shard"], []).append(entry["number"])
+            pdf_by_number[entry["number"]] = pdf_id
+
+        query = np.asarray([embedding], dtype=np.float32)
+        per_shard = []
+        for shard, numbers in by_shard.items():
+            index = self._read_shard(shard)
+            if index is None:
+                continue
+            # The selectors only hold pointers to each other, so keep every one alive until the search is done
+            selectors = [faiss.IDSelectorRange(*_id_range(number)) for number in numbers]
+            selector = selectors[0]
+            for other in selectors[1:]:
+                selector = faiss.IDSelectorOr(selector, other)
+                selectors.append(selector)
+            if isinstance(index, faiss.IndexIVF):
+                params = faiss.SearchParametersIVF(sel=selector, nprobe=self.nprobe)
+            else:
+                params = faiss.SearchParameters(sel=selector)
+            distances, ids = index.search(query, k, params=params)
+            per_shard.append([(float(d), int(i), index) for d, i in zip(distances[0], ids[0]) if i != -1])
+
+        for distance, vector_id, index in islice(heapq.merge(*per_shard, key=lambda hit: hit[:2]), k):
+            yield distance, pdf_by_number[vector_id >> ROW_BITS], vector_id, index
+
+    def _document(self, pdf_id: str, vector_id: int) -> Optional[Document]:
+        columns = self._columns_for(pdf_id)
+        row = vector_id & _ROW_MASK
+        # The store may have just been rewritten with fewer chunks than the index still has
+        return columns.get_document(row) if row < len(columns) else None
+
+    def search_chunks(self, pdf_ids: List[str], embedding: List[float], k: int) -> List[ScoredChunk]:
+        """Returns the overall top-k chunks of the given PDFs, best first, with their scores and embeddings."""
+        chunks = []
+        for distance, pdf_id, vector_id, index in self._search(pdf_ids, embedding, k):
+            doc = self._document(pdf_id, vector_id)
+            if doc is not None:
+                chunks.append(ScoredChunk(distance, pdf_id, doc, index.reconstruct(vector_id), vector_id & _ROW_MASK))
+        return chunks
+
+    def search_lexical_chunks(self, pdf_id: str, terms: List[str], k: int) -> List[ScoredChunk]:
+        """Returns a PDF's top-k BM25 hits for tokenized query terms, scores negated, with their embeddings."""
+        columns = self._columns_for(pdf_id)
+        hits = columns.search_lexical(terms, k)
+        entry = self._read_catalog()["pdfs"].get(pdf_id)
+        index = self._read_shard(entry["shard"]) if entry is not None else None
+        if not hits or index is None:
+            return []
+        chunks = []
+        for score, row in hits:
+            try:
+                vector = index.reconstruct((entry["number"] << ROW_BITS) | row)
+            except RuntimeError:
+                # The store was rewritten with more chunks than the shard has caught up with
+                continue
+            chunks.append(ScoredChunk(-score, pdf_id, columns.get_document(row), vector, row))
+        return chunks
+
+    def stats(self) -> Dict[str, int]:
+        catalog = self._read_catalog()
+        with self._lock:
+            return {
+                "pdfs": len(catalog["pdfs"]),
+                "loaded_shards": len(self._shards),
+                "loaded_vectors": sum(index.ntotal for index, _ in self._shards.values()),
+                "open_stores": len(self._columns),
+            }
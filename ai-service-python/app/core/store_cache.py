@@ -0,0 +1,165 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+from .metrics import STORE_LOAD_SECONDS, registry, timed
+from .store_format import NativeStore, is_legacy_store, migrate_legacy_store
+
+VECTOR_STORE_DIR = "vector_store"
+os.makedirs(VECTOR_STORE_DIR, exist_ok=True)
+
+# Upper bound for the estimated memory held by cached stores (default 1 GiB)
+STORE_CACHE_MAX_BYTES = int(os.getenv("STORE_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+# Convert pickled stores written by older versions on first load instead of refusing them.
+# Off by default: converting means unpickling the store inside a request
+MIGRATE_LEGACY_STORES = os.getenv("MIGRATE_LEGACY_STORES", "false").lower() == "true"
+
+
+def get_store_path(pdf_id: str) -> str:
+    return os.path.join(VECTOR_STORE_DIR, f"{pdf_id}.faiss")
+
+
+def _store_mtime(store_path: str) -> float:
+    # Saving a store rewrites index.faiss last, so its mtime tells us when a store changed on disk
+    return os.path.getmtime(os.path.join(store_path, "index.faiss"))
+
+
+def _migrate_if_legacy(pdf_id: str, store_path: str) -> bool:
+    """Converts a pickled store to the native format. Returns True if the store was rewritten."""
+    if not is_legacy_store(store_path):
+        return False
+    if not MIGRATE_LEGACY_STORES:
+        raise ValueError(
+            f"Vector store for PDF ID {pdf_id} uses the legacy pickle format, which is not loaded while serving. "
+            f"Convert it with `python migrate_vector_store.py` (or set MIGRATE_LEGACY_STORES=true)."
+        )
+    migrate_legacy_store(store_path)
+    print(f"[store-cache] Migrated legacy vector store for PDF ID: {pdf_id}")
+    return True
+
+
+class VectorStoreCache:
+    """
+    Process-wide LRU cache of loaded stores keyed by pdf_id.
+    Entries are evicted least-recently-used first once the estimated memory
+    of all cached stores exceeds `max_bytes`.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[NativeStore, int, float]]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, pdf_id: str) -> NativeStore:
+        """Returns the store for `pdf_id`, loading it from disk on a miss."""
+        store_path = get_store_path(pdf_id)
+        if not os.path.exists(store_path):
+            raise FileNotFoundError(f"Vector store not found for PDF ID: {pdf_id}.")
+        mtime = _store_mtime(store_path)
+
+        with self._lock:
+            store = self._lookup(pdf_id, mtime)
+            if store is not None:
+                self.hits += 1
+                return store
+
+        # Only one caller loads a given store; the others wait and then hit the cache
+        with self.load_lock(pdf_id):
+            with self._lock:
+                store = self._lookup(pdf_id, mtime)
+                if store is not None:
+                    self.hits += 1
+                    return store
+                self.misses += 1
+
+            if _migrate_if_legacy(pdf_id, store_path):
+                mtime = _store_mtime(store_path)
+            with timed(STORE_LOAD_SECONDS, span="store_load"):
+                store = NativeStore(store_path)
+            # Only the index is resident; chunk texts are mapped and paged in on demand
+            size = store.memory_bytes()
+
+            with self._lock:
+                self._remove(pdf_id)
+                self._entries[pdf_id] = (store, size, mtime)
+                self._total_bytes += size
+                self._evict()
+        return store
+
+    def load_lock(self, pdf_id: str) -> threading.Lock:
+        """Serializes loading (and converting) one store within this process."""
+        with self._lock:
+            return self._load_locks.setdefault(pdf_id, threading.Lock())
+
+    def invalidate(self, pdf_id: str) -> None:
+        """Drops a cached store, e.g. after it has been rewritten on disk."""
+        with self._lock:
+            self._remove(pdf_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    # --- Helpers below must be called with self._lock held ---
+
+    def _lookup(self, pdf_id: str, mtime: float):
+        entry = self._entries.get(pdf_id)
+        if entry is None:
+            return None
+        store, _, cached_mtime = entry
+        if cached_mtime != mtime:
+            # The store was rewritten (possibly by another process) since we loaded it
+            self._remove(pdf_id)
+            return None
+        self._entries.move_to_end(pdf_id)
+        return store
+
+    def _remove(self, pdf_id: str) -> None:
+        entry = self._entries.pop(pdf_id, None)
+        if entry is not None:
+            self._total_bytes -= entry[1]
+
+    def _evict(self) -> None:
+        # Always keep the most recent entry, even if it alone exceeds the budget
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            evicted_id, (_, size, _) = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            print(f"[store-cache] Evicted vector store for PDF ID: {evicted_id}")
+
+
+store_cache = VectorStoreCache(STORE_CACHE_MAX_BYTES)
+registry.gauge_callback("store_cache", "Loaded FAISS store cache statistics.", store_cache.stats)
+
+
+def open_store(pdf_id: str) -> NativeStore:
+    """Opens a store without caching it, e.g. to copy its vectors elsewhere."""
+    store_path = get_store_path(pdf_id)
+    if not os.path.exists(store_path):
+        raise FileNotFoundError(f"Vector store not found for PDF ID: {pdf_id}.")
+    with store_cache.load_lock(pdf_id):
+        _migrate_if_legacy(pdf_id, store_path)
+    return NativeStore(store_path)
+
+
+def load_store(pdf_id: str) -> NativeStore:
+    """Shared entry point used by the chat, quiz and topic services."""
+    return store_cache.get(pdf_id)
@@ -0,0 +1,308 @@
+import os
+import json
+import time
+import fcntl
+import shutil
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from .lexical_index import HYBRID_SEARCH, LexicalIndex, LexicalIndexBuilder, has_lexical_index, write_lexical_index
+
+# Files of a native store directory. Row i of the FAISS index is chunk i of every column.
+INDEX_FILE = "index.faiss"
+INFO_FILE = "store.json"
+TEXTS_FILE = "chunks.bin"
+TEXT_OFFSETS_FILE = "chunks.offsets.npy"
+METADATA_FILE = "metadata.bin"
+METADATA_OFFSETS_FILE = "metadata.offsets.npy"
+# Written by LangChain's FAISS.save_local; contains the pickled docstore
+LEGACY_DOCSTORE_FILE = "index.pkl"
+# Held while a legacy store is converted
+MIGRATE_LOCK_FILE = ".migrate.lock"
+
+FORMAT_VERSION = 1
+
+# Memory-map index files read-only instead of reading them into memory, so that
+# worker processes serving the same stores share one copy in the page cache
+STORE_MMAP = os.getenv("STORE_MMAP", "true").lower() == "true"
+
+
+def is_native_store(store_path: str) -> bool:
+    return os.path.exists(os.path.join(store_path, INFO_FILE))
+
+
+def is_legacy_store(store_path: str) -> bool:
+    return not is_native_store(store_path) and os.path.exists(os.path.join(store_path, LEGACY_DOCSTORE_FILE))
+
+
+def read_index_mapped(path: str):
+    """
+    Reads a FAISS index for searching only. With STORE_MMAP, IVF inverted
+    lists and (on FAISS >= 1.11) flat vectors are memory-mapped rather than
+    copied; anything FAISS can't map is read into memory as before.
+    """
+    import faiss
+
+    if not STORE_MMAP:
+        return faiss.read_index(path)
+    with open(path, "rb") as f:
+        # IVF index headers start with "Iw"; flat and ID-mapped ones are mapped with a different flag
+        ivf = f.read(4).startswith(b"Iw")
+    if ivf:
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    else:
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", 0) | faiss.IO_FLAG_READ_ONLY
+    try:
+        return faiss.read_index(path, flags)
+    except RuntimeError as e:
+        print(f"[store] Could not memory-map {path} ({e}); reading it into memory.")
+        return faiss.read_index(path)
+
+
+def _open_column(path: str) -> np.ndarray:
+    # np.memmap refuses empty files, and an empty column needs no mapping anyway
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode="r")
+
+
+class NativeStoreWriter:
+    """
+    Writes a store a batch of chunks at a time, so the texts of a large PDF
+    never have to be in memory together: each batch is appended to the
+    column files and its vectors to `index`. Every file is written under a
+    temporary name and renamed into place by `commit`, with the index last,
+    so readers never see a new index next to old chunk files.
+    """
+
+    def __init__(self, store_path: str, index: "faiss.Index"):
+        os.makedirs(store_path, exist_ok=True)
+        self.store_path = store_path
+        self.index = index
+        self._texts = open(self._tmp(TEXTS_FILE), "wb")
+        self._metadata = open(self._tmp(METADATA_FILE), "wb")
+        # Offsets stay in memory; they are 8 bytes per chunk
+        self._text_offsets = array("q", [0])
+        self._metadata_offsets = array("q", [0])
+        self._lexical = LexicalIndexBuilder()
+
+    def _tmp(self, name: str) -> str:
+        return os.path.join(self.store_path, f".{name}.tmp")
+
+    def __len__(self) -> int:
+        return len(self._text_offsets) - 1
+
+    def add(self, texts: List[str], metadatas: List[Dict[str, Any]], vectors: Optional[np.ndarray] = None) -> None:
+        """Appends chunks; `vectors` are added to the index, unless it was built with them already."""
+        if len(texts) != len(metadatas) or (vectors is not None and len(vectors) != len(texts)):
+            raise ValueError("Texts, metadatas and vectors must have the same number of rows.")
+        for text, metadata in zip(texts, metadatas):
+            encoded = text.encode("utf-8")
+            self._texts.write(encoded)
+            self._text_offsets.append(self._text_offsets[-1] + len(encoded))
+            encoded = json.dumps(metadata, separators=(",", ":")).encode("utf-8")
+            self._metadata.write(encoded)
+            self._metadata_offsets.append(self._metadata_offsets[-1] + len(encoded))
+            self._lexical.add(text)
+        if vectors is not None and len(vectors):
+            self.index.add(np.asarray(vectors, dtype=np.float32))
+
+    def commit(self) -> None:
+        import faiss
+
+        if self.index.ntotal != len(self):
+            self.abort()
+            raise ValueError("Index, texts and metadatas must have the same number of rows.")
+        self._texts.close()
+        self._metadata.close()
+        for name, offsets in ((TEXT_OFFSETS_FILE, self._text_offsets), (METADATA_OFFSETS_FILE, self._metadata_offsets)):
+            with open(self._tmp(name), "wb") as f:
+                np.save(f, np.frombuffer(offsets, dtype=np.int64))
+        # Renames its own files into place, ahead of the index like the columns
+        self._lexical.write(self.store_path)
+        metric = "inner_product" if self.index.metric_type == faiss.METRIC_INNER_PRODUCT else "l2"
+        with open(self._tmp(INFO_FILE), "w") as f:
+            json.dump({"version": FORMAT_VERSION, "count": len(self), "dim": self.index.d, "metric": metric}, f)
+        faiss.write_index(self.index, self._tmp(INDEX_FILE))
+
+        for name in (TEXTS_FILE, TEXT_OFFSETS_FILE, METADATA_FILE, METADATA_OFFSETS_FILE, INFO_FILE, INDEX_FILE):
+            os.replace(self._tmp(name), os.path.join(self.store_path, name))
+        legacy = os.path.join(self.store_path, LEGACY_DOCSTORE_FILE)
+        if os.path.exists(legacy):
+            os.remove(legacy)
+
+    def abort(self) -> None:
+        """Drops the partly written files; the store on disk is left as it was."""
+        self._texts.close()
+        self._metadata.close()
+        for name in (TEXTS_FILE, TEXT_OFFSETS_FILE, METADATA_FILE, METADATA_OFFSETS_FILE, INFO_FILE, INDEX_FILE):
+            try:
+                os.remove(self._tmp(name))
+            except FileNotFoundError:
+                pass
+
+
+def write_native_store(store_path: str, index: "faiss.Index", texts: List[str], metadatas: List[Dict[str, Any]]) -> None:
+    """Writes a store whose index already holds the vectors of `texts`, in one go."""
+    if index.ntotal != len(texts) or len(texts) != len(metadatas):
+        raise ValueError("Index, texts and metadatas must have the same number of rows.")
+    writer = NativeStoreWriter(store_path, index)
+    writer.add(texts, metadatas)
+    writer.commit()
+
+
+def copy_store(source_path: str, store_path: str) -> None:
+    """
+    Copies every file of a store into `store_path` the way the writer saves
+    one: under temporary names first, renamed into place with the index
+    last. Files only the destination has belong to the store being replaced
+    and are removed once the new index is in place.
+    """
+    os.makedirs(store_path, exist_ok=True)
+    names = [
+        name for name in os.listdir(source_path)
+        if not name.startswith(".") and os.path.isfile(os.path.join(source_path, name))
+    ]
+    tmp = lambda name: os.path.join(store_path, f".{name}.copy.tmp")
+    try:
+        for name in names:
+            shutil.copyfile(os.path.join(source_path, name), tmp(name))
+    except BaseException:
+        for name in names:
+            try:
+                os.remove(tmp(name))
+            except FileNotFoundError:
+                pass
+        raise
+    for name in sorted(names, key=lambda name: name == INDEX_FILE):
+        os.replace(tmp(name), os.path.join(store_path, name))
+    for name in os.listdir(store_path):
+        path = os.path.join(store_path, name)
+        if name not in names and not name.startswith(".") and os.path.isfile(path):
+            os.remove(path)
+
+
+def save_native_store(store, store_path: str) -> None:
+    """Writes an in-memory LangChain FAISS store in the native format."""
+    docs = [store.docstore.search(store.index_to_docstore_id[i]) for i in range(store.index.ntotal)]
+    write_native_store(store_path, store.index, [d.page_content for d in docs], [d.metadata for d in docs])
+
+
+class ChunkColumns:
+    """
+    Memory-mapped chunk texts and metadata of a native store, without its index.
+    Rows are decoded on demand, so nothing is unpickled and untouched chunks cost no RAM.
+    """
+
+    def __init__(self, store_path: str):
+        self.path = store_path
+        with open(os.path.join(store_path, INFO_FILE)) as f:
+            self.info = json.load(f)
+        if self.info.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported store format version in {store_path}: {self.info.get('version')}")
+        self._texts = _open_column(os.path.join(store_path, TEXTS_FILE))
+        self._text_offsets = np.load(os.path.join(store_path, TEXT_OFFSETS_FILE), mmap_mode="r")
+        self._metadata = _open_column(os.path.join(store_path, METADATA_FILE))
+        self._metadata_offsets = np.load(os.path.join(store_path, METADATA_OFFSETS_FILE), mmap_mode="r")
+        self.lexical = self._open_lexical() if HYBRID_SEARCH else None
+
+    def _open_lexical(self) -> Optional[LexicalIndex]:
+        if not has_lexical_index(self.path, len(self)):
+            # Stores written before the BM25 index existed get one the first time they are opened
+            try:
+                write_lexical_index(self.path, (self.get_text(i) for i in range(len(self))))
+            except OSError as e:
+                print(f"[store] Could not build the BM25 index for {self.path} ({e}); searching it by vector only.")
+                return None
+        return LexicalIndex.open(self.path, len(self))
+
+    def __len__(self) -> int:
+        return len(self._text_offsets) - 1
+
+    def get_text(self, i: int) -> str:
+        start, end = int(self._text_offsets[i]), int(self._text_offsets[i + 1])
+        return bytes(self._texts[start:end]).decode("utf-8")
+
+    def get_metadata(self, i: int) -> Dict[str, Any]:
+        start, end = int(self._metadata_offsets[i]), int(self._metadata_offsets[i + 1])
+        return json.loads(bytes(self._metadata[start:end]))
+
+    def get_document(self, i: int) -> Document:
+        return Document(page_content=self.get_text(i), metadata=self.get_metadata(i))
+
+    def get_documents(self, ids: List[int]) -> List[Document]:
+        return [self.get_document(i) for i in ids]
+
+    def search_lexical(self, terms: List[str], k: int) -> List[Tuple[float, int]]:
+        """Returns up to k (BM25 score, row) pairs for tokenized query terms, best first."""
+        return self.lexical.search(terms, k) if self.lexical is not None else []
+
+
+class NativeStore(ChunkColumns):
+    """
+    Read-only view of a native store: the index and the chunk columns are
+    memory-mapped where possible, and a search decodes only the rows it returns.
+    Stores are rewritten with os.replace, so a mapped file never changes underneath.
+    """
+
+    def __init__(self, store_path: str):
+        super().__init__(store_path)
+        self.index = read_index_mapped(os.path.join(store_path, INDEX_FILE))
+        self.inner_product = self.info.get("metric") == "inner_product"
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal
+
+    def memory_bytes(self) -> int:
+        """
+        Size of the index vectors. Still counted when the index is mapped, to
+        bound how much of the page cache the open stores can pin.
+        """
+        return self.index.ntotal * self.index.d * 4
+
+    def search_rows(self, embedding: List[float], k: int) -> List[Tuple[float, int]]:
+        """
+        Returns up to k (score, row) pairs, best first. Scores are oriented
+        so that smaller is better for both L2 and inner-product indexes.
+        """
+        query = np.asarray([embedding], dtype=np.float32)
+        distances, ids = self.index.search(query, k)
+        return [
+            (-float(distance) if self.inner_product else float(distance), int(i))
+            for distance, i in zip(distances[0], ids[0]) if i != -1
+        ]
+
+    def vectors(self, rows: List[int]) -> np.ndarray:
+        return self.index.reconstruct_batch(np.asarray(rows, dtype=np.int64))
+
+
+def migrate_legacy_store(store_path: str) -> Optional[Tuple[float, float]]:
+    """
+    Converts a pickled LangChain store directory to the native format in place.
+    Returns (legacy load seconds, native load seconds), or None if there was nothing to do.
+    Only run this on stores this service wrote itself: loading the legacy format unpickles it.
+    """
+    from langchain_community.vectorstores import FAISS
+    from .clients import get_embeddings
+
+    # Another process converting the same store would write the same temporary files
+    with open(os.path.join(store_path, MIGRATE_LOCK_FILE), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if not is_legacy_store(store_path):
+                return None
+            started = time.perf_counter()
+            legacy = FAISS.load_local(store_path, get_embeddings(), allow_dangerous_deserialization=True)
+            legacy_seconds = time.perf_counter() - started
+            # Removes index.pkl only once every native file is in place
+            save_native_store(legacy, store_path)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+    started = time.perf_counter()
+    NativeStore(store_path)
+    return legacy_seconds, time.perf_counter() - started
@@ -0,0 +1,129 @@
+"""
+Retrieval backends behind the chat and quiz services, selected with VECTOR_BACKEND:
+
+- per_pdf (default): every PDF has its own FAISS index, loaded through the
+  store cache and searched one by one.
+- shared: all vectors live in one sharded SharedIndex and each search is
+  filtered to the requested PDFs.
+
+Both backends read chunk texts, summary samples and topics from the per-PDF
+store directories, so switching backends needs no re-ingestion.
+"""
+import os
+import shutil
+from typing import Dict, List, Optional
+
+from .metrics import registry
+from .lexical_index import HYBRID_RRF_K, HYBRID_SEARCH, tokenize
+from .retriever import ScoredChunk, reciprocal_rank_fusion
+from .store_cache import VECTOR_STORE_DIR, get_store_path, load_store, open_store, store_cache
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "per_pdf").lower()
+if VECTOR_BACKEND not in ("per_pdf", "shared"):
+    raise ValueError(f"Unknown VECTOR_BACKEND: {VECTOR_BACKEND}. Use 'per_pdf' or 'shared'.")
+
+# --- Shared index tuning ---
+# PDFs are spread over this many shards; adding or removing a PDF rewrites one shard
+SHARED_INDEX_SHARDS = int(os.getenv("SHARED_INDEX_SHARDS", "4"))
+# Inverted lists per shard once it is big enough to train, and lists scanned per query
+SHARED_INDEX_NLIST = int(os.getenv("SHARED_INDEX_NLIST", "256"))
+SHARED_INDEX_NPROBE = int(os.getenv("SHARED_INDEX_NPROBE", "16"))
+# Per-PDF chunk columns kept open for reading search hits
+SHARED_INDEX_OPEN_STORES = int(os.getenv("SHARED_INDEX_OPEN_STORES", "256"))
+
+shared_index = None
+if VECTOR_BACKEND == "shared":
+    # Imported here so the per-PDF backend doesn't load FAISS at startup
+    from .shared_index import SharedIndex
+
+    shared_index = SharedIndex(
+        os.path.join(VECTOR_STORE_DIR, "shared"),
+        SHARED_INDEX_SHARDS, SHARED_INDEX_NLIST, SHARED_INDEX_NPROBE, SHARED_INDEX_OPEN_STORES,
+    )
+    registry.gauge_callback("shared_index", "Shared vector index statistics.", shared_index.stats)
+
+
+def check_available(pdf_ids: List[str]) -> None:
+    """Raises FileNotFoundError for the first PDF that has no store."""
+    for pdf_id in pdf_ids:
+        if not os.path.exists(get_store_path(pdf_id)):
+            raise FileNotFoundError(f"Vector store not found for PDF ID: {pdf_id}.")
+
+
+def search_chunks(pdf_ids: List[str], embedding: List[float], k_per_pdf: int,
+                  query: Optional[str] = None) -> List[ScoredChunk]:
+    """
+    Returns candidate chunks of the given PDFs for an already embedded query,
+    with their embeddings. The per-PDF backend returns each PDF's top
+    `k_per_pdf`; the shared index returns the overall top `k_per_pdf` per
+    PDF in a single search, so a weak PDF may get fewer.
+
+    With hybrid search on and the query text given, each PDF's vector hits
+    are fused with its BM25 hits by reciprocal rank fusion, and the scores
+    are the negated fused scores, comparable across PDFs.
+    """
+    unique_ids = list(dict.fromkeys(pdf_ids))
+    vector_hits = _vector_chunks(unique_ids, embedding, k_per_pdf)
+    terms = tokenize(query) if HYBRID_SEARCH and query else []
+    if not terms:
+        return vector_hits
+
+    by_pdf: Dict[str, List[ScoredChunk]] = {}
+    for hit in vector_hits:
+        by_pdf.setdefault(hit.pdf_id, []).append(hit)
+    fused = []
+    for pdf_id in unique_ids:
+        ranked = by_pdf.get(pdf_id, [])
+        lexical_hits = _lexical_chunks(pdf_id, terms, k_per_pdf)
+        # A PDF the shared index favoured keeps its extra candidates
+        fused.extend(reciprocal_rank_fusion([ranked, lexical_hits], max(k_per_pdf, len(ranked)), HYBRID_RRF_K))
+    return fused
+
+
+def _store_chunks(store, pdf_id: str, hits) -> List[ScoredChunk]:
+    vectors = store.vectors([row for _, row in hits]) if hits else []
+    return [
+        ScoredChunk(score, pdf_id, store.get_document(row), vector, row)
+        for (score, row), vector in zip(hits, vectors)
+    ]
+
+
+def _vector_chunks(pdf_ids: List[str], embedding: List[float], k_per_pdf: int) -> List[ScoredChunk]:
+    if shared_index is None:
+        chunks = []
+        for pdf_id in pdf_ids:
+            store = load_store(pdf_id)
+            chunks.extend(_store_chunks(store, pdf_id, store.search_rows(embedding, k_per_pdf)))
+        return chunks
+    for pdf_id in pdf_ids:
+        # Stores ingested before the shared backend was enabled are added on first use
+        if not shared_index.contains(pdf_id):
+            index_pdf(pdf_id)
+    return shared_index.search_chunks(pdf_ids, embedding, k_per_pdf * len(pdf_ids))
+
+
+def _lexical_chunks(pdf_id: str, terms: List[str], k: int) -> List[ScoredChunk]:
+    if shared_index is not None:
+        return shared_index.search_lexical_chunks(pdf_id, terms, k)
+    store = load_store(pdf_id)
+    # BM25 scores are larger-is-better; negated like inner-product distances
+    return _store_chunks(store, pdf_id, [(-score, row) for score, row in store.search_lexical(terms, k)])
+
+
+def index_pdf(pdf_id: str) -> None:
+    """Adds a freshly saved store to the shared index. Nothing to do for the per-PDF backend."""
+    if shared_index is None:
+        return
+    store = open_store(pdf_id)
+    shared_index.add_pdf(pdf_id, store.index.reconstruct_n(0, store.ntotal))
+
+
+def delete_pdf(pdf_id: str) -> bool:
+    """Removes a PDF's store and its vectors. Returns False if there was nothing to remove."""
+    removed = shared_index.remove_pdf(pdf_id) if shared_index is not None else False
+    store_path = get_store_path(pdf_id)
+    if os.path.exists(store_path):
+        shutil.rmtree(store_path)
+        removed = True
+    store_cache.invalidate(pdf_id)
+    return removed
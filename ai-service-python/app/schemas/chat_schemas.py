@@ -5,6 +5,9 @@ class ChatRequest(BaseModel):
     """
     Defines the data model for a user's chat query.
     It includes the question and a list of PDF IDs for context.
+    Set `bypassCache` to always generate a fresh answer, e.g. to compare
+    cached and uncached answer quality.
     """
     query: str
     pdfIds: List[str]
+    bypassCache: bool = False
@@ -1,4 +1,5 @@
 from pydantic import BaseModel, HttpUrl
+from typing import Dict, Literal, Optional
 
 class PDFProcessRequest(BaseModel):
     """
@@ -7,3 +8,16 @@ class PDFProcessRequest(BaseModel):
     pdfId: str
     pdfUrl: HttpUrl
 
+class PDFJobStatus(BaseModel):
+    """
+    Defines the status of a PDF ingestion job. Times are Unix timestamps,
+    and `timings` holds the duration in seconds of each ingestion stage.
+    """
+    pdfId: str
+    state: Literal['queued', 'running', 'done', 'failed']
+    attempts: int
+    error: Optional[str] = None
+    createdAt: float
+    startedAt: Optional[float] = None
+    finishedAt: Optional[float] = None
+    timings: Optional[Dict[str, float]] = None
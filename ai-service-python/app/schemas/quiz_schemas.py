@@ -41,6 +41,15 @@ class GeneratedQuiz(BaseModel):
     saqs: List[SAQ]
     laqs: List[LAQ]
 
+class QuizSectionError(BaseModel):
+    """
+    Streamed by /generate-quiz/stream when a section still lacks questions
+    after its retries; `missing` is how many of that type were not generated.
+    """
+    question_type: Literal['mcq', 'saq', 'laq']
+    missing: int
+    error: str
+
 
 # --- 2. Schemas for Quiz GRADING ---
 
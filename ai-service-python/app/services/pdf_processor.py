@@ -1,83 +1,312 @@
 import os
-import requests
-from langchain_community.document_loaders import PyPDFLoader
+import time
+import hashlib
+import asyncio
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Tuple
+import httpx
+import numpy as np
+from pypdf import PdfReader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import OllamaEmbeddings
-from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
 
 # NEW: Import the YouTube topic generation service
 from .youtube_service import generate_youtube_topics
+from ..core.clients import EMBEDDING_MODEL, embedding_space, get_embeddings
+from ..core.store_cache import get_store_path, open_store, store_cache
+from ..core.job_queue import ingestion_queue
+from ..core.embedding_cache import CachedEmbeddings, get_embedding_cache
+from ..core.sampling import build_summary_sample, save_summary_sample
+from ..core.store_format import NativeStore, NativeStoreWriter, copy_store
+from ..core.ingest_checkpoints import IngestCheckpoint, PageBatch, load_page_manifest, page_hash, save_page_manifest
+from ..core.vector_backend import index_pdf
+from ..core.backend_callbacks import callback_dispatcher
+from ..core.metrics import EMBEDDING_SECONDS, INGEST_STAGE_SECONDS
 
-NODE_BACKEND_URL = os.getenv("NODE_BACKEND_URL", "http://localhost:5000")
-VECTOR_STORE_DIR = "vector_store"
-os.makedirs(VECTOR_STORE_DIR, exist_ok=True)
+# --- Ingestion pipeline tuning ---
+# Pages handed to a worker process per extraction task
+PAGE_BATCH_SIZE = int(os.getenv("INGEST_PAGE_BATCH_SIZE", "16"))
+# Worker processes used for page text extraction
+EXTRACT_WORKERS = int(os.getenv("INGEST_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Extraction tasks allowed ahead of the embedder; bounds how much text is held in memory
+MAX_PENDING_PAGE_BATCHES = EXTRACT_WORKERS * 2
+DOWNLOAD_TIMEOUT_SECONDS = float(os.getenv("INGEST_DOWNLOAD_TIMEOUT_SECONDS", "120"))
+
+text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=150)
+
+_extract_pool: ProcessPoolExecutor | None = None
+
+def _get_extract_pool() -> ProcessPoolExecutor:
+    global _extract_pool
+    if _extract_pool is None:
+        _extract_pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS)
+    return _extract_pool
+
+def _count_pages(pdf_path: str) -> int:
+    return len(PdfReader(pdf_path).pages)
+
+def _extract_pages(pdf_path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    """Runs in a worker process: extracts the text of pages [start, end)."""
+    reader = PdfReader(pdf_path)
+    return [(i, reader.pages[i].extract_text() or "") for i in range(start, end)]
 
 # UPDATED: The callback now accepts an optional dictionary of topics
-def notify_backend(pdf_id: str, status: str, vector_store_path: str | None = None, youtube_topics: list | None = None):
-    """Calls back to the Node.js backend with the processing status and any generated data."""
-    callback_url = f"{NODE_BACKEND_URL}/api/v1/pdfs/update-status"
+async def notify_backend(pdf_id: str, status: str, vector_store_path: str | None = None, youtube_topics: list | None = None):
+    """
+    Queues a callback to the Node.js backend with the processing status and any generated data.
+    Delivery happens in the background and is retried until the backend accepts it.
+    """
     payload = { "pdfId": pdf_id, "status": status }
     if vector_store_path:
         payload["vectorStorePath"] = vector_store_path
     if youtube_topics:
         payload["youtubeTopics"] = youtube_topics # Add topics to the payload
-    
+
+    print(f"[{pdf_id}] Notifying backend with status: {status}")
+    await callback_dispatcher.notify(pdf_id, payload)
+
+async def download_pdf(pdf_url: str, dest) -> Tuple[int, str]:
+    """
+    Streams the PDF into `dest` without blocking the event loop.
+    Returns the byte count and the SHA-256 of the content.
+    """
+    size = 0
+    digest = hashlib.sha256()
+    async with httpx.AsyncClient(timeout=DOWNLOAD_TIMEOUT_SECONDS, follow_redirects=True) as client:
+        async with client.stream("GET", pdf_url) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes(chunk_size=64 * 1024):
+                dest.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+    dest.flush()
+    return size, digest.hexdigest()
+
+async def iter_page_batches(pdf_path: str, ranges: List[Tuple[int, int]]) -> AsyncIterator[Tuple[int, int, List[Tuple[int, str]]]]:
+    """
+    Extracts the text of each [start, end) page range in a process pool and yields
+    (start, end, pages) in order. At most MAX_PENDING_PAGE_BATCHES are in flight,
+    so memory does not grow with page count.
+    """
+    loop = asyncio.get_running_loop()
+    pool = _get_extract_pool()
+    pending = deque()
+
+    async def next_batch():
+        start, end, future = pending.popleft()
+        return start, end, await future
+
+    for start, end in ranges:
+        pending.append((start, end, loop.run_in_executor(pool, _extract_pages, pdf_path, start, end)))
+        if len(pending) >= MAX_PENDING_PAGE_BATCHES:
+            yield await next_batch()
+    while pending:
+        yield await next_batch()
+
+async def build_vector_store(pdf_id: str, checkpoint: IngestCheckpoint, source: str, timings: Dict[str, float]) -> None:
+    """
+    Chunks and embeds the PDF one page batch at a time, checkpointing every
+    finished batch, then streams the batches into the store one at a time.
+    Batches finished by an earlier attempt are loaded instead of redone, and
+    pages whose text is unchanged since the existing store was built reuse
+    its chunks and embeddings, so re-submitting a PDF with extra pages only
+    embeds the new ones.
+    """
+    import faiss
+
+    # Chunks embedded before (e.g. the same notes uploaded under another pdfId) come from the cache
+    space = embedding_space()
+    embeddings = CachedEmbeddings(get_embeddings(), space, get_embedding_cache(space))
+    num_pages = await asyncio.to_thread(_count_pages, checkpoint.source_path)
+    print(f"[{pdf_id}] PDF has {num_pages} pages.")
+
+    store_path = get_store_path(pdf_id)
+    previous_pages = load_page_manifest(store_path) if os.path.exists(store_path) else {}
+    previous_store = await asyncio.to_thread(open_store, pdf_id) if previous_pages else None
+
+    ranges = [(start, min(start + PAGE_BATCH_SIZE, num_pages)) for start in range(0, num_pages, PAGE_BATCH_SIZE)]
+    done = checkpoint.completed(ranges)
+    if done:
+        print(f"[{pdf_id}] Resuming: {len(done)}/{len(ranges)} page batches already done.")
+    reused_pages = 0
+
+    embedded_chunks = 0
+
+    async def embed(texts: List[str]) -> List[List[float]]:
+        # The embedding client splits these into adaptive batches and runs several at once
+        nonlocal embedded_chunks
+        if not texts:
+            return []
+        started = time.perf_counter()
+        vectors = await embeddings.aembed_documents(texts)
+        elapsed = time.perf_counter() - started
+        timings["embed"] += elapsed
+        embedded_chunks += len(texts)
+        EMBEDDING_SECONDS.observe(elapsed, kind="documents")
+        return vectors
+
+    started = time.perf_counter()
+    async for start, end, page_batch in iter_page_batches(checkpoint.source_path, [r for r in ranges if r not in done]):
+        timings["extract"] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        pages = [(page, page_hash(text)) for page, text in page_batch]
+        texts: List[str] = []
+        metadatas: List[Dict[str, Any]] = []
+        vectors: List[Any] = []
+        new_chunks: List[Tuple[int, Document]] = []
+        for (page, text), (_, digest) in zip(page_batch, pages):
+            previous = previous_pages.get(page)
+            if previous is not None and previous[0] == digest:
+                # Same text as in the existing store: copy its chunks and vectors
+                _, first, count = previous
+                texts.extend(previous_store.get_text(row) for row in range(first, first + count))
+                metadatas.extend({"source": source, "page": page} for _ in range(count))
+                vectors.extend(previous_store.index.reconstruct_n(first, count) if count else [])
+                reused_pages += 1
+            elif text.strip():
+                for chunk in text_splitter.split_documents([Document(page_content=text, metadata={"source": source, "page": page})]):
+                    new_chunks.append((len(texts), chunk))
+                    texts.append(chunk.page_content)
+                    metadatas.append(chunk.metadata)
+                    vectors.append(None)
+        timings["chunk"] += time.perf_counter() - started
+
+        for (position, _), vector in zip(new_chunks, await embed([chunk.page_content for _, chunk in new_chunks])):
+            vectors[position] = vector
+        batch_vectors = np.asarray(vectors, dtype=np.float32) if vectors else np.zeros((0, 0), dtype=np.float32)
+        await asyncio.to_thread(checkpoint.save_batch, start, end, PageBatch(pages, texts, metadatas, batch_vectors))
+        started = time.perf_counter()
+
+    # Stream the batches into the store in page order, holding one batch in memory at a time
+    writer = None
+    page_rows = []
+    row = 0
     try:
-        print(f"[{pdf_id}] Notifying backend with status: {status}")
-        response = requests.post(callback_url, json=payload)
-        response.raise_for_status()
-        print(f"[{pdf_id}] Backend notified successfully.")
-    except requests.exceptions.RequestException as e:
-        print(f"[{pdf_id}] ERROR: Failed to notify backend: {e}")
+        for r in ranges:
+            started = time.perf_counter()
+            batch = await asyncio.to_thread(checkpoint.load_batch, *r)
+            if writer is None and batch.texts:
+                writer = NativeStoreWriter(store_path, faiss.IndexFlatL2(batch.vectors.shape[1]))
+            for page, digest in batch.pages:
+                count = sum(1 for metadata in batch.metadatas if metadata["page"] == page)
+                page_rows.append((page, digest, row, count))
+                row += count
+            if batch.texts:
+                await asyncio.to_thread(writer.add, batch.texts, batch.metadatas, batch.vectors)
+            timings["index"] += time.perf_counter() - started
+        if writer is None:
+            raise ValueError("No text could be extracted from the PDF.")
+        started = time.perf_counter()
+        await asyncio.to_thread(writer.commit)
+    except BaseException:
+        if writer is not None:
+            await asyncio.to_thread(writer.abort)
+        raise
+    await asyncio.to_thread(save_page_manifest, store_path, page_rows)
+    timings["save"] += time.perf_counter() - started
+    total_chunks = len(writer)
 
-# NOTE: We need an async function to call the async youtube service
-async def process_pdf_and_store(pdf_id: str, pdf_url: str):
+    print(f"[{pdf_id}] PDF split into {total_chunks} chunks ({reused_pages} unchanged pages reused).")
+    if timings["embed"] > 0:
+        print(
+            f"[{pdf_id}] Embedded {embedded_chunks} chunks in {timings['embed']:.2f}s "
+            f"({embedded_chunks / timings['embed']:.1f} chunks/s)."
+        )
+    cache_stats = embeddings.cache.stats()
+    print(
+        f"[{pdf_id}] Embedding cache: {embeddings.hits} chunks reused this run, "
+        f"overall hit rate {cache_stats['hit_rate']:.1%} ({cache_stats['entries']} entries)."
+    )
+
+async def ingest_pdf(pdf_id: str, pdf_url: str) -> Dict[str, Any]:
     """
     Downloads a PDF, creates a vector store, generates YouTube topics, and notifies the backend.
+    Raises on failure so the ingestion queue can retry; a retry resumes from the last checkpoint.
+    Returns the content hash and stage timings.
     """
-    temp_pdf_path = f"temp_{pdf_id}.pdf"
-    vector_store_path = os.path.join(VECTOR_STORE_DIR, f"{pdf_id}.faiss")
+    pdf_url = str(pdf_url)
+    vector_store_path = get_store_path(pdf_id)
+    timings = {"download": 0.0, "extract": 0.0, "chunk": 0.0, "embed": 0.0, "index": 0.0, "save": 0.0, "topics": 0.0}
+    total_started = time.perf_counter()
 
     try:
-        # Steps 1 & 2: Download, Load, and Chunk (No change)
-        print(f"[{pdf_id}] Downloading PDF from: {pdf_url}")
-        response = requests.get(pdf_url, stream=True)
-        response.raise_for_status()
-        with open(temp_pdf_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-        print(f"[{pdf_id}] PDF downloaded successfully.")
-
-        print(f"[{pdf_id}] Loading and chunking PDF...")
-        loader = PyPDFLoader(temp_pdf_path)
-        documents = loader.load()
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=150)
-        chunks = text_splitter.split_documents(documents)
-        print(f"[{pdf_id}] PDF split into {len(chunks)} chunks.")
-
-        # Step 3: Create Embeddings and Vector Store (No change)
-        print(f"[{pdf_id}] Creating embeddings with local nomic-embed-text...")
-        embeddings = OllamaEmbeddings(model="nomic-embed-text")
-        vector_store = FAISS.from_documents(chunks, embeddings)
-        vector_store.save_local(vector_store_path)
+        # The PDF is kept in the checkpoint directory until the store is saved,
+        # so a retry doesn't download it again; worker processes read it by name
+        checkpoint = await asyncio.to_thread(IngestCheckpoint, pdf_id, pdf_url)
+        downloaded = checkpoint.download()
+        if downloaded is not None:
+            size, content_hash = downloaded
+            print(f"[{pdf_id}] Using PDF downloaded by an earlier attempt ({size} bytes).")
+        else:
+            # Step 1: Stream the download to disk
+            print(f"[{pdf_id}] Downloading PDF from: {pdf_url}")
+            started = time.perf_counter()
+            partial_path = f"{checkpoint.source_path}.part"
+            with open(partial_path, "wb") as dest:
+                size, content_hash = await download_pdf(pdf_url, dest)
+            os.replace(partial_path, checkpoint.source_path)
+            checkpoint.save_download(size, content_hash)
+            timings["download"] = time.perf_counter() - started
+            print(f"[{pdf_id}] PDF downloaded successfully ({size} bytes).")
+
+        duplicate_of = ingestion_queue.find_done_by_hash(content_hash, exclude_pdf_id=pdf_id)
+        if duplicate_of and os.path.exists(get_store_path(duplicate_of)):
+            # Identical content was already ingested under another pdfId, so reuse its store
+            print(f"[{pdf_id}] Same content as PDF ID {duplicate_of}, copying its vector store.")
+            started = time.perf_counter()
+            await asyncio.to_thread(copy_store, get_store_path(duplicate_of), vector_store_path)
+            timings["save"] = time.perf_counter() - started
+        else:
+            # Steps 2 & 3: Extract, chunk and embed page batches as a pipeline
+            print(f"[{pdf_id}] Extracting, chunking and embedding with local {EMBEDDING_MODEL}...")
+            await build_vector_store(pdf_id, checkpoint, pdf_url, timings)
+            started = time.perf_counter()
+            # Precompute the representative chunks quiz and topic generation read instead of the full store
+            saved_store = await asyncio.to_thread(NativeStore, vector_store_path)
+            sample = await asyncio.to_thread(build_summary_sample, saved_store)
+            await asyncio.to_thread(save_summary_sample, vector_store_path, sample)
+            timings["save"] += time.perf_counter() - started
+        await asyncio.to_thread(checkpoint.clear)
+
+        # Make sure no service keeps serving a stale copy of a rewritten store
+        store_cache.invalidate(pdf_id)
+        await asyncio.to_thread(index_pdf, pdf_id)
         print(f"[{pdf_id}] Vector store saved to: {vector_store_path}")
 
-        # NEW Step 4: Generate YouTube Topics
+        # Step 4: Generate YouTube Topics
         print(f"[{pdf_id}] Generating YouTube topics...")
+        started = time.perf_counter()
         # The service expects a dict, we get back a dict of {pdf_id: [topics]}
         topics_result = await generate_youtube_topics([pdf_id])
+        timings["topics"] = time.perf_counter() - started
         # Extract the list of topics for our current PDF
         generated_topics = topics_result.get(pdf_id, [])
         print(f"[{pdf_id}] Generated topics: {generated_topics}")
 
         # Step 5: Notify backend of success with ALL the data
-        notify_backend(pdf_id, "ready", vector_store_path, generated_topics)
+        await notify_backend(pdf_id, "ready", vector_store_path, generated_topics)
+        return {"content_hash": content_hash, "timings": timings}
+
+    finally:
+        timings["total"] = time.perf_counter() - total_started
+        for stage, seconds in timings.items():
+            INGEST_STAGE_SECONDS.observe(seconds, stage=stage)
+        summary = ", ".join(f"{stage}={seconds:.2f}s" for stage, seconds in timings.items())
+        print(f"[{pdf_id}] Stage timings: {summary}")
 
+async def notify_failed(pdf_id: str):
+    """Called by the ingestion queue once a job has used up its retries."""
+    await notify_backend(pdf_id, "failed")
+
+# NOTE: We need an async function to call the async youtube service
+async def process_pdf_and_store(pdf_id: str, pdf_url: str):
+    """
+    Runs a single ingestion without the queue, reporting failure to the backend directly.
+    """
+    try:
+        await ingest_pdf(pdf_id, pdf_url)
     except Exception as e:
         print(f"[{pdf_id}] ERROR during processing: {e}")
-        notify_backend(pdf_id, "failed")
-    
-    finally:
-        if os.path.exists(temp_pdf_path):
-            os.remove(temp_pdf_path)
-            print(f"[{pdf_id}] Cleaned up temporary file: {temp_pdf_path}")
\ No newline at end of file
+        await notify_failed(pdf_id)
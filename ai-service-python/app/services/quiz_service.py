@@ -1,88 +1,351 @@
 import os
 import json
+import time
 import random
-from typing import List, Dict
-from langchain_community.vectorstores import FAISS
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_community.embeddings import OllamaEmbeddings
+import asyncio
+from typing import AsyncGenerator, Callable, Dict, List, Optional, Tuple
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.prompts import PromptTemplate
-from pydantic import ValidationError
+from pydantic import BaseModel, ValidationError
 
 from ..schemas.quiz_schemas import (
-    QuizGenerationRequest, GeneratedQuiz,
-    QuizGradingRequest, QuizGradingResponse, GradedQuestion
+    QuizGenerationRequest, GeneratedQuiz, MCQ, SAQ, LAQ, QuizSectionError,
+    QuizGradingRequest, QuizGradingResponse, GradedQuestion, QuestionToGrade
 )
-from .rag_service import VECTOR_STORE_DIR
-
-# --- Model Initialization (Hybrid) ---
-# Use the full, correct model name from your list
-llm = ChatGoogleGenerativeAI(model="models/gemini-pro-latest", temperature=0.3)
-# Use local Ollama for loading/retrieving embeddings
-embeddings = OllamaEmbeddings(model="nomic-embed-text")
-
-def get_context_from_pdfs(pdf_ids: List[str]) -> str:
-    all_docs = []
-    for pdf_id in pdf_ids:
-        vector_store_path = os.path.join(VECTOR_STORE_DIR, f"{pdf_id}.faiss")
-        if not os.path.exists(vector_store_path):
-            raise FileNotFoundError(f"Vector store not found for PDF ID: {pdf_id}.")
-        store = FAISS.load_local(vector_store_path, embeddings, allow_dangerous_deserialization=True)
-        all_docs.extend(list(store.docstore._dict.values()))
-
-    num_samples = min(15, len(all_docs))
-    sampled_docs = random.sample(all_docs, num_samples)
-    return "\n\n".join(
-        f"Content from page {doc.metadata.get('page', 'N/A')}:\n{doc.page_content}"
-        for doc in sampled_docs
-    )
+from ..core.clients import GEMINI_MODEL, get_llm
+from ..core.store_cache import get_store_path, load_store
+from ..core.sampling import build_summary_sample, load_summary_sample, save_summary_sample
+from ..core.context_builder import (
+    TOPIC_CONTEXT_TOKENS, ContextChunk, format_context, log_prompt, quiz_budget, select_chunks,
+)
+from ..core.rate_limit import RateLimitedExecutor
+from ..core.llm_cache import (
+    QUIZ_RESULT_CACHE_TTL_SECONDS, cache_key, llm_result_cache, normalize_text, store_versions,
+)
+from ..core.metrics import GRADING_SECONDS, LLM_SECONDS, timed
 
-def fix_quiz_json(data: Dict) -> Dict:
-    if all(k in data for k in ['mcqs', 'saqs', 'laqs']): return data
-    if 'questions' in data and isinstance(data['questions'], dict):
-        d = data['questions']
-        return {
-            'mcqs': next((v for k,v in d.items() if k.lower()=='mcqs'),[]),
-            'saqs': next((v for k,v in d.items() if k.lower()=='saqs'),[]),
-            'laqs': next((v for k,v in d.items() if k.lower()=='laqs'),[])
-        }
-    if 'questions' in data and isinstance(data['questions'], list):
-        return {
-            'mcqs': [q for q in data['questions'] if q.get('question_type')=='mcq'],
-            'saqs': [q for q in data['questions'] if q.get('question_type')=='saq'],
-            'laqs': [q for q in data['questions'] if q.get('question_type')=='laq']
-        }
-    mcqs=next((v for k,v in data.items() if k.lower()=='mcqs'),None)
-    saqs=next((v for k,v in data.items() if k.lower()=='saqs'),None)
-    laqs=next((v for k,v in data.items() if k.lower()=='laqs'),None)
-    if all([mcqs, saqs, laqs]): return {'mcqs':mcqs,'saqs':saqs,'laqs':laqs}
-    raise ValueError("LLM output is in an unknown format and could not be corrected.")
+# --- Model configuration ---
+# The shared client for this temperature is created on first use
+QUIZ_TEMPERATURE = 0.3
+# Part of every cached result's key, so changing the model doesn't serve results of the old one
+QUIZ_MODEL_CONFIG = {"model": GEMINI_MODEL, "temperature": QUIZ_TEMPERATURE}
 
-async def generate_quiz_from_pdfs(request: QuizGenerationRequest) -> GeneratedQuiz:
-    context = get_context_from_pdfs(request.pdfIds)
-    parser = JsonOutputParser(pydantic_object=GeneratedQuiz)
-    prompt = PromptTemplate(
-        template="""You are an expert quiz creator. Based *only* on the provided context, generate a quiz.
+# --- Grading concurrency ---
+# Free-text answers graded at once, and the rate at which grading calls may start
+GRADING_CONCURRENCY = int(os.getenv("GRADING_CONCURRENCY", "5"))
+GRADING_RATE_PER_SECOND = float(os.getenv("GRADING_RATE_PER_SECOND", "5"))
+GRADING_BURST = float(os.getenv("GRADING_BURST", "5"))
+# Answers graded per LLM call; 1 grades every answer in its own call
+GRADING_BATCH_SIZE = int(os.getenv("GRADING_BATCH_SIZE", "1"))
+
+grading_executor = RateLimitedExecutor(GRADING_CONCURRENCY, GRADING_RATE_PER_SECOND, GRADING_BURST)
+
+# --- Sectioned quiz generation ---
+# Questions of one type asked for per LLM call; larger quizzes are split into concurrent sections
+QUIZ_SECTION_SIZE = max(1, int(os.getenv("QUIZ_SECTION_SIZE", "5")))
+QUIZ_SECTION_CONCURRENCY = int(os.getenv("QUIZ_SECTION_CONCURRENCY", "4"))
+QUIZ_SECTION_RATE_PER_SECOND = float(os.getenv("QUIZ_SECTION_RATE_PER_SECOND", "5"))
+QUIZ_SECTION_BURST = float(os.getenv("QUIZ_SECTION_BURST", "5"))
+# Attempts per section; a retry asks only for the questions still missing
+QUIZ_SECTION_MAX_ATTEMPTS = int(os.getenv("QUIZ_SECTION_MAX_ATTEMPTS", "3"))
+
+quiz_executor = RateLimitedExecutor(QUIZ_SECTION_CONCURRENCY, QUIZ_SECTION_RATE_PER_SECOND, QUIZ_SECTION_BURST)
+
+class GradedBatch(BaseModel):
+    """Output structure for grading several answers in a single prompt."""
+    graded_questions: List[GradedQuestion]
+
+def get_summary_sample(pdf_id: str) -> List[Dict]:
+    """
+    Returns the representative chunks precomputed for a PDF at ingestion.
+    Stores created before samples existed get theirs built once and saved.
+    """
+    store_path = get_store_path(pdf_id)
+    if not os.path.exists(store_path):
+        raise FileNotFoundError(f"Vector store not found for PDF ID: {pdf_id}.")
+    sample = load_summary_sample(store_path)
+    if sample is None:
+        sample = build_summary_sample(load_store(pdf_id))
+        save_summary_sample(store_path, sample)
+    return sample
+
+def get_context_from_pdfs(pdf_ids: List[str], budget_tokens: int = TOPIC_CONTEXT_TOKENS) -> Tuple[str, List[ContextChunk]]:
+    """
+    Fills `budget_tokens` with each PDF's representative chunks, taken in a
+    random order and round-robin so every PDF is covered. Returns the
+    formatted context and the chunks it holds.
+    """
+    candidates = {}
+    for pdf_id in dict.fromkeys(pdf_ids):
+        sample = get_summary_sample(pdf_id)
+        candidates[pdf_id] = [
+            ContextChunk(item["page"], item["text"], item.get("vector"))
+            for item in random.sample(sample, len(sample))
+        ]
+    chunks = select_chunks(candidates, budget_tokens)
+    return format_context(chunks), chunks
+
+class MCQSection(BaseModel):
+    """Output structure for one section of multiple-choice questions."""
+    questions: List[MCQ]
+
+class SAQSection(BaseModel):
+    """Output structure for one section of short-answer questions."""
+    questions: List[SAQ]
+
+class LAQSection(BaseModel):
+    """Output structure for one section of long-answer questions."""
+    questions: List[LAQ]
+
+# Per question type: question schema, section schema, label and what to ask for
+SECTION_SPECS = {
+    'mcq': (MCQ, MCQSection, "MCQs",
+            "multiple-choice questions, each with four options and a correct_answer copied exactly from one of them"),
+    'saq': (SAQ, SAQSection, "SAQs", "short-answer questions, each with a brief ideal answer"),
+    'laq': (LAQ, LAQSection, "LAQs", "long-answer questions, each with a detailed ideal answer"),
+}
+
+section_prompt = PromptTemplate(
+    template="""You are an expert quiz creator. Based *only* on the provided context, write quiz questions.
 {format_instructions}
 CONTEXT:
 {context}
-Generate a quiz with: {numMCQs} MCQs, {numSAQs} SAQs, {numLAQs} LAQs.""",
-        input_variables=["context", "numMCQs", "numSAQs", "numLAQs"],
-        partial_variables={"format_instructions": parser.get_format_instructions()}
+Generate exactly {count} {label}: {description}.""",
+    input_variables=["context", "count", "label", "description", "format_instructions"],
+)
+
+class QuizSection:
+    """Questions of one type generated by a single LLM call, over their own slice of the context."""
+
+    def __init__(self, question_type: str, count: int):
+        self.question_type = question_type
+        self.count = count
+        self.budget = quiz_budget(*(count if t == question_type else 0 for t in SECTION_SPECS))
+        self.chunks: List[ContextChunk] = []
+        self.used = 0
+        self.generated = 0
+
+def plan_sections(request: QuizGenerationRequest) -> List[QuizSection]:
+    sections = []
+    for question_type, total in (('mcq', request.numMCQs), ('saq', request.numSAQs), ('laq', request.numLAQs)):
+        for start in range(0, total, QUIZ_SECTION_SIZE):
+            sections.append(QuizSection(question_type, min(QUIZ_SECTION_SIZE, total - start)))
+    return sections
+
+def assign_section_contexts(pdf_ids: List[str], sections: List[QuizSection]) -> None:
+    """
+    Selects context for the whole quiz, then deals it out so each section
+    covers different material within its own budget. Sections left empty
+    (a PDF with very few chunks) share the whole selection.
+    """
+    _, chunks = get_context_from_pdfs(pdf_ids, sum(section.budget for section in sections))
+    for chunk in chunks:
+        section = max(sections, key=lambda s: s.budget - s.used)
+        if chunk.tokens <= section.budget - section.used:
+            section.chunks.append(chunk)
+            section.used += chunk.tokens
+    for section in sections:
+        if not section.chunks:
+            section.chunks = chunks
+
+async def prepare_quiz_sections(request: QuizGenerationRequest) -> List[QuizSection]:
+    """Plans the sections and their context; raises FileNotFoundError for an unknown PDF."""
+    sections = plan_sections(request)
+    if sections:
+        # Samples may have to be built from the store, which blocks
+        await asyncio.to_thread(assign_section_contexts, request.pdfIds, sections)
+    return sections
+
+def _section_questions(data, question_type: str) -> List[BaseModel]:
+    """
+    Returns the valid questions in a section's output, dropping malformed
+    ones. Accepts a bare list or a dict keyed 'questions' or e.g. 'mcqs'.
+    """
+    items = data
+    if isinstance(data, dict):
+        items = data.get('questions')
+        if items is None:
+            items = next((v for k, v in data.items() if k.lower() == f"{question_type}s"), None)
+    if not isinstance(items, list):
+        raise ValueError("LLM output is in an unknown format and could not be corrected.")
+    model = SECTION_SPECS[question_type][0]
+    questions = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        try:
+            questions.append(model(**{**item, 'question_type': question_type}))
+        except ValidationError:
+            continue
+    return questions
+
+async def _generate_section(section: QuizSection, num_pdfs: int, emit: Callable[[BaseModel], None]) -> Optional[str]:
+    """
+    Generates a section's questions, passing each valid one to `emit` as
+    soon as it is parsed. A retry asks only for the questions still missing.
+    Returns the last error if the section is still short after all attempts.
+    """
+    _, section_model, label, description = SECTION_SPECS[section.question_type]
+    parser = JsonOutputParser(pydantic_object=section_model)
+    chain = section_prompt | get_llm(QUIZ_TEMPERATURE) | parser
+    context = format_context(section.chunks)
+    error = None
+    for attempt in range(1, QUIZ_SECTION_MAX_ATTEMPTS + 1):
+        wanted = section.count - section.generated
+        inputs = {
+            "context": context, "count": wanted, "label": label, "description": description,
+            "format_instructions": parser.get_format_instructions(),
+        }
+        if attempt == 1:
+            log_prompt("quiz_section", section_prompt.format(**inputs), section.chunks, num_pdfs, section.budget)
+
+        async def invoke():
+            with timed(LLM_SECONDS, operation="quiz_section"):
+                return await chain.ainvoke(inputs)
+
+        try:
+            questions = _section_questions(await quiz_executor.run(invoke), section.question_type)[:wanted]
+        except Exception as e:
+            error = str(e)
+            print(f"[quiz] {label} section attempt {attempt} failed: {e}")
+            continue
+        for question in questions:
+            emit(question)
+        section.generated += len(questions)
+        if section.generated == section.count:
+            return None
+        error = f"got {len(questions)} of {wanted} {label}"
+        print(f"[quiz] {label} section attempt {attempt} was short: {error}")
+    return error
+
+async def stream_quiz_sections(sections: List[QuizSection], num_pdfs: int) -> AsyncGenerator[BaseModel, None]:
+    """
+    Generates all sections concurrently and yields each validated MCQ, SAQ
+    or LAQ as soon as it is ready, followed by a QuizSectionError for every
+    section that is still short after its retries.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def run(section: QuizSection):
+        try:
+            error = await _generate_section(section, num_pdfs, queue.put_nowait)
+        except Exception as e:
+            error = str(e)
+        if section.generated < section.count:
+            queue.put_nowait(QuizSectionError(
+                question_type=section.question_type, missing=section.count - section.generated,
+                error=error or "generation failed",
+            ))
+        queue.put_nowait(None)
+
+    tasks = [asyncio.ensure_future(run(section)) for section in sections]
+    try:
+        running = len(tasks)
+        while running:
+            item = await queue.get()
+            if item is None:
+                running -= 1
+            else:
+                yield item
+    finally:
+        # The client may have gone away; no point finishing its sections
+        for task in tasks:
+            task.cancel()
+
+async def generate_quiz_from_pdfs(request: QuizGenerationRequest) -> GeneratedQuiz:
+    """
+    Generates the quiz in concurrent sections of up to QUIZ_SECTION_SIZE
+    questions. Sections that stay short after their retries leave the quiz
+    short rather than failing it; only a quiz with no questions at all fails.
+
+    Identical requests in flight at the same time, such as frontend retries,
+    share one generation, and a complete quiz is reused by repeats of the
+    request within QUIZ_RESULT_CACHE_TTL_SECONDS.
+    """
+    key = cache_key("quiz", QUIZ_MODEL_CONFIG, {
+        "pdfs": await asyncio.to_thread(store_versions, request.pdfIds),
+        "counts": [request.numMCQs, request.numSAQs, request.numLAQs],
+    })
+    complete = lambda quiz: (len(quiz.mcqs), len(quiz.saqs), len(quiz.laqs)) == (
+        request.numMCQs, request.numSAQs, request.numLAQs
+    )
+    return await llm_result_cache.get_or_compute(
+        "quiz", key, lambda: _generate_quiz(request), cacheable=complete, ttl=QUIZ_RESULT_CACHE_TTL_SECONDS,
     )
-    chain = prompt | llm | parser
+
+async def _generate_quiz(request: QuizGenerationRequest) -> GeneratedQuiz:
+    sections = await prepare_quiz_sections(request)
+    questions = {'mcq': [], 'saq': [], 'laq': []}
+    missing = 0
+    with timed(LLM_SECONDS, span="llm_quiz", operation="quiz"):
+        async for item in stream_quiz_sections(sections, len(set(request.pdfIds))):
+            if isinstance(item, QuizSectionError):
+                missing += item.missing
+            else:
+                questions[item.question_type].append(item)
+    if missing:
+        if not any(questions.values()):
+            raise ValueError("Failed to generate a valid quiz from the AI service.")
+        print(f"[quiz] Returning a quiz {missing} question(s) short after retries.")
+    return GeneratedQuiz(mcqs=questions['mcq'], saqs=questions['saq'], laqs=questions['laq'])
+
+def _grade_mcq(item: QuestionToGrade) -> GradedQuestion:
+    score = 1 if item.user_answer.strip().lower() == item.ideal_answer.strip().lower() else 0
+    explanation = "Correct!" if score == 1 else f"Incorrect. The correct answer is: {item.ideal_answer}"
+    return GradedQuestion(question=item.question, score=score, explanation=explanation)
+
+# Explanation given for an answer the model failed to grade; such grades are never cached
+GRADING_ERROR_PREFIX = "AI error during grading:"
+
+def _grading_key(item: QuestionToGrade) -> str:
+    return cache_key("grade", QUIZ_MODEL_CONFIG, [
+        item.question_type, normalize_text(item.question),
+        normalize_text(item.ideal_answer), normalize_text(item.user_answer),
+    ])
+
+def _is_grade(graded: GradedQuestion) -> bool:
+    return not graded.explanation.startswith(GRADING_ERROR_PREFIX)
+
+async def _grade_one(chain, item: QuestionToGrade) -> GradedQuestion:
     try:
-        raw_result = await chain.ainvoke({
-            "context": context, "numMCQs": request.numMCQs,
-            "numSAQs": request.numSAQs, "numLAQs": request.numLAQs
+        res = await chain.ainvoke({
+            "question": item.question, "ideal_answer": item.ideal_answer,
+            "user_answer": item.user_answer
         })
-        return GeneratedQuiz(**fix_quiz_json(raw_result))
-    except (ValueError, ValidationError) as e:
-        print(f"Error parsing/validating LLM output: {e}")
-        raise ValueError("Failed to generate a valid quiz from the AI service.")
+        return GradedQuestion(**res)
+    except Exception as e:
+        return GradedQuestion(question=item.question, score=0,
+            explanation=f"{GRADING_ERROR_PREFIX} {e}")
+
+async def _grade_batch(batch_chain, single_chain, items: List[QuestionToGrade]) -> List[GradedQuestion]:
+    """Grades several answers in one prompt, falling back to one call per answer if the output is unusable."""
+    try:
+        answers = "\n\n".join(
+            f"ANSWER {n}\nTYPE: {item.question_type.upper()}\nQUESTION: {item.question}\n"
+            f"IDEAL ANSWER: {item.ideal_answer}\nSTUDENT'S ANSWER: {item.user_answer}"
+            for n, item in enumerate(items, start=1)
+        )
+        res = await batch_chain.ainvoke({"count": len(items), "answers": answers})
+        graded = [GradedQuestion(**g) for g in res.get("graded_questions", [])]
+        if len(graded) != len(items):
+            raise ValueError(f"expected {len(items)} grades, got {len(graded)}")
+        # Keep the original question text even if the model paraphrased it
+        return [g.model_copy(update={"question": item.question}) for g, item in zip(graded, items)]
+    except Exception as e:
+        print(f"[grading] Batched grading failed ({e}), grading answers individually.")
+        # Sequential, so the fallback stays within the executor slot this batch holds
+        return [await _grade_one(single_chain, item) for item in items]
 
 async def grade_quiz_submission(request: QuizGradingRequest) -> QuizGradingResponse:
-    graded_questions, total_score = [], 0
+    """
+    Grades MCQs locally and all SAQs/LAQs concurrently through the rate-limited
+    grading executor. Results keep the order of the submitted questions.
+
+    Answers are keyed by their normalized (type, question, ideal answer,
+    answer), so an answer graded recently, or being graded for another
+    submission right now, isn't sent to the model again, and neither is a
+    repeat within this submission. Batched grading only shares finished grades.
+    """
     parser = JsonOutputParser(pydantic_object=GradedQuestion)
     prompt = PromptTemplate(
         template="""Grade the student's answer based on the ideal answer. Provide a score and brief explanation.
@@ -94,22 +357,85 @@ STUDENT'S ANSWER: {user_answer}""",
         input_variables=["question", "ideal_answer", "user_answer"],
         partial_variables={"format_instructions": parser.get_format_instructions()}
     )
-    chain = prompt | llm | parser
-    for item in request.questions_to_grade:
+    chain = prompt | get_llm(QUIZ_TEMPERATURE) | parser
+
+    items = request.questions_to_grade
+    graded_questions: List[GradedQuestion | None] = [None] * len(items)
+    keys: Dict[int, str] = {}
+    # First index of each distinct answer -> every index with that answer
+    copies: Dict[int, List[int]] = {}
+    first_by_key: Dict[str, int] = {}
+    free_text = []
+    for i, item in enumerate(items):
         if item.question_type == 'mcq':
-            score = 1 if item.user_answer.strip().lower() == item.ideal_answer.strip().lower() else 0
-            explanation = "Correct!" if score == 1 else f"Incorrect. The correct answer is: {item.ideal_answer}"
-            graded_questions.append(GradedQuestion(question=item.question, score=score, explanation=explanation))
-            total_score += score
+            graded_questions[i] = _grade_mcq(item)
+            continue
+        key = keys[i] = _grading_key(item)
+        cached = llm_result_cache.get(key) if llm_result_cache.enabled else None
+        if cached is not None:
+            llm_result_cache.record_hit("grade")
+            graded_questions[i] = cached.model_copy(update={"question": item.question})
+        elif llm_result_cache.enabled and key in first_by_key:
+            llm_result_cache.record_hit("grade", coalesced=True)
+            copies[first_by_key[key]].append(i)
+        else:
+            first_by_key[key] = i
+            copies[i] = [i]
+            free_text.append(i)
+
+    started = time.perf_counter()
+    if GRADING_BATCH_SIZE > 1:
+        batch_parser = JsonOutputParser(pydantic_object=GradedBatch)
+        batch_prompt = PromptTemplate(
+            template="""Grade each of the {count} student answers below based on its ideal answer.
+Give each a score and brief explanation. Max score SAQ=3, LAQ=5.
+Return the grades in the same order as the answers.
+{format_instructions}
+{answers}""",
+            input_variables=["count", "answers"],
+            partial_variables={"format_instructions": batch_parser.get_format_instructions()}
+        )
+        batch_chain = batch_prompt | get_llm(QUIZ_TEMPERATURE) | batch_parser
+        groups = [free_text[n:n + GRADING_BATCH_SIZE] for n in range(0, len(free_text), GRADING_BATCH_SIZE)]
+    else:
+        groups = [[i] for i in free_text]
+
+    async def grade_group(group: List[int]) -> List[GradedQuestion]:
+        group_started = time.perf_counter()
+        if len(group) == 1:
+            results = [await _grade_one(chain, items[group[0]])]
         else:
-            try:
-                res=await chain.ainvoke({
-                    "question": item.question, "ideal_answer": item.ideal_answer,
-                    "user_answer": item.user_answer
-                })
-                graded_questions.append(GradedQuestion(**res))
-                total_score += res.get('score', 0)
-            except Exception as e:
-                graded_questions.append(GradedQuestion(question=item.question, score=0,
-                    explanation=f"AI error during grading: {e}"))
-    return QuizGradingResponse(graded_questions=graded_questions, total_score=total_score)
\ No newline at end of file
+            results = await _grade_batch(batch_chain, chain, [items[i] for i in group])
+        elapsed = time.perf_counter() - group_started
+        LLM_SECONDS.observe(elapsed, operation="grade")
+        for i, result in zip(group, results):
+            GRADING_SECONDS.observe(elapsed)
+            print(f"[grading] Question {i + 1} ({items[i].question_type}) graded in {elapsed:.2f}s")
+        return results
+
+    async def grade_single(i: int) -> GradedQuestion:
+        results = await grading_executor.run(grade_group, [i])
+        return results[0]
+
+    async def run_group(group: List[int]):
+        if len(group) == 1:
+            # Outside the executor, so waiting on another submission's identical call holds no slot
+            results = [await llm_result_cache.get_or_compute(
+                "grade", keys[group[0]], lambda: grade_single(group[0]), cacheable=_is_grade,
+            )]
+        else:
+            results = await grading_executor.run(grade_group, group)
+            llm_result_cache.record_computed()
+            for i, result in zip(group, results):
+                if llm_result_cache.enabled and _is_grade(result):
+                    llm_result_cache.put(keys[i], result)
+        for i, result in zip(group, results):
+            for j in copies[i]:
+                graded_questions[j] = result.model_copy(update={"question": items[j].question})
+
+    await asyncio.gather(*(run_group(group) for group in groups))
+    if free_text:
+        print(f"[grading] Graded {len(free_text)} free-text answers in {time.perf_counter() - started:.2f}s")
+
+    total_score = sum(g.score for g in graded_questions)
+    return QuizGradingResponse(graded_questions=graded_questions, total_score=total_score)
@@ -1,23 +1,22 @@
-import os
-from typing import List, AsyncGenerator
-from langchain_community.vectorstores import FAISS
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_community.embeddings import OllamaEmbeddings
+import time
+import asyncio
+from typing import AsyncGenerator, Dict, List, Tuple
 from langchain.prompts import PromptTemplate
-from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.documents import Document
-import google.generativeai as genai
 
-if "GOOGLE_API_KEY" not in os.environ:
-    raise ValueError("GOOGLE_API_KEY environment variable not set.")
-genai.configure(api_key=os.environ["GOOGLE_API_KEY"])
+from ..core.clients import get_embeddings, get_llm
+from ..core import vector_backend
+from ..core.context_builder import (
+    ContextChunk, candidates_per_pdf, chat_budget, format_context, log_prompt, select_chunks,
+)
+from ..core.semantic_cache import SEMANTIC_CACHE_ENABLED, response_cache
+from ..core.metrics import (
+    CHAT_STREAM_SECONDS, CHAT_TTFT_SECONDS, EMBEDDING_SECONDS, LLM_SECONDS, RETRIEVAL_SECONDS,
+    record_span, timed,
+)
 
-VECTOR_STORE_DIR = "vector_store"
-
-# CORRECTED MODEL NAME
-llm = ChatGoogleGenerativeAI(model="models/gemini-pro-latest", temperature=0.3)
-embeddings = OllamaEmbeddings(model="nomic-embed-text")
+# Temperature of the chat model; the client itself is created on first use
+CHAT_TEMPERATURE = 0.3
 
 prompt_template = """
 You are a helpful study assistant. Answer the user's question based exclusively on the provided context.
@@ -30,33 +29,65 @@ ANSWER:
 """
 prompt = PromptTemplate(template=prompt_template, input_variables=["context", "question"])
 
-def format_docs(docs: List[Document]) -> str:
-    return "\n\n".join(
-        f"Content from page {doc.metadata.get('page', 'N/A')}:\n{doc.page_content}"
-        for doc in docs
-    )
+# Cached answers are replayed through the stream in pieces of this many characters
+REPLAY_CHUNK_CHARS = 256
+
+def build_chat_context(pdf_ids: List[str], query_embedding: List[float], query: str) -> Tuple[List[ContextChunk], int]:
+    """Retrieves candidates from every PDF and fills the chat token budget with them."""
+    num_pdfs = len(set(pdf_ids))
+    budget = chat_budget(num_pdfs)
+    hits = vector_backend.search_chunks(pdf_ids, query_embedding, candidates_per_pdf(budget, num_pdfs), query)
+    # PDFs take turns in order of their best hit, each offering its chunks best first
+    candidates: Dict[str, List[ContextChunk]] = {}
+    for hit in sorted(hits, key=lambda hit: hit.score):
+        candidates.setdefault(hit.pdf_id, []).append(
+            ContextChunk(hit.document.metadata.get("page", "N/A"), hit.document.page_content, hit.vector)
+        )
+    return select_chunks(candidates, budget), budget
 
-async def generate_rag_response(query: str, pdf_ids: List[str]) -> AsyncGenerator[str, None]:
+async def generate_rag_response(query: str, pdf_ids: List[str], bypass_cache: bool = False) -> AsyncGenerator[str, None]:
     if not pdf_ids:
         raise ValueError("No PDF IDs provided for context.")
-    merged_store = None
-    for i, pdf_id in enumerate(pdf_ids):
-        vector_store_path = os.path.join(VECTOR_STORE_DIR, f"{pdf_id}.faiss")
-        if not os.path.exists(vector_store_path):
-            raise FileNotFoundError(f"Vector store not found for PDF ID: {pdf_id}.")
-        store = FAISS.load_local(vector_store_path, embeddings, allow_dangerous_deserialization=True)
-        if i == 0:
-            merged_store = store
-        else:
-            merged_store.merge_from(store)
-    if not merged_store:
-        raise ValueError("Failed to load any vector stores.")
-    retriever = merged_store.as_retriever(search_kwargs={"k": 4})
-    rag_chain = (
-        {"context": retriever, "question": RunnablePassthrough()}
-        | prompt
-        | llm
-        | StrOutputParser()
-    )
-    async for chunk in rag_chain.astream(query):
-        yield chunk
\ No newline at end of file
+    request_started = time.perf_counter()
+    vector_backend.check_available(pdf_ids)
+    # The query is embedded once and used for both the answer cache and retrieval
+    embeddings = get_embeddings()
+    with timed(EMBEDDING_SECONDS, span="embed_query", kind="query"):
+        query_embedding = await embeddings.aembed_query(query)
+
+    use_cache = SEMANTIC_CACHE_ENABLED and not bypass_cache
+    if use_cache:
+        cached_answer = response_cache.lookup(pdf_ids, query_embedding)
+        if cached_answer is not None:
+            print(f"Semantic cache hit for PDFs {sorted(pdf_ids)} ({response_cache.stats()})")
+            for i in range(0, len(cached_answer), REPLAY_CHUNK_CHARS):
+                yield cached_answer[i:i + REPLAY_CHUNK_CHARS]
+            return
+    elif SEMANTIC_CACHE_ENABLED:
+        response_cache.record_bypass()
+
+    # Per-PDF stores or the shared index, depending on VECTOR_BACKEND, fused with BM25 hits
+    with timed(RETRIEVAL_SECONDS, span="retrieval"):
+        chunks, budget = await asyncio.to_thread(build_chat_context, pdf_ids, query_embedding, query)
+    context = format_context(chunks)
+    log_prompt("chat", prompt.format(context=context, question=query), chunks, len(set(pdf_ids)), budget)
+
+    answer_parts = []
+    rag_chain = prompt | get_llm(CHAT_TEMPERATURE) | StrOutputParser()
+    llm_started = time.perf_counter()
+    first_token_at = None
+    async for chunk in rag_chain.astream({"context": context, "question": query}):
+        if first_token_at is None:
+            first_token_at = time.perf_counter()
+            CHAT_TTFT_SECONDS.observe(first_token_at - request_started)
+            record_span("time_to_first_token", first_token_at - request_started)
+        answer_parts.append(chunk)
+        yield chunk
+    finished = time.perf_counter()
+    LLM_SECONDS.observe(finished - llm_started, operation="chat")
+    record_span("llm_chat", finished - llm_started)
+    if first_token_at is not None:
+        CHAT_STREAM_SECONDS.observe(finished - first_token_at)
+    # Only answers that streamed to completion are cached
+    if use_cache:
+        response_cache.store(pdf_ids, query_embedding, "".join(answer_parts))
@@ -1,23 +1,63 @@
 import os
-from typing import List, Dict
-from langchain_google_genai import ChatGoogleGenerativeAI
+import json
+import asyncio
+from typing import List, Dict, Optional
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.prompts import PromptTemplate
 from pydantic import BaseModel, Field
 
 from .quiz_service import get_context_from_pdfs # Reuse the context function
+from ..core.clients import GEMINI_MODEL, get_llm
+from ..core.context_builder import TOPIC_CONTEXT_TOKENS, log_prompt
+from ..core.store_cache import get_store_path
+from ..core.llm_cache import cache_key, llm_result_cache, store_versions
+from ..core.metrics import LLM_SECONDS, timed
+from ..core.rate_limit import RateLimitedExecutor
 
-# --- Model Initialization ---
-llm = ChatGoogleGenerativeAI(model="models/gemini-pro-latest", temperature=0.5)
+# --- Model configuration ---
+# The shared client for this temperature is created on first use
+TOPIC_TEMPERATURE = 0.5
+
+# Maximum number of PDFs whose topics are generated at the same time
+TOPIC_CONCURRENCY = int(os.getenv("TOPIC_CONCURRENCY", "4"))
+# Shared by all requests, so concurrent requests together stay within TOPIC_CONCURRENCY; no rate limit
+topic_executor = RateLimitedExecutor(TOPIC_CONCURRENCY, 0, 1)
 
 # --- Pydantic model for structured output ---
 class TopicList(BaseModel):
     """A Pydantic model to structure the LLM's output."""
     topics: List[str] = Field(description="A list of exactly two YouTube search topics.")
 
+def _topics_path(pdf_id: str) -> str:
+    # Topics are kept inside the store directory, so they share its lifetime
+    return os.path.join(get_store_path(pdf_id), "topics.json")
+
+def load_cached_topics(pdf_id: str) -> Optional[List[str]]:
+    """Returns topics saved for this PDF, unless the store was rebuilt after they were saved."""
+    path = _topics_path(pdf_id)
+    index_path = os.path.join(get_store_path(pdf_id), "index.faiss")
+    try:
+        if os.path.getmtime(path) < os.path.getmtime(index_path):
+            return None
+        with open(path) as f:
+            return json.load(f)["topics"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+def save_cached_topics(pdf_id: str, topics: List[str]):
+    path = _topics_path(pdf_id)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"topics": topics}, f)
+    os.replace(tmp_path, path)
+
 async def generate_youtube_topics(pdf_ids: List[str]) -> Dict[str, List[str]]:
     """
     For each PDF, generates two relevant YouTube search topics using an LLM.
+    Topics saved for a PDF (e.g. during ingestion) are reused; the remaining
+    PDFs are processed concurrently, up to TOPIC_CONCURRENCY at a time
+    across all requests.
+    Requests for the same PDF that overlap share one LLM call.
     """
     print(f"Generating YouTube topics for PDFs: {pdf_ids}")
     
@@ -36,23 +76,41 @@ CONTEXT FROM DOCUMENT:
         partial_variables={"format_instructions": parser.get_format_instructions()}
     )
     
-    chain = prompt | llm | parser
-    
-    results: Dict[str, List[str]] = {}
+    chain = prompt | get_llm(TOPIC_TEMPERATURE) | parser
     
-    for pdf_id in pdf_ids:
-        try:
-            # Get a small amount of context from the specific PDF
-            context = get_context_from_pdfs([pdf_id])
-            
-            print(f"Invoking LLM for YouTube topics for PDF: {pdf_id}")
+    async def invoke(pdf_id: str) -> List[str]:
+        # Get a small amount of context from the specific PDF.
+        # Store loading is blocking, so it runs in a worker thread.
+        context, chunks = await asyncio.to_thread(get_context_from_pdfs, [pdf_id])
+        log_prompt("topics", prompt.format(context=context), chunks, 1, TOPIC_CONTEXT_TOKENS)
+
+        print(f"Invoking LLM for YouTube topics for PDF: {pdf_id}")
+        with timed(LLM_SECONDS, span="llm_topics", operation="topics"):
             response = await chain.ainvoke({"context": context})
-            
-            # The parser gives us a dict {'topics': ['topic1', 'topic2']}
-            results[pdf_id] = response.get('topics', [])
-            
+
+        # The parser gives us a dict {'topics': ['topic1', 'topic2']}
+        return response.get('topics', [])
+
+    async def generate_topics(pdf_id: str) -> List[str]:
+        cached = await asyncio.to_thread(load_cached_topics, pdf_id)
+        if cached is not None:
+            print(f"Using saved YouTube topics for PDF: {pdf_id}")
+            return cached
+        topics = await topic_executor.run(invoke, pdf_id)
+        if topics:
+            await asyncio.to_thread(save_cached_topics, pdf_id, topics)
+        return topics
+
+    async def topics_for(pdf_id: str) -> List[str]:
+        try:
+            # The store version is part of the key, so a re-ingested PDF gets new topics
+            key = cache_key("topics", {"model": GEMINI_MODEL, "temperature": TOPIC_TEMPERATURE},
+                            await asyncio.to_thread(store_versions, [pdf_id]))
+            return await llm_result_cache.get_or_compute("topics", key, lambda: generate_topics(pdf_id), cacheable=bool)
         except Exception as e:
             print(f"Error generating topics for PDF {pdf_id}: {e}")
-            results[pdf_id] = [] # Return empty list on error
-            
-    return results
\ No newline at end of file
+            return [] # Return empty list on error
+
+    unique_ids = list(dict.fromkeys(pdf_ids))
+    topic_lists = await asyncio.gather(*(topics_for(pdf_id) for pdf_id in unique_ids))
+    return dict(zip(unique_ids, topic_lists))
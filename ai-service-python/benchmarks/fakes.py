@@ -0,0 +1,142 @@
+"""
+Deterministic local stand-ins for Ollama embeddings and the Gemini chat model.
+Both simulate network latency so the service's own overhead and concurrency
+behaviour can be measured without live backends.
+"""
+import re
+import json
+import time
+import asyncio
+import hashlib
+from typing import Any, AsyncIterator, Callable, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Hash-seeded unit vectors: identical text always maps to the same vector.
+    Each call costs `call_latency` plus `per_text_latency` for every text.
+    """
+
+    def __init__(self, dim: int = 768, call_latency: float = 0.02, per_text_latency: float = 0.002):
+        self.dim = dim
+        self.call_latency = call_latency
+        self.per_text_latency = per_text_latency
+        self.calls = 0
+        self.texts_embedded = 0
+
+    def vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        v = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        return (v / np.linalg.norm(v)).tolist()
+
+    def _cost(self, n: int) -> float:
+        self.calls += 1
+        self.texts_embedded += n
+        return self.call_latency + self.per_text_latency * n
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self._cost(len(texts)))
+        return [self.vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self._cost(1))
+        return self.vector(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self._cost(len(texts)))
+        return [self.vector(t) for t in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await asyncio.sleep(self._cost(1))
+        return self.vector(text)
+
+
+def _count(pattern: str, prompt: str) -> int:
+    match = re.search(pattern, prompt)
+    return int(match.group(1)) if match else 0
+
+
+def benchmark_responder(prompt: str) -> str:
+    """Produces a plausible, parseable answer for each of the service's prompts."""
+    if "expert quiz creator" in prompt:
+        num_mcqs = _count(r"(\d+) MCQs", prompt)
+        num_saqs = _count(r"(\d+) SAQs", prompt)
+        num_laqs = _count(r"(\d+) LAQs", prompt)
+        return json.dumps({
+            "mcqs": [
+                {"question_type": "mcq", "question": f"MCQ {i}?", "options": ["A", "B", "C", "D"], "correct_answer": "A"}
+                for i in range(num_mcqs)
+            ],
+            "saqs": [
+                {"question_type": "saq", "question": f"SAQ {i}?", "ideal_answer": "A short ideal answer."}
+                for i in range(num_saqs)
+            ],
+            "laqs": [
+                {"question_type": "laq", "question": f"LAQ {i}?", "ideal_answer": "A longer ideal answer. " * 5}
+                for i in range(num_laqs)
+            ],
+        })
+    if "Grade each of the" in prompt:
+        count = _count(r"Grade each of the (\d+)", prompt)
+        return json.dumps({"graded_questions": [
+            {"question": f"Question {i}", "score": 2, "explanation": "Mostly correct."} for i in range(count)
+        ]})
+    if "Grade the student's answer" in prompt:
+        return json.dumps({"question": "Question", "score": 2, "explanation": "Mostly correct."})
+    if "YouTube" in prompt:
+        return json.dumps({"topics": ["benchmark topic one", "benchmark topic two"]})
+    return ("Based on the provided context, the answer is explained on page 3. " * 12).strip()
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model that answers via `responder` after `latency` seconds and then
+    emits whitespace-delimited tokens at `tokens_per_second`.
+    """
+
+    latency: float = 0.3
+    tokens_per_second: float = 80.0
+    responder: Callable[[str], str] = benchmark_responder
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-benchmark-chat"
+
+    def _tokens(self, messages: List[BaseMessage]) -> List[str]:
+        self.calls += 1
+        return re.findall(r"\S+\s*", self.responder(messages[-1].content))
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        tokens = self._tokens(messages)
+        time.sleep(self.latency + len(tokens) / self.tokens_per_second)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        tokens = self._tokens(messages)
+        await asyncio.sleep(self.latency + len(tokens) / self.tokens_per_second)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        tokens = self._tokens(messages)
+        time.sleep(self.latency)
+        for token in tokens:
+            time.sleep(1 / self.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        tokens = self._tokens(messages)
+        await asyncio.sleep(self.latency)
+        for token in tokens:
+            await asyncio.sleep(1 / self.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
@@ -0,0 +1,87 @@
+"""
+Synthetic PDFs and vector stores of configurable size for the benchmarks.
+"""
+import random
+from typing import List
+
+from langchain_community.vectorstores import FAISS
+
+from app.core.store_cache import get_store_path
+from app.core.sampling import build_summary_sample, save_summary_sample
+from app.core.store_format import NativeStore, save_native_store
+from benchmarks.fakes import FakeEmbeddings
+
+# Store sizes in chunks
+STORE_SIZES = {"small": 200, "medium": 2000, "large": 20000}
+
+_VOCABULARY = (
+    "algorithm analysis array binary cache compiler concurrency database entropy function graph hash "
+    "inference kernel latency matrix memory network optimisation parser probability protocol queue "
+    "recursion regression scheduler search semantics signal stack statistics theorem thread tree vector"
+).split()
+
+
+def synthetic_text(rng: random.Random, num_words: int) -> str:
+    # A per-text topic word makes chunks cluster a little, like real chapters do
+    topic = rng.choice(_VOCABULARY)
+    words = [topic if rng.random() < 0.1 else rng.choice(_VOCABULARY) for _ in range(num_words)]
+    return " ".join(words).capitalize() + "."
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(num_pages: int, words_per_page: int = 400, seed: int = 0) -> bytes:
+    """Builds a text PDF with `num_pages` pages of pseudo-random prose using only the standard library."""
+    rng = random.Random(seed)
+    objects: List[bytes] = []
+
+    def add(obj: str | bytes) -> int:
+        objects.append(obj.encode("latin-1") if isinstance(obj, str) else obj)
+        return len(objects)
+
+    catalog = add("")  # filled in once the page tree exists
+    pages = add("")
+    font = add("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    page_ids = []
+    for _ in range(num_pages):
+        words = synthetic_text(rng, words_per_page).split()
+        lines = [" ".join(words[i:i + 12]) for i in range(0, len(words), 12)]
+        body = "BT /F1 10 Tf 12 TL 50 780 Td " + " ".join(f"({_escape(line)}) '" for line in lines) + " ET"
+        stream = f"<< /Length {len(body)} >>\nstream\n{body}\nendstream"
+        content = add(stream)
+        page_ids.append(add(
+            f"<< /Type /Page /Parent {pages} 0 R /MediaBox [0 0 612 842] "
+            f"/Resources << /Font << /F1 {font} 0 R >> >> /Contents {content} 0 R >>"
+        ))
+    kids = " ".join(f"{i} 0 R" for i in page_ids)
+    objects[pages - 1] = f"<< /Type /Pages /Kids [{kids}] /Count {num_pages} >>".encode("latin-1")
+    objects[catalog - 1] = f"<< /Type /Catalog /Pages {pages} 0 R >>".encode("latin-1")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode("latin-1") + obj + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root {catalog} 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return bytes(out)
+
+
+def build_store(pdf_id: str, num_chunks: int, seed: int = 0) -> str:
+    """Writes a store of `num_chunks` synthetic chunks for `pdf_id`, as ingestion would."""
+    rng = random.Random(f"{pdf_id}:{seed}")
+    texts = [synthetic_text(rng, 150) for _ in range(num_chunks)]
+    metadatas = [{"source": f"benchmark://{pdf_id}", "page": i // 3} for i in range(num_chunks)]
+    # Vectors come straight from the fake model, so building stores costs no simulated latency
+    embeddings = FakeEmbeddings()
+    vectors = [embeddings.vector(text) for text in texts]
+    store = FAISS.from_embeddings(list(zip(texts, vectors)), embeddings, metadatas=metadatas)
+    store_path = get_store_path(pdf_id)
+    save_native_store(store, store_path)
+    save_summary_sample(store_path, build_summary_sample(NativeStore(store_path)))
+    return store_path
@@ -0,0 +1,499 @@
+"""
+Offline benchmark suite for the AI service.
+
+Runs the ingestion, chat, quiz generation, grading and topic scenarios
+against deterministic local stand-ins for Ollama and Gemini, and reports
+latency percentiles, throughput and peak RSS. Results are written as JSON
+so runs from different commits can be compared:
+
+    python -m benchmarks.run --output before.json
+    python -m benchmarks.run --output after.json --compare before.json
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import shutil
+import asyncio
+import argparse
+import resource
+import socket
+import tempfile
+import platform
+import threading
+import subprocess
+import urllib.request
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+SERVICE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(SERVICE_ROOT, "benchmarks", "results")
+
+ALL_SCENARIOS = ["ingest", "chat", "chat-cached", "quiz", "grade", "topics", "workers"]
+# "workers" starts real server processes, so it only runs when asked for
+DEFAULT_SCENARIOS = [s for s in ALL_SCENARIOS if s != "workers"]
+
+
+# --- Local HTTP server standing in for the PDF host, the Node backend and Ollama ---
+
+class _FixtureServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, embed_latency: float, embed_per_text_latency: float):
+        super().__init__(("127.0.0.1", 0), _FixtureHandler)
+        self.pdfs: Dict[str, bytes] = {}
+        self.callbacks = 0
+        self.embed_latency = embed_latency
+        self.embed_per_text_latency = embed_per_text_latency
+        self.embed_requests = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = self.server.pdfs.get(self.path.rsplit("/", 1)[-1])
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path in ("/api/embed", "/api/embeddings"):
+            response = self._embed(json.loads(body))
+        else:
+            self.server.callbacks += 1
+            response = b"{}"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def _embed(self, request: Dict[str, Any]) -> bytes:
+        # Same cost model and vectors as FakeEmbeddings, behind Ollama's two embedding APIs
+        from benchmarks.fakes import FakeEmbeddings
+        self.server.embed_requests += 1
+        texts = request["input"] if self.path == "/api/embed" else [request["prompt"]]
+        time.sleep(self.server.embed_latency + self.server.embed_per_text_latency * len(texts))
+        vectors = [FakeEmbeddings().vector(text) for text in texts]
+        if self.path == "/api/embed":
+            return json.dumps({"embeddings": vectors}).encode()
+        return json.dumps({"embedding": vectors[0]}).encode()
+
+    def log_message(self, format, *args):
+        pass
+
+
+# --- Measurement helpers ---
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered) if ordered else 0.0,
+        "p50": percentile(ordered, 50),
+        "p95": percentile(ordered, 95),
+        "p99": percentile(ordered, 99),
+        "max": ordered[-1] if ordered else 0.0,
+    }
+
+
+def peak_rss_mb() -> Dict[str, float]:
+    # ru_maxrss is in KiB on Linux; children covers the PDF extraction worker processes
+    to_mb = 1 / 1024 if sys.platform != "darwin" else 1 / (1024 * 1024)
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * to_mb,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * to_mb,
+    }
+
+
+def process_tree_memory_mb(pid: int) -> Optional[Dict[str, float]]:
+    """
+    Sums RSS and PSS over a process and its descendants (Linux only). PSS
+    splits shared pages between the processes mapping them, so it shows
+    what memory-mapped stores save when several workers serve them.
+    """
+    pids, totals = [pid], {"rss": 0.0, "pss": 0.0}
+    try:
+        while pids:
+            current = pids.pop()
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pids.extend(int(child) for child in f.read().split())
+            with open(f"/proc/{current}/smaps_rollup") as f:
+                for line in f:
+                    key, _, value = line.partition(":")
+                    if key in ("Rss", "Pss"):
+                        totals[key.lower()] += int(value.split()[0]) / 1024
+    except OSError:
+        return None
+    return totals
+
+
+@contextmanager
+def served_app(workers: int, args) -> Iterator[Tuple[subprocess.Popen, str]]:
+    """
+    Serves benchmarks.server:app with `workers` uvicorn processes until the
+    block exits. Yields the server process and its base URL.
+    """
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    env = dict(
+        os.environ, PYTHONPATH=SERVICE_ROOT, SERVICE_ROLE="api",
+        BENCH_LLM_LATENCY=str(args.llm_latency), BENCH_LLM_TOKENS_PER_SECOND=str(args.llm_tokens_per_second),
+    )
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.server:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError(f"Benchmark server exited with code {proc.returncode}")
+            try:
+                urllib.request.urlopen(f"{url}/", timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError("Benchmark server did not start within 60s")
+                time.sleep(0.2)
+        yield proc, url
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+async def run_scenario(
+    name: str,
+    op: Callable[[int], Awaitable[Optional[Dict[str, float]]]],
+    iterations: int,
+    concurrency: int,
+    warmup: int = 1,
+) -> Dict[str, Any]:
+    """Runs `op` `iterations` times with `concurrency` callers in flight and summarizes the timings."""
+    for i in range(warmup):
+        await op(-1 - i)
+
+    latencies: List[float] = []
+    extras: Dict[str, List[float]] = {}
+    next_index = iter(range(iterations))
+
+    async def worker():
+        for i in next_index:
+            started = time.perf_counter()
+            extra = await op(i)
+            latencies.append(time.perf_counter() - started)
+            for key, value in (extra or {}).items():
+                extras.setdefault(key, []).append(value)
+
+    wall_started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - wall_started
+
+    result = {
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "latency_s": summarize(latencies),
+        "throughput_per_s": iterations / wall if wall > 0 else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    for key, values in extras.items():
+        result[f"{key}_s"] = summarize(values)
+    lat = result["latency_s"]
+    print(
+        f"{name:<16} p50={lat['p50'] * 1000:8.1f}ms p95={lat['p95'] * 1000:8.1f}ms "
+        f"p99={lat['p99'] * 1000:8.1f}ms  {result['throughput_per_s']:7.2f}/s  "
+        f"rss={result['peak_rss_mb']['self']:.0f}MB"
+    )
+    return result
+
+
+# --- Scenarios ---
+
+async def run_benchmarks(args, server: _FixtureServer) -> Dict[str, Any]:
+    # App modules are imported only after the working directory and environment are set up
+    from app.core import clients
+    from app.schemas.quiz_schemas import QuestionToGrade, QuizGenerationRequest, QuizGradingRequest
+    from app.services.pdf_processor import ingest_pdf
+    from app.services.quiz_service import generate_quiz_from_pdfs, grade_quiz_submission
+    from app.services.rag_service import generate_rag_response
+    from app.services.youtube_service import generate_youtube_topics
+    from benchmarks.fakes import FakeChatModel, FakeEmbeddings
+    from benchmarks.fixtures import STORE_SIZES, build_store, make_pdf
+
+    if args.embeddings == "inprocess":
+        clients.set_embeddings(FakeEmbeddings(
+            call_latency=args.embed_latency, per_text_latency=args.embed_per_text_latency
+        ))
+    # Otherwise the real embedding client talks to the fixture server's Ollama endpoints
+    fake_llm = FakeChatModel(latency=args.llm_latency, tokens_per_second=args.llm_tokens_per_second)
+    for temperature in (0.3, 0.5):
+        clients.set_llm(temperature, fake_llm)
+
+    scenarios = args.scenarios
+    results: Dict[str, Any] = {}
+    max_pdfs = max(args.chat_pdf_counts) if any(s.startswith("chat") or s == "workers" for s in scenarios) else 0
+    num_stores = max(max_pdfs, 5)
+    if scenarios != ["ingest"]:
+        print(f"Building {num_stores} '{args.store_size}' stores ({STORE_SIZES[args.store_size]} chunks each)...")
+        for n in range(num_stores):
+            await asyncio.to_thread(build_store, f"bench-{n}", STORE_SIZES[args.store_size])
+    store_ids = [f"bench-{n}" for n in range(num_stores)]
+
+    if "ingest" in scenarios:
+        for pages in args.pdf_pages:
+            async def ingest(i: int, pages=pages):
+                name = f"ingest-{pages}-{i}"
+                # A different seed per run keeps the embedding cache from hiding embedding cost
+                server.pdfs[name] = make_pdf(pages, seed=zlib.crc32(name.encode()))
+                result = await ingest_pdf(name, f"{server.url}/pdf/{name}")
+                return {f"stage_{stage}": seconds for stage, seconds in result["timings"].items()}
+            results[f"ingest-{pages}p"] = await run_scenario(
+                f"ingest-{pages}p", ingest, args.ingest_iterations, args.ingest_concurrency
+            )
+        embedding_client = clients.get_embeddings()
+        if hasattr(embedding_client, "stats"):
+            stats = embedding_client.stats()
+            results["embedding-client"] = stats
+            print(
+                f"{'embedding':<16} {stats['texts_per_second']:.1f} chunks/s, "
+                f"batch size {stats['batch_size']}, {stats['requests']} requests"
+            )
+
+    async def chat(pdf_ids: List[str], query: str, bypass_cache: bool):
+        started = time.perf_counter()
+        first_token = None
+        async for _ in generate_rag_response(query, pdf_ids, bypass_cache):
+            if first_token is None:
+                first_token = time.perf_counter() - started
+        return {"ttft": first_token or 0.0}
+
+    if "chat" in scenarios:
+        for count in args.chat_pdf_counts:
+            ids = store_ids[:count]
+            results[f"chat-{count}pdfs"] = await run_scenario(
+                f"chat-{count}pdfs",
+                lambda i, ids=ids: chat(ids, f"What does chapter {i} say about latency?", True),
+                args.iterations, args.concurrency,
+            )
+
+    if "chat-cached" in scenarios:
+        ids = store_ids[:min(5, len(store_ids))]
+        results["chat-cached"] = await run_scenario(
+            "chat-cached", lambda i: chat(ids, "What does the document say about latency?", False),
+            args.iterations, args.concurrency,
+        )
+
+    if "quiz" in scenarios:
+        request = QuizGenerationRequest(pdfIds=store_ids[:3], numMCQs=5, numSAQs=3, numLAQs=2)
+
+        async def quiz(i: int):
+            await generate_quiz_from_pdfs(request)
+        results["quiz"] = await run_scenario("quiz", quiz, args.iterations, args.concurrency)
+
+    if "grade" in scenarios:
+        questions = (
+            [QuestionToGrade(question=f"MCQ {n}", user_answer="A", ideal_answer="A", question_type="mcq") for n in range(4)]
+            + [QuestionToGrade(question=f"SAQ {n}", user_answer="An answer.", ideal_answer="The answer.", question_type="saq") for n in range(4)]
+            + [QuestionToGrade(question=f"LAQ {n}", user_answer="A long answer.", ideal_answer="The long answer.", question_type="laq") for n in range(2)]
+        )
+
+        async def grade(i: int):
+            # Vary the answers so repeated runs are not served from any result cache
+            request = QuizGradingRequest(questions_to_grade=[
+                q.model_copy(update={"user_answer": f"{q.user_answer} ({i})"}) if q.question_type != "mcq" else q
+                for q in questions
+            ])
+            await grade_quiz_submission(request)
+        results["grade"] = await run_scenario("grade", grade, args.iterations, args.concurrency)
+
+    if "topics" in scenarios:
+        async def topics(i: int):
+            # Drop the topics saved next to each store; with the result cache off, every run generates them
+            for pdf_id in store_ids[:5]:
+                path = os.path.join("vector_store", f"{pdf_id}.faiss", "topics.json")
+                if os.path.exists(path):
+                    os.remove(path)
+            await generate_youtube_topics(store_ids[:5])
+        results["topics"] = await run_scenario("topics", topics, args.iterations, 1)
+
+    if "workers" in scenarios:
+        import httpx
+
+        ids = store_ids[:max(args.chat_pdf_counts)]
+        baseline_throughput = None
+        for workers in args.worker_counts:
+            with served_app(workers, args) as (proc, url):
+                async with httpx.AsyncClient(base_url=url, timeout=120) as http:
+                    async def chat_http(i: int):
+                        body = {"query": f"What does chapter {i} say about latency?", "pdfIds": ids, "bypassCache": True}
+                        started = time.perf_counter()
+                        first_token = None
+                        async with http.stream("POST", "/api/v1/chat", json=body) as response:
+                            response.raise_for_status()
+                            async for _ in response.aiter_bytes():
+                                if first_token is None:
+                                    first_token = time.perf_counter() - started
+                        return {"ttft": first_token or 0.0}
+                    result = await run_scenario(
+                        f"workers-{workers}", chat_http, args.iterations, args.worker_concurrency, warmup=workers
+                    )
+                # Measured while the workers still hold their stores
+                result["server_memory_mb"] = process_tree_memory_mb(proc.pid)
+            result["workers"] = workers
+            baseline_throughput = baseline_throughput or result["throughput_per_s"]
+            result["speedup"] = result["throughput_per_s"] / baseline_throughput if baseline_throughput else 0.0
+            memory = result["server_memory_mb"]
+            print(
+                f"{'':<16} {result['speedup']:.2f}x throughput vs {args.worker_counts[0]} worker(s)"
+                + (f", server rss={memory['rss']:.0f}MB pss={memory['pss']:.0f}MB" if memory else "")
+            )
+            results[f"workers-{workers}"] = result
+
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SERVICE_ROOT, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict[str, Any], baseline_path: str) -> None:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nComparison with {baseline_path} (commit {baseline['meta'].get('commit')}):")
+    for name, current in results["scenarios"].items():
+        previous = baseline["scenarios"].get(name)
+        if previous is None or "latency_s" not in current:
+            continue
+        cells = []
+        for q in ("p50", "p95", "p99"):
+            old, new = previous["latency_s"][q], current["latency_s"][q]
+            change = (new - old) / old * 100 if old else 0.0
+            cells.append(f"{q} {old * 1000:.1f}->{new * 1000:.1f}ms ({change:+.1f}%)")
+        print(f"  {name:<16} " + "  ".join(cells))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(DEFAULT_SCENARIOS),
+                        help=f"Comma-separated subset of: {', '.join(ALL_SCENARIOS)}")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--store-size", choices=["small", "medium", "large"], default="medium")
+    parser.add_argument("--chat-pdf-counts", default="1,5,10,20")
+    parser.add_argument("--pdf-pages", default="20,200")
+    parser.add_argument("--ingest-iterations", type=int, default=3)
+    parser.add_argument("--ingest-concurrency", type=int, default=1)
+    parser.add_argument("--embeddings", choices=["http", "inprocess"], default="http",
+                        help="Use the real embedding client against a fake Ollama server, or an in-process fake")
+    parser.add_argument("--embed-latency", type=float, default=0.02, help="Seconds per embedding call")
+    parser.add_argument("--embed-per-text-latency", type=float, default=0.002, help="Extra seconds per embedded text")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Seconds before the first LLM token")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--worker-counts", default="1,2,4",
+                        help="API worker processes to compare in the workers scenario")
+    parser.add_argument("--worker-concurrency", type=int, default=16,
+                        help="Concurrent chat requests sent to the served app in the workers scenario")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<timestamp>-<commit>.json)")
+    parser.add_argument("--compare", help="Earlier result file to compare against")
+    parser.add_argument("--keep-workspace", action="store_true", help="Keep the temporary stores for inspection")
+    args = parser.parse_args(argv)
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(args.scenarios) - set(ALL_SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    args.chat_pdf_counts = [int(n) for n in args.chat_pdf_counts.split(",")]
+    args.pdf_pages = [int(n) for n in args.pdf_pages.split(",")]
+    args.worker_counts = [int(n) for n in args.worker_counts.split(",")]
+    return args
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    commit = git_commit()
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{commit or 'unknown'}.json"
+    )
+    output = os.path.abspath(output)
+    baseline = os.path.abspath(args.compare) if args.compare else None
+
+    server = _FixtureServer(args.embed_latency, args.embed_per_text_latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # Stores, queue and caches are written relative to the working directory, so isolate them
+    workspace = tempfile.mkdtemp(prefix="revisify-bench-")
+    os.environ["NODE_BACKEND_URL"] = server.url
+    os.environ["OLLAMA_HOST"] = server.url
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+    os.environ.setdefault("REQUEST_TIMING_LOGS", "false")
+    # Iterations repeat identical quiz and topic requests; results shared between them would
+    # measure the cache instead of generation, and hide regressions in the comparison
+    os.environ["LLM_RESULT_CACHE_ENABLED"] = "false"
+    # Opt-in in the service; the chat-cached scenario measures its hits (chat bypasses it)
+    os.environ.setdefault("SEMANTIC_CACHE_ENABLED", "true")
+    sys.path.insert(0, SERVICE_ROOT)
+    os.chdir(workspace)
+
+    started = time.perf_counter()
+    try:
+        scenarios = asyncio.run(run_benchmarks(args, server))
+    finally:
+        server.shutdown()
+        os.chdir(SERVICE_ROOT)
+        if not args.keep_workspace:
+            shutil.rmtree(workspace, ignore_errors=True)
+        else:
+            print(f"Workspace kept at {workspace}")
+
+    results = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "duration_s": time.perf_counter() - started,
+            "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        },
+        "scenarios": scenarios,
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+    if baseline:
+        compare(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""
+The service app with the fake Gemini model installed, for the `workers`
+scenario, which serves it from several processes:
+
+    uvicorn benchmarks.server:app --workers N
+
+Embeddings go to OLLAMA_HOST, which the benchmark points at its fixture
+server; the fake model's timing comes from BENCH_LLM_LATENCY and
+BENCH_LLM_TOKENS_PER_SECOND.
+"""
+import os
+
+from app.core import clients
+from benchmarks.fakes import FakeChatModel
+from main import app
+
+_fake_llm = FakeChatModel(
+    latency=float(os.getenv("BENCH_LLM_LATENCY", "0.3")),
+    tokens_per_second=float(os.getenv("BENCH_LLM_TOKENS_PER_SECOND", "80")),
+)
+for _temperature in (0.3, 0.5):
+    clients.set_llm(_temperature, _fake_llm)
+
+__all__ = ["app"]
@@ -0,0 +1,52 @@
+"""
+Runs the PDF ingestion queue in a process of its own.
+
+    python ingest_worker.py
+
+API workers started with SERVICE_ROLE=api only queue PDFs; this process
+claims and ingests them (INGEST_WORKERS at a time) and sends the status
+callbacks, so PDF extraction and FAISS writes never share an event loop
+with chat streams. serve.py starts it alongside the API workers.
+"""
+import sys
+import signal
+import asyncio
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.core import clients
+from app.core.backend_callbacks import callback_dispatcher
+from app.core.job_queue import ingestion_queue
+from app.services.pdf_processor import ingest_pdf, notify_failed
+
+
+async def run() -> None:
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+
+    # Jobs left running by a previous worker are resumed
+    ingestion_queue.start(ingest_pdf, notify_failed)
+    callback_dispatcher.start()
+    await stopping.wait()
+
+    print("Stopping ingestion worker...")
+    await ingestion_queue.stop()
+    await callback_dispatcher.stop()
+    await clients.aclose()
+
+
+def main() -> int:
+    if not ingestion_queue.acquire_ownership():
+        print("Another process is already running the ingestion queue (e.g. an API worker with SERVICE_ROLE=all).",
+              file=sys.stderr)
+        return 1
+    asyncio.run(run())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
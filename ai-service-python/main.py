@@ -1,3 +1,5 @@
+import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from dotenv import load_dotenv
 import os
@@ -5,16 +7,62 @@ import os
 # Load environment variables at the very beginning
 load_dotenv()
 
-# Import routers after loading env vars
-from app.api import pdf_api, chat_api, quiz_api, youtube_api # Import the new youtube_api
+# Import routers after loading env vars; timed for the startup breakdown
+_import_started = time.perf_counter()
+from app.api import pdf_api, chat_api, quiz_api, youtube_api, metrics_api
+from app.core import clients
+from app.core.metrics import METRICS_ENABLED, RequestTimingMiddleware
+from app.core.job_queue import ingestion_queue
+from app.core.backend_callbacks import callback_dispatcher
+from app.services.pdf_processor import ingest_pdf, notify_failed
+IMPORT_SECONDS = time.perf_counter() - _import_started
 
-app = FastAPI(title="AI Microservice for Study App")
+# Create the model clients during startup instead of on the first request
+WARM_UP_ON_STARTUP = os.getenv("WARM_UP_ON_STARTUP", "false").lower() == "true"
+# "all" also runs the ingestion workers in this process; "api" only serves requests and
+# leaves queued PDFs to ingest_worker.py, which is how serve.py runs several API workers
+SERVICE_ROLE = os.getenv("SERVICE_ROLE", "all").lower()
+if SERVICE_ROLE not in ("all", "api"):
+    raise ValueError(f"Unknown SERVICE_ROLE: {SERVICE_ROLE}. Use 'all' or 'api'.")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup = {"import": IMPORT_SECONDS}
+    if WARM_UP_ON_STARTUP:
+        started = time.perf_counter()
+        for step, seconds in clients.warm_up().items():
+            startup[f"warm_up:{step}"] = seconds
+        startup["warm_up"] = time.perf_counter() - started
+
+    # With `uvicorn --workers N` every worker starts in the "all" role; only the first to take
+    # the queue's owner lock runs ingestion, the others serve requests as in the "api" role
+    if SERVICE_ROLE == "all" and not ingestion_queue.acquire_ownership():
+        print("[ingest] Another process runs the ingestion queue; this worker only serves requests.")
+    elif SERVICE_ROLE == "all":
+        # Start the ingestion workers; jobs left over from a previous run are resumed
+        started = time.perf_counter()
+        ingestion_queue.start(ingest_pdf, notify_failed)
+        startup["ingestion_queue"] = time.perf_counter() - started
+        # Status updates the backend never received are retried from the outbox
+        callback_dispatcher.start()
+
+    print("Startup breakdown: " + ", ".join(f"{step}={seconds:.3f}s" for step, seconds in startup.items()))
+    yield
+    await ingestion_queue.stop()
+    await callback_dispatcher.stop()
+    await clients.aclose()
+
+app = FastAPI(title="AI Microservice for Study App", lifespan=lifespan)
+if METRICS_ENABLED:
+    app.add_middleware(RequestTimingMiddleware)
 
 # Include the API routers
 app.include_router(pdf_api.router, prefix="/api/v1", tags=["PDF Processing"])
 app.include_router(chat_api.router, prefix="/api/v1", tags=["Chat & RAG"])
 app.include_router(quiz_api.router, prefix="/api/v1", tags=["Quiz Generation & Grading"])
+app.include_router(youtube_api.router, prefix="/api/v1", tags=["YouTube Topics"])
+app.include_router(metrics_api.router, tags=["Metrics"])
 
 @app.get("/", tags=["Root"])
 def read_root():
-    return {"message": "AI service is running."}
\ No newline at end of file
+    return {"message": "AI service is running."}
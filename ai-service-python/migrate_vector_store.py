@@ -0,0 +1,60 @@
+"""
+Converts every pickled store in vector_store/ to the native format in place.
+
+    python migrate_vector_store.py [--dry-run]
+
+The service refuses pickled stores unless MIGRATE_LEGACY_STORES=true, in
+which case it converts each one the first time it is loaded. serve.py runs
+this before starting its workers, so no request ever has to unpickle a store;
+run it by hand after upgrading when serving with plain uvicorn.
+"""
+import os
+import sys
+import glob
+import argparse
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.core.store_cache import VECTOR_STORE_DIR
+from app.core.store_format import LEGACY_DOCSTORE_FILE, is_legacy_store, is_native_store, migrate_legacy_store
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="only list the stores that would be migrated")
+    args = parser.parse_args()
+
+    migrated = skipped = failed = 0
+    legacy_total = native_total = 0.0
+    for store_path in sorted(glob.glob(os.path.join(VECTOR_STORE_DIR, "*.faiss"))):
+        pdf_id = os.path.basename(store_path)[: -len(".faiss")]
+        if not is_legacy_store(store_path):
+            skipped += 1
+            if not is_native_store(store_path):
+                print(f"  {pdf_id}: no recognised store files, skipping")
+            continue
+        if args.dry_run:
+            size = os.path.getsize(os.path.join(store_path, LEGACY_DOCSTORE_FILE))
+            print(f"  {pdf_id}: would migrate ({size / 1e6:.1f} MB docstore)")
+            continue
+        try:
+            legacy_seconds, native_seconds = migrate_legacy_store(store_path)
+        except Exception as e:
+            failed += 1
+            print(f"  {pdf_id}: FAILED ({e})")
+            continue
+        migrated += 1
+        legacy_total += legacy_seconds
+        native_total += native_seconds
+        print(f"  {pdf_id}: load {legacy_seconds * 1000:.1f} ms (pickle) -> {native_seconds * 1000:.1f} ms (native)")
+
+    print(f"Migrated {migrated}, skipped {skipped}, failed {failed}.")
+    if migrated:
+        print(f"Total load time: {legacy_total:.2f}s (pickle) -> {native_total:.2f}s (native)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
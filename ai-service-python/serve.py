@@ -0,0 +1,64 @@
+"""
+Production entry point: several API worker processes plus one ingestion process.
+
+    python serve.py [--workers N] [--host 0.0.0.0] [--port 8000]
+
+The API workers (uvicorn, SERVICE_ROLE=api) serve chat, quiz and topic
+requests and only queue PDFs; ingest_worker.py runs the ingestion queue.
+Vector stores are memory-mapped read-only (STORE_MMAP), so the workers
+share one copy of each index in the page cache. For development, run
+`uvicorn main:app --reload` instead, which keeps everything in one process.
+
+Pickled stores left by older versions are converted (migrate_vector_store.py)
+before any worker starts, since the workers refuse to unpickle them.
+"""
+import os
+import sys
+import argparse
+import subprocess
+
+import uvicorn
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SERVICE_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("SERVICE_WORKERS", "2")),
+                        help="API worker processes (default: SERVICE_WORKERS or 2)")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--no-ingest", action="store_true",
+                        help="don't start the ingestion process, e.g. when it runs in another container")
+    parser.add_argument("--no-migrate", action="store_true",
+                        help="don't convert pickled stores before starting, e.g. when a deploy step already did")
+    args = parser.parse_args()
+
+    if not args.no_migrate:
+        # Runs to completion before the workers start; each store is converted under its migration lock
+        migrate = subprocess.run([sys.executable, os.path.join(SERVICE_ROOT, "migrate_vector_store.py")])
+        if migrate.returncode != 0:
+            print("[serve] Some vector stores could not be migrated; requests for those PDFs will fail.")
+
+    # Inherited by the uvicorn workers; the ingestion process doesn't read it
+    os.environ["SERVICE_ROLE"] = "api"
+    ingest = None
+    if not args.no_ingest:
+        ingest = subprocess.Popen([sys.executable, os.path.join(SERVICE_ROOT, "ingest_worker.py")])
+    try:
+        uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)
+    finally:
+        if ingest is not None:
+            ingest.terminate()
+            try:
+                ingest.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                ingest.kill()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
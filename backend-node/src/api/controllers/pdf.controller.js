@@ -74,66 +74,140 @@ export const uploadPdfController = async (req, res) => {
   }
 };
 
+/**
+ * Applies one status update from the AI service.
+ * Returns the HTTP status code and message describing the outcome.
+ */
+const applyStatusUpdate = async ({ pdfId, status, vectorStorePath, youtubeTopics }) => {
+  if (!pdfId || !status) {
+    return { code: 400, message: 'pdfId and status are required.' };
+  }
+
+  const pdf = await Pdf.findById(pdfId);
+  if (!pdf) {
+    return { code: 404, message: 'PDF not found.' };
+  }
+
+  pdf.processingStatus = status;
+  if (status === 'ready' && vectorStorePath) {
+    pdf.vectorStorePath = vectorStorePath;
+  }
+
+  // NEW: If processing is ready and we received topics, find the videos
+  if (status === 'ready' && youtubeTopics && youtubeTopics.length > 0) {
+    console.log(`[${pdfId}] Received topics, searching YouTube...`);
+    const recommendations = [];
+    
+    for (const topic of youtubeTopics) {
+      try {
+        const searchResponse = await youtube.search.list({
+          part: 'snippet',
+          q: topic,
+          type: 'video',
+          maxResults: 1, // Get only the top result
+        });
+
+        const topResult = searchResponse.data.items[0];
+        if (topResult) {
+          recommendations.push({
+            title: topResult.snippet.title,
+            videoId: topResult.id.videoId,
+            url: `https://www.youtube.com/watch?v=${topResult.id.videoId}`,
+          });
+        }
+      } catch (ytError) {
+        console.error(`[${pdfId}] Error searching YouTube for "${topic}":`, ytError.message);
+      }
+    }
+    
+    pdf.youtubeRecommendations = recommendations;
+    console.log(`[${pdfId}] Saved ${recommendations.length} YouTube recommendations.`);
+  }
+
+  await pdf.save();
+  return { code: 200, message: `Status for PDF ${pdfId} updated to ${status}.` };
+};
+
 /**
  * @desc    Callback from AI service to update status and save YouTube recommendations.
  * @route   POST /api/v1/pdfs/update-status
  * @access  Internal
  */
 export const updatePdfStatusController = async (req, res) => {
-  const { pdfId, status, vectorStorePath, youtubeTopics } = req.body;
+  try {
+    const { code, message } = await applyStatusUpdate(req.body);
+    res.status(code).json({ message });
+  } catch (error) {
+    console.error('Update Status Error:', error.message);
+    res.status(500).json({ message: 'Server error while updating PDF status.' });
+  }
+};
 
-  if (!pdfId || !status) {
-    return res.status(400).json({ message: 'pdfId and status are required.' });
+/**
+ * @desc    Batched callback from AI service: several status updates in one request.
+ * @route   POST /api/v1/pdfs/update-status/batch
+ * @access  Internal
+ */
+export const updatePdfStatusBatchController = async (req, res) => {
+  const { updates } = req.body;
+
+  if (!Array.isArray(updates)) {
+    return res.status(400).json({ message: 'updates must be an array.' });
   }
 
-  try {
-    const pdf = await Pdf.findById(pdfId);
-    if (!pdf) {
-      return res.status(404).json({ message: 'PDF not found.' });
+  // Each update succeeds or fails on its own, so the AI service only retries the failed ones;
+  // re-applying a "ready" update would repeat its YouTube searches
+  const settled = await Promise.allSettled(updates.map(applyStatusUpdate));
+  const results = settled.map((outcome, i) => {
+    const pdfId = updates[i]?.pdfId;
+    if (outcome.status === 'fulfilled') {
+      return { pdfId, code: outcome.value.code, message: outcome.value.message };
     }
+    console.error(`[${pdfId}] Update Status Batch Error:`, outcome.reason?.message);
+    return { pdfId, code: 500, message: 'Server error while updating PDF status.' };
+  });
+  res.status(200).json({ results });
+};
 
-    pdf.processingStatus = status;
-    if (status === 'ready' && vectorStorePath) {
-      pdf.vectorStorePath = vectorStorePath;
+/**
+ * @desc    Delete a PDF: its vector data in the AI service, the Cloudinary file and the record.
+ * @route   DELETE /api/v1/pdfs/:pdfId
+ * @access  Private (owner only)
+ */
+export const deletePdfController = async (req, res) => {
+  try {
+    const pdf = await Pdf.findById(req.params.pdfId);
+    if (!pdf || pdf.owner.toString() !== req.user.id) {
+      return res.status(404).json({ message: 'PDF not found.' });
     }
 
-    // NEW: If processing is ready and we received topics, find the videos
-    if (status === 'ready' && youtubeTopics && youtubeTopics.length > 0) {
-      console.log(`[${pdfId}] Received topics, searching YouTube...`);
-      const recommendations = [];
-      
-      for (const topic of youtubeTopics) {
-        try {
-          const searchResponse = await youtube.search.list({
-            part: 'snippet',
-            q: topic,
-            type: 'video',
-            maxResults: 1, // Get only the top result
-          });
-
-          const topResult = searchResponse.data.items[0];
-          if (topResult) {
-            recommendations.push({
-              title: topResult.snippet.title,
-              videoId: topResult.id.videoId,
-              url: `https://www.youtube.com/watch?v=${topResult.id.videoId}`,
-            });
-          }
-        } catch (ytError) {
-          console.error(`[${pdfId}] Error searching YouTube for "${topic}":`, ytError.message);
-        }
+    // The AI service goes first: its store and shared-index vectors would otherwise outlive the record.
+    // A 404 only means it has nothing stored for this PDF (e.g. processing failed early).
+    try {
+      await axios.delete(`${process.env.AI_SERVICE_URL}/api/v1/process-pdf/${pdf._id}`);
+    } catch (err) {
+      const status = err.response?.status;
+      if (status === 409) {
+        return res.status(409).json({ message: 'This PDF is still being processed; try again once it finishes.' });
+      }
+      if (status !== 404) {
+        console.error(`[${pdf._id}] Failed to delete PDF data in AI service:`, err.message);
+        return res.status(502).json({ message: 'Could not delete PDF data in the AI service.' });
       }
-      
-      pdf.youtubeRecommendations = recommendations;
-      console.log(`[${pdfId}] Saved ${recommendations.length} YouTube recommendations.`);
     }
 
-    await pdf.save();
-    res.status(200).json({ message: `Status for PDF ${pdfId} updated to ${status}.` });
+    try {
+      await cloudinary.uploader.destroy(pdf.cloudinaryId, { resource_type: 'raw' });
+    } catch (err) {
+      // The record still goes; an orphaned file costs storage, not correctness
+      console.error(`[${pdf._id}] Failed to delete Cloudinary file:`, err.message);
+    }
 
+    await pdf.deleteOne();
+    res.status(200).json({ message: `PDF ${pdf._id} deleted.` });
   } catch (error) {
-    console.error('Update Status Error:', error.message);
-    res.status(500).json({ message: 'Server error while updating PDF status.' });
+    console.error('Delete PDF Error:', error.message);
+    res.status(500).json({ message: 'Server error while deleting PDF.' });
   }
 };
 
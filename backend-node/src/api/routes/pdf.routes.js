@@ -4,7 +4,9 @@ import { protect } from '../middlewares/auth.middleware.js';
 import { 
     uploadPdfController, 
     updatePdfStatusController, 
-    getAllPdfsController 
+    updatePdfStatusBatchController,
+    getAllPdfsController,
+    deletePdfController
 } from '../controllers/pdf.controller.js';
 
 const router = Router();
@@ -55,6 +57,20 @@ router.post(
  */
 router.post('/update-status', updatePdfStatusController);
 
+/**
+ * @route   POST /api/v1/pdfs/update-status/batch
+ * @desc    Batched form of /update-status: { updates: [...] }
+ * @access  Internal
+ */
+router.post('/update-status/batch', updatePdfStatusBatchController);
+
+/**
+ * @route   DELETE /api/v1/pdfs/:pdfId
+ * @desc    Delete a PDF, including its vector store and shared-index vectors in the AI service
+ * @access  Private
+ */
+router.delete('/:pdfId', protect, deletePdfController);
+
 
 export default router;
 